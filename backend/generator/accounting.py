@@ -0,0 +1,392 @@
+# backend/generator/accounting.py
+"""
+Per-call token, latency and cost records (the ModelCall table).
+
+Every upstream model call made by the generate flow produces one row:
+model, route, call shape, input/cached/output tokens, latency, whether the
+output had to be coerced, the error if it failed, and the estimated cost.
+Cache hits and coalesced followers make no call, so they make no row.
+Extra attempts get rows of their own, flagged in `attempt`: a failed call
+that was retried (RETRIED) and the losing leg of a hedged call
+(HEDGE_LOSER, with its usage if it finished, "CancelledError" if it was
+cancelled). The cost report's latency and coerced rate cover only the
+attempts that answered; calls, tokens and cost cover every attempt.
+
+Rows never hit the database on the request path. A Calls collector is
+opened per request (ModelCallMiddleware), job or batch row; save_asset
+links the collected rows to the new GeneratedAsset and its user, and when
+the scope ends the rows join an in-process buffer. The buffer is written
+with one bulk_create after a response has gone out (request_finished) once
+it holds BATCH_SIZE rows or its oldest row is FLUSH_S old, and at exit.
+The user's plan is filled in at flush time with one query.
+
+Configured by settings.GENERATOR_ACCOUNTING:
+    ENABLED      record calls at all
+    BATCH_SIZE   flush once this many rows are buffered
+    FLUSH_S      ... or once the oldest buffered row is this old
+    MAX_PENDING  buffered rows kept when the database is unreachable
+    PRICES       {model prefix: (input, cached input, output)} in USD per 1M tokens
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "BATCH_SIZE": 50,
+    "FLUSH_S": 5.0,
+    "MAX_PENDING": 10000,
+    "PRICES": {
+        "gpt-4o-mini": (0.15, 0.075, 0.60),
+        "gpt-4o": (2.50, 1.25, 10.00),
+        "gpt-4.1-mini": (0.40, 0.10, 1.60),
+        "gpt-4.1-nano": (0.10, 0.025, 0.40),
+        "gpt-4.1": (2.00, 0.50, 8.00),
+    },
+}
+
+SERVED, RETRIED, HEDGE_LOSER = "", "retried", "hedge_loser"   # ModelCall.attempt
+
+_current: ContextVar[Optional["Calls"]] = ContextVar("generator_model_calls", default=None)
+_lock = threading.Lock()
+_buffer: List[Dict[str, Any]] = []
+_oldest: Optional[float] = None
+_stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0}
+
+
+def config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_ACCOUNTING", {}) or {})
+    return cfg
+
+
+# -----------------------
+# Rows
+# -----------------------
+def cost_usd(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int,
+             prices: Optional[Dict[str, Any]] = None) -> Optional[Decimal]:
+    """Estimated cost of one call; None for a model with no price (longest prefix wins)."""
+    prices = prices if prices is not None else config()["PRICES"]
+    matches = [name for name in prices if model == name or model.startswith(name + "-")]
+    if not matches:
+        return None
+    per_input, per_cached, per_output = prices[max(matches, key=len)]
+    micro = (prompt_tokens - cached_tokens) * per_input + cached_tokens * per_cached + completion_tokens * per_output
+    return Decimal(str(round(micro / 1_000_000, 6)))
+
+
+def call_row(
+    *, model: str, route: str, shape: str, asset_type: str, niche: Optional[str], language: str,
+    usage: Optional[Dict[str, Any]], max_output_tokens: int, latency_ms: float, error: str = "", attempt: str = SERVED,
+) -> Dict[str, Any]:
+    """A ModelCall row as a dict; `coerced` is set once the output has been checked."""
+    usage = usage or {}
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    cached_tokens = int(usage.get("cached_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    return {
+        "model": model,
+        "route": route or "",
+        "call_shape": shape or "",
+        "attempt": attempt,
+        "asset_type": asset_type,
+        "niche": niche or "",
+        "language": language or "",
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "completion_tokens": completion_tokens,
+        "max_output_tokens": int(max_output_tokens or 0),
+        "latency_ms": int(round(latency_ms)),
+        "coerced": False,
+        "ok": not error,
+        "error": error,
+        "cost_usd": cost_usd(model, prompt_tokens, cached_tokens, completion_tokens),
+        "created_at": time.time(),
+    }
+
+
+class Calls:
+    """Rows recorded in one scope (a request, a job, a batch row)."""
+
+    __slots__ = ("rows", "user_id", "asset", "submitted", "_lock")
+
+    def __init__(self, user_id: Optional[int] = None):
+        self.rows: List[Dict[str, Any]] = []
+        self.user_id = user_id
+        self.asset = None
+        self.submitted = False
+        self._lock = threading.Lock()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Add a row; one arriving after submit() (a hedge loser settling late) goes straight to the buffer."""
+        with self._lock:
+            if not self.submitted:
+                self.rows.append(row)
+                return
+        if self.asset is not None:
+            row["asset_id"], row["user_id"] = self.asset.pk, self.asset.user_id
+        row.setdefault("user_id", self.user_id)
+        _enqueue([row])
+
+    def link(self, asset) -> None:
+        """Attach the rows not yet linked to `asset` (and its user)."""
+        with self._lock:
+            self.asset = self.asset or asset
+            for row in self.rows:
+                if row.get("asset_id") is None:
+                    row["asset_id"] = asset.pk
+                    row["user_id"] = asset.user_id
+
+    def submit(self) -> None:
+        with self._lock:
+            rows, self.rows = self.rows, []
+            self.submitted = True
+        for row in rows:
+            if row.get("user_id") is None:
+                row["user_id"] = self.user_id
+        _enqueue(rows)
+
+
+@contextmanager
+def collect(user_id: Optional[int] = None, *, calls: Optional[Calls] = None) -> Iterator[Calls]:
+    """
+    Collect the rows recorded inside the block. They are buffered when the
+    block ends, unless `calls` was passed in: then its owner submits them.
+    """
+    owned = calls is None
+    calls = calls if calls is not None else Calls(user_id)
+    token = _current.set(calls)
+    try:
+        yield calls
+    finally:
+        _current.reset(token)
+        if owned:
+            calls.submit()
+
+
+def record(row: Optional[Dict[str, Any]]) -> None:
+    """Add a row to the current scope (or straight to the buffer outside one)."""
+    if row is None or not config()["ENABLED"]:
+        return
+    calls = _current.get()
+    if calls is not None:
+        calls.add(row)
+    else:
+        _enqueue([row])
+
+
+def attempt_recorder(**context) -> Callable[..., None]:
+    """
+    A callback recording extra attempts (RETRIED, HEDGE_LOSER) of one call:
+    `context` holds the call_row fields they share (model, route, asset_type,
+    niche, language, max_output_tokens). The current scope is captured now,
+    so a hedge loser settling on a pool thread still lands in it.
+    """
+    calls = _current.get()
+
+    def record_attempt(*, attempt: str, shape: str = "", usage: Optional[Dict[str, Any]] = None,
+                       latency_ms: float = 0.0, error: str = "") -> None:
+        if not config()["ENABLED"]:
+            return
+        row = call_row(**context, shape=shape, usage=usage, latency_ms=latency_ms, error=error, attempt=attempt)
+        if calls is not None:
+            calls.add(row)
+        else:
+            _enqueue([row])
+
+    return record_attempt
+
+
+@contextmanager
+def recording(row: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Record `row` when the block ends; an exception in the block marks it failed."""
+    target = row if row is not None else {}
+    try:
+        yield target
+    except Exception as e:
+        target.update(ok=False, error=target.get("error") or e.__class__.__name__)
+        raise
+    finally:
+        record(row)
+
+
+def link(asset) -> None:
+    calls = _current.get()
+    if calls is not None:
+        calls.link(asset)
+
+
+# -----------------------
+# Buffer
+# -----------------------
+def _enqueue(rows: List[Dict[str, Any]]) -> None:
+    global _oldest
+    if not rows:
+        return
+    max_pending = int(config()["MAX_PENDING"])
+    with _lock:
+        _buffer.extend(rows)
+        _stats["recorded"] += len(rows)
+        if _oldest is None:
+            _oldest = time.monotonic()
+        overflow = len(_buffer) - max_pending
+        if overflow > 0:
+            del _buffer[:overflow]
+            _stats["dropped"] += overflow
+
+
+def _take() -> List[Dict[str, Any]]:
+    global _oldest
+    with _lock:
+        rows = list(_buffer)
+        _buffer.clear()
+        _oldest = None
+    return rows
+
+
+def flush() -> int:
+    """Write every buffered row with one bulk insert; returns how many were written."""
+    rows = _take()
+    if not rows:
+        return 0
+    from datetime import datetime, timezone
+
+    from billing.models import Subscription
+    from generator.models import ModelCall
+
+    try:
+        user_ids = {row["user_id"] for row in rows if row.get("user_id")}
+        plans = dict(Subscription.objects.filter(user_id__in=user_ids).values_list("user_id", "plan")) if user_ids else {}
+        objs = [
+            ModelCall(
+                **{k: v for k, v in row.items() if k != "created_at"},
+                plan=plans.get(row.get("user_id"), ""),
+                created_at=datetime.fromtimestamp(row["created_at"], tz=timezone.utc),
+            )
+            for row in rows
+        ]
+        ModelCall.objects.bulk_create(objs)
+    except Exception:
+        logger.exception("Could not write %d model call rows; dropped", len(rows))
+        with _lock:
+            _stats["dropped"] += len(rows)
+        return 0
+    with _lock:
+        _stats["written"] += len(rows)
+        _stats["flushes"] += 1
+    return len(rows)
+
+
+def _due(cfg: Dict[str, Any]) -> bool:
+    with _lock:
+        if not _buffer:
+            return False
+        return len(_buffer) >= int(cfg["BATCH_SIZE"]) or time.monotonic() - (_oldest or 0) >= float(cfg["FLUSH_S"])
+
+
+def maybe_flush() -> int:
+    """Flush if the buffer is full or old enough; for loops outside requests (e.g. the job worker)."""
+    return flush() if _due(config()) else 0
+
+
+def _on_request_finished(sender, **kwargs) -> None:
+    maybe_flush()
+
+
+def install() -> None:
+    """Flush after responses and at exit (called from GeneratorConfig.ready)."""
+    from django.core.signals import request_finished
+
+    request_finished.connect(_on_request_finished, dispatch_uid="generator.accounting.flush")
+    atexit.register(flush)
+
+
+# -----------------------
+# Report
+# -----------------------
+REPORT_GROUPS = ("plan", "niche", "asset_type")
+
+
+def _percentile(ordered: List[int], pct: float) -> int:
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def cost_report(days: int = 7) -> List[Dict[str, Any]]:
+    """
+    ModelCall rows of the last `days` grouped by plan, niche and asset type,
+    most expensive group first: calls (every attempt), retried and hedge
+    loser attempts, tokens, cached share, cost total and per call, latency
+    p50/p95/p99 (ms) and coerced rate of the served attempts, error rate.
+    """
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from generator.models import ModelCall
+
+    fields = REPORT_GROUPS + (
+        "attempt", "latency_ms", "cost_usd", "prompt_tokens", "cached_tokens", "completion_tokens", "coerced", "ok",
+    )
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    rows = ModelCall.objects.filter(created_at__gte=timezone.now() - timedelta(days=days)).values_list(*fields)
+    for plan, niche, asset_type, attempt, latency_ms, cost, prompt, cached, completion, coerced, ok in rows.iterator():
+        g = groups.setdefault((plan, niche, asset_type), {
+            "calls": 0, "retried": 0, "hedge_losers": 0, "latencies": [], "cost_usd": Decimal(0),
+            "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "coerced": 0, "errors": 0,
+        })
+        g["calls"] += 1
+        g["retried"] += attempt == RETRIED
+        g["hedge_losers"] += attempt == HEDGE_LOSER
+        if attempt == SERVED:
+            g["latencies"].append(latency_ms)
+        g["cost_usd"] += cost or 0
+        g["prompt_tokens"] += prompt
+        g["cached_tokens"] += cached
+        g["completion_tokens"] += completion
+        g["coerced"] += coerced
+        g["errors"] += not ok
+
+    report = []
+    for (plan, niche, asset_type), g in groups.items():
+        latencies = sorted(g.pop("latencies"))
+        calls, served = g["calls"], len(latencies)
+        report.append({
+            "plan": plan or "-", "niche": niche or "-", "asset_type": asset_type, **g,
+            "cached_share": round(g["cached_tokens"] / g["prompt_tokens"], 3) if g["prompt_tokens"] else 0.0,
+            "cost_per_call": (g["cost_usd"] / calls).quantize(Decimal("0.000001")),
+            "p50_ms": _percentile(latencies, 50) if served else None,
+            "p95_ms": _percentile(latencies, 95) if served else None,
+            "p99_ms": _percentile(latencies, 99) if served else None,
+            "coerced_rate": round(g["coerced"] / served, 3) if served else 0.0,
+            "error_rate": round(g["errors"] / calls, 3),
+        })
+    report.sort(key=lambda r: r["cost_usd"], reverse=True)
+    return report
+
+
+def reset() -> None:
+    global _oldest
+    with _lock:
+        _buffer.clear()
+        _oldest = None
+        for k in _stats:
+            _stats[k] = 0
+
+
+def accounting_stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_stats, "pending": len(_buffer)}
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import GeneratedAsset
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from generator import accounting
+from .models import GeneratedAsset, GenerationJob, ModelCall
 
 @admin.register(GeneratedAsset)
 class GeneratedAssetAdmin(admin.ModelAdmin):
@@ -7,3 +11,42 @@ class GeneratedAssetAdmin(admin.ModelAdmin):
     search_fields = ("user__email", "prompt_used")
     list_filter = ("asset_type", "created_at")
     ordering = ("-created_at",)
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "attempts", "locked_by", "created_at", "finished_at")
+    search_fields = ("user__email",)
+    list_filter = ("status", "created_at")
+    ordering = ("-created_at",)
+    raw_id_fields = ("asset",)
+
+
+@admin.register(ModelCall)
+class ModelCallAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "user", "plan", "niche", "asset_type", "model", "call_shape", "attempt",
+                    "prompt_tokens", "cached_tokens", "completion_tokens", "latency_ms", "coerced", "ok", "cost_usd")
+    search_fields = ("user__email",)
+    list_filter = ("plan", "asset_type", "model", "call_shape", "attempt", "coerced", "ok", "created_at")
+    ordering = ("-created_at",)
+    raw_id_fields = ("user", "asset")
+    change_list_template = "admin/generator/modelcall/change_list.html"
+
+    def get_urls(self):
+        report = self.admin_site.admin_view(self.report_view)
+        return [path("report/", report, name="generator_modelcall_report")] + super().get_urls()
+
+    def report_view(self, request):
+        """Cost and latency percentiles per plan, niche and asset type over the last ?days=N (default 7)."""
+        try:
+            days = max(1, min(int(request.GET.get("days", 7)), 365))
+        except ValueError:
+            days = 7
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Model call cost report, last {days} days",
+            "days": days,
+            "rows": accounting.cost_report(days),
+        }
+        return TemplateResponse(request, "admin/generator/modelcall/report.html", context)
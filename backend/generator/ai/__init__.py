@@ -1,3 +1,11 @@
-from .public import generate_micro_sop, client, AssetType
+from .public import generate_micro_sop, generate_micro_sop_async, AssetType
 
-__all__ = ["generate_micro_sop", "client", "AssetType"]
+
+def __getattr__(name: str):
+    if name == "client":  # built lazily (ai/clients.py)
+        from . import api
+        return api.client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["generate_micro_sop", "generate_micro_sop_async", "client", "AssetType"]
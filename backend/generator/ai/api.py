@@ -1,6 +1,10 @@
+import asyncio
 import json
-from typing import Dict, Any
-from openai import OpenAI
+import logging
+import time
+from contextlib import closing
+from typing import Callable, Dict, Any, Iterator, Optional
+from openai import OpenAI, AsyncOpenAI
 try:
     # v1-style exceptions
     from openai import RateLimitError, APITimeoutError, APIError
@@ -9,10 +13,31 @@ except Exception:  # very old SDK fallback
     APITimeoutError = Exception
     APIError = Exception
 
+from asgiref.sync import sync_to_async
+
+from .. import accounting
+from . import breaker, capabilities, clients, hedge, throttle
 from .parsing import extract_json_text
 from .errors import ModelQuotaExceeded, ModelRateLimited, ModelTimeout, ModelAPIError
 
-client = OpenAI()
+logger = logging.getLogger(__name__)
+
+# `client` / `async_client` are built on first use, per process, on a pooled transport (clients.py).
+# Tests and benchmarks may assign either attribute to swap in a fake.
+def __getattr__(name: str):
+    if name == "client":
+        return clients.get_client()
+    if name == "async_client":
+        return clients.get_async_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _client() -> OpenAI:
+    return globals().get("client") or clients.get_client()
+
+
+def _async_client() -> AsyncOpenAI:
+    return globals().get("async_client") or clients.get_async_client()
 
 def _is_insufficient_quota(err: Exception) -> bool:
     # Inspect the serialized body if present
@@ -36,6 +61,177 @@ def _is_insufficient_quota(err: Exception) -> bool:
     except Exception:
         return False
 
+# Helper to normalize OpenAI exceptions -> typed
+def _typed_error(e: Exception) -> Exception:
+    if isinstance(e, RateLimitError):
+        err = ModelQuotaExceeded(str(e)) if _is_insufficient_quota(e) else ModelRateLimited(str(e))
+    elif isinstance(e, APITimeoutError):
+        err = ModelTimeout(str(e))
+    else:
+        err = ModelAPIError(str(e))
+    # What the retry policy needs from the original error
+    err.retry_after = throttle.retry_after_seconds(e)
+    err.status_code = getattr(e, "status_code", None)
+    return err
+
+def _map_error(e: Exception):
+    raise _typed_error(e) from e
+
+RETRYABLE_ERRORS = (ModelRateLimited, ModelTimeout, ModelAPIError)
+
+def _retry_delay(model: str, attempt: int, e: Exception):
+    """Seconds to wait before retrying, or None to give up and surface `e`."""
+    if isinstance(e, ModelRateLimited):
+        throttle.note_rate_limited(model, getattr(e, "retry_after", None))
+    return throttle.retry_delay(attempt, e)
+
+def _record_retried(record_attempt: Optional[Callable[..., None]], model: str, t0: float, e: Exception) -> None:
+    """A failed attempt that is about to be retried still went upstream: give it its own row."""
+    if record_attempt is not None:
+        record_attempt(
+            attempt=accounting.RETRIED, shape=capabilities.cached_shape(model) or "",
+            latency_ms=(time.perf_counter() - t0) * 1000, error=e.__class__.__name__,
+        )
+
+def _record_outcome(model: str, e: Exception) -> None:
+    """Breaker bookkeeping for a failed attempt: a 4xx means upstream answered, so it isn't a failure."""
+    if throttle._retryable(e):
+        breaker.record_failure(model)
+    else:
+        breaker.record_success(model)
+
+# -----------------------
+# Request shapes (shared by the sync and async callers)
+# -----------------------
+def _schema_payload(schema_name: str, schema_def: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": schema_name, "schema": schema_def, "strict": True},
+    }
+
+def _responses_messages_kwargs(*, user_prompt, system_prompt, model, temperature, max_output_tokens, schema_payload) -> Dict[str, Any]:
+    return dict(
+        model=model,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format=schema_payload,
+    )
+
+def _responses_input_kwargs(*, user_prompt, system_prompt, model, temperature, max_output_tokens, schema_payload) -> Dict[str, Any]:
+    return dict(
+        model=model,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        input=[
+            {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
+            {"role": "user", "content": [{"type": "text", "text": user_prompt}]},
+        ],
+        response_format=schema_payload,
+    )
+
+def _chat_kwargs(*, user_prompt, system_prompt, model, temperature, max_output_tokens) -> Dict[str, Any]:
+    return dict(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_output_tokens,
+        messages=[
+            {"role": "system", "content": system_prompt + "\nReturn ONLY minified JSON matching the schema."},
+            {"role": "user", "content": user_prompt},
+        ],
+    )
+
+def _chat_text(comp) -> str:
+    return comp.choices[0].message.content if comp.choices else ""
+
+def _usage(resp) -> Optional[Dict[str, int]]:
+    """Token usage of a Responses or Chat Completions result (incl. prompt-cache hits)."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(usage, "input_tokens", 0)
+    completion = getattr(usage, "completion_tokens", None)
+    if completion is None:
+        completion = getattr(usage, "output_tokens", 0)
+    details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+    return {
+        "prompt_tokens": int(prompt or 0),
+        "cached_tokens": int(getattr(details, "cached_tokens", 0) or 0),
+        "completion_tokens": int(completion or 0),
+    }
+
+def _fill_meta(meta: Optional[Dict[str, Any]], shape: str, resp) -> None:
+    if meta is not None:
+        meta["shape"] = shape
+        meta["usage"] = _usage(resp)
+
+def _requests(cli, *, user_prompt, schema_name, schema_def, system_prompt, model, temperature, max_output_tokens):
+    """Map each call shape to (bound SDK method, kwargs, text extractor)."""
+    shape_kwargs = dict(
+        user_prompt=user_prompt, system_prompt=system_prompt, model=model,
+        temperature=temperature, max_output_tokens=max_output_tokens,
+        schema_payload=_schema_payload(schema_name, schema_def),
+    )
+    return {
+        "responses_messages": (cli.responses.create, _responses_messages_kwargs(**shape_kwargs), extract_json_text),
+        "responses_input": (cli.responses.create, _responses_input_kwargs(**shape_kwargs), extract_json_text),
+        "chat": (
+            cli.chat.completions.create,
+            _chat_kwargs(user_prompt=user_prompt, system_prompt=system_prompt, model=model, temperature=temperature,
+                         max_output_tokens=max_output_tokens),
+            _chat_text,
+        ),
+    }
+
+def _on_probe_error(shape: str, e: Exception, model: str) -> None:
+    """Decide whether the probe moves on to the next shape or surfaces the error."""
+    if isinstance(e, TypeError) and shape != "chat":
+        logger.debug("Call shape %s not accepted by SDK (model=%s): %s", shape, model, e)
+        return
+    if shape == "responses_input":
+        # continue to chat fallback, but don't hide why
+        logger.warning("Call shape %s failed (model=%s): %s", shape, model, e)
+        return
+    _map_error(e)
+
+def _call_once(reqs, model: str, meta: Optional[Dict[str, Any]]) -> str:
+    shape = capabilities.cached_shape(model)
+    if shape:
+        method, kwargs, extract = reqs[shape]
+        try:
+            resp = method(**kwargs)
+            text = extract(resp)
+        except TypeError as e:
+            capabilities.invalidate(model, reason=str(e))
+        except Exception as e:
+            capabilities.record_error(model)
+            _map_error(e)
+        else:
+            capabilities.record_success(model, shape)
+            _fill_meta(meta, shape, resp)
+            return text
+
+    sent = 0  # shapes that reached upstream before one worked (a TypeError from the SDK never left the process)
+    for shape in capabilities.SHAPES:
+        method, kwargs, extract = reqs[shape]
+        resp = None
+        try:
+            resp = method(**kwargs)
+            text = extract(resp)
+        except Exception as e:
+            _on_probe_error(shape, e, model)
+            sent += not (isinstance(e, TypeError) and resp is None)
+            continue
+        capabilities.remember(model, shape, sent_before=sent)
+        _fill_meta(meta, shape, resp)
+        return text
+    raise ModelAPIError("No call shape accepted")  # not reached
+
 def call_model_with_schema(
     *,
     user_prompt: str,
@@ -45,6 +241,8 @@ def call_model_with_schema(
     model: str,
     temperature: float,
     max_output_tokens: int,
+    meta: Optional[Dict[str, Any]] = None,
+    record_attempt: Optional[Callable[..., None]] = None,
 ) -> str:
     """
     Wide-compat call:
@@ -52,71 +250,183 @@ def call_model_with_schema(
       2) Responses API with input=
       3) Chat Completions fallback
 
+    The first shape that works is remembered per (SDK version, model), so
+    later calls go straight to it (see capabilities.py).
+
+    Each attempt first checks the model's circuit breaker (fails fast with
+    ModelCircuitOpen while open, see breaker.py) and waits for the RPM/TPM
+    buckets; 429s, timeouts, connection errors and 5xx are retried with
+    jittered backoff honoring Retry-After (see throttle.py). With hedging
+    on, an attempt slower than the model's usual latency races one
+    duplicate (hedge.py).
+
     Returns raw JSON text OR raises typed exceptions for the caller to handle.
+    Pass a dict as `meta` to get the call shape and token usage (incl.
+    cached_tokens) of the successful response, and `record_attempt`
+    (accounting.attempt_recorder) to get a ModelCall row for each attempt
+    that was retried and each hedge loser; the caller records the last one.
     """
-    schema_payload = {
-        "type": "json_schema",
-        "json_schema": {"name": schema_name, "schema": schema_def, "strict": True},
-    }
+    reqs = _requests(
+        _client(), user_prompt=user_prompt, schema_name=schema_name, schema_def=schema_def,
+        system_prompt=system_prompt, model=model, temperature=temperature, max_output_tokens=max_output_tokens,
+    )
+    tokens = throttle.estimate_tokens(system_prompt, user_prompt, max_output_tokens=max_output_tokens)
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call(model)
+        throttle.acquire(model, tokens)
+        t0 = time.perf_counter()
+        try:
+            text = hedge.run(lambda leg: _call_once(reqs, model, leg), model=model, tokens=tokens, meta=meta,
+                             record_attempt=record_attempt)
+        except RETRYABLE_ERRORS as e:
+            _record_outcome(model, e)
+            delay = _retry_delay(model, attempt, e)
+            if delay is None:
+                raise
+            _record_retried(record_attempt, model, t0, e)
+            time.sleep(delay)
+        else:
+            breaker.record_success(model)
+            return text
 
-    # Helper to normalize OpenAI exceptions -> typed
-    def _map_error(e: Exception):
-        if isinstance(e, RateLimitError):
-            if _is_insufficient_quota(e):
-                raise ModelQuotaExceeded(str(e))
-            raise ModelRateLimited(str(e))
-        if isinstance(e, APITimeoutError):
-            raise ModelTimeout(str(e))
-        if isinstance(e, APIError):
-            raise ModelAPIError(str(e))
-        raise ModelAPIError(str(e))
-
-    # 1) responses.create(..., messages=[...])
-    try:
-        resp = client.responses.create(
-            model=model,
-            temperature=temperature,
-            max_output_tokens=max_output_tokens,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            response_format=schema_payload,
-        )
-        return extract_json_text(resp)
-    except TypeError:
-        pass
-    except Exception as e:
-        _map_error(e)
+async def _call_once_async(reqs, model: str, meta: Optional[Dict[str, Any]]) -> str:
+    shape = capabilities.cached_shape(model)
+    if shape:
+        method, kwargs, extract = reqs[shape]
+        try:
+            resp = await method(**kwargs)
+            text = extract(resp)
+        except TypeError as e:
+            capabilities.invalidate(model, reason=str(e))
+        except Exception as e:
+            capabilities.record_error(model)
+            _map_error(e)
+        else:
+            capabilities.record_success(model, shape)
+            _fill_meta(meta, shape, resp)
+            return text
 
-    # 2) responses.create(..., input=[...])
-    try:
-        resp = client.responses.create(
-            model=model,
-            temperature=temperature,
-            max_output_tokens=max_output_tokens,
-            input=[
-                {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-                {"role": "user", "content": [{"type": "text", "text": user_prompt}]},
-            ],
-            response_format=schema_payload,
-        )
-        return extract_json_text(resp)
-    except Exception as e:
-        # continue to chat fallback
-        pass
+    sent = 0  # shapes that reached upstream before one worked (a TypeError from the SDK never left the process)
+    for shape in capabilities.SHAPES:
+        method, kwargs, extract = reqs[shape]
+        resp = None
+        try:
+            resp = await method(**kwargs)
+            text = extract(resp)
+        except Exception as e:
+            _on_probe_error(shape, e, model)
+            sent += not (isinstance(e, TypeError) and resp is None)
+            continue
+        capabilities.remember(model, shape, sent_before=sent)
+        _fill_meta(meta, shape, resp)
+        return text
+    raise ModelAPIError("No call shape accepted")  # not reached
 
-    # 3) chat.completions.create
+async def call_model_with_schema_async(
+    *,
+    user_prompt: str,
+    schema_name: str,
+    schema_def: Dict[str, Any],
+    system_prompt: str,
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+    meta: Optional[Dict[str, Any]] = None,
+    record_attempt: Optional[Callable[..., None]] = None,
+) -> str:
+    """
+    Async twin of call_model_with_schema on AsyncOpenAI.
+    Same call shapes, capability memo, limiter/retries and typed exceptions;
+    the event loop is free while the upstream request (or a backoff) is pending.
+    """
+    reqs = _requests(
+        _async_client(), user_prompt=user_prompt, schema_name=schema_name, schema_def=schema_def,
+        system_prompt=system_prompt, model=model, temperature=temperature, max_output_tokens=max_output_tokens,
+    )
+    tokens = throttle.estimate_tokens(system_prompt, user_prompt, max_output_tokens=max_output_tokens)
+    attempt = 0
+    while True:
+        attempt += 1
+        await sync_to_async(breaker.before_call, thread_sensitive=False)(model)
+        await throttle.acquire_async(model, tokens)
+        t0 = time.perf_counter()
+        try:
+            text = await hedge.run_async(lambda leg: _call_once_async(reqs, model, leg), model=model, tokens=tokens,
+                                         meta=meta, record_attempt=record_attempt)
+        except RETRYABLE_ERRORS as e:
+            await sync_to_async(_record_outcome, thread_sensitive=False)(model, e)
+            delay = await sync_to_async(_retry_delay, thread_sensitive=False)(model, attempt, e)  # a 429 may hit redis
+            if delay is None:
+                raise
+            _record_retried(record_attempt, model, t0, e)
+            await asyncio.sleep(delay)
+        else:
+            await sync_to_async(breaker.record_success, thread_sensitive=False)(model)
+            return text
+
+def _stream_once(kwargs: Dict[str, Any], meta: Optional[Dict[str, Any]]) -> Iterator[str]:
+    stream = None
     try:
-        comp = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            messages=[
-                {"role": "system", "content": system_prompt + "\nReturn ONLY minified JSON matching the schema."},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
-        return comp.choices[0].message.content if comp.choices else ""
+        stream = _client().chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                _fill_meta(meta, "chat", chunk)  # final chunk: usage only, no choices
+            choices = getattr(chunk, "choices", None) or []
+            delta = getattr(choices[0], "delta", None) if choices else None
+            text = getattr(delta, "content", None) if delta is not None else None
+            if text:
+                yield text
     except Exception as e:
         _map_error(e)
-        raise  # not reached
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+def stream_model_with_schema(
+    *,
+    user_prompt: str,
+    schema_name: str,
+    schema_def: Dict[str, Any],
+    system_prompt: str,
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+    meta: Optional[Dict[str, Any]] = None,
+    record_attempt: Optional[Callable[..., None]] = None,
+) -> Iterator[str]:
+    """
+    Streaming variant on Chat Completions (stream=True): yields text deltas
+    as they arrive. Errors are raised as the same typed exceptions, either
+    when the stream opens or mid-stream. Rate limiting and retries apply
+    until the first delta; after that a failure is surfaced as is.
+
+    Closing the generator early closes the upstream response, so callers can
+    abort a request whose output is already known to be unusable.
+    """
+    kwargs = _chat_kwargs(user_prompt=user_prompt, system_prompt=system_prompt, model=model, temperature=temperature,
+                          max_output_tokens=max_output_tokens)
+    tokens = throttle.estimate_tokens(system_prompt, user_prompt, max_output_tokens=max_output_tokens)
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call(model)
+        throttle.acquire(model, tokens)
+        started = False
+        t0 = time.perf_counter()
+        try:
+            with closing(_stream_once(kwargs, meta)) as deltas:
+                for text in deltas:
+                    started = True
+                    yield text
+            breaker.record_success(model)
+            return
+        except RETRYABLE_ERRORS as e:
+            _record_outcome(model, e)
+            delay = None if started else _retry_delay(model, attempt, e)
+            if delay is None:
+                raise
+            _record_retried(record_attempt, model, t0, e)
+            time.sleep(delay)
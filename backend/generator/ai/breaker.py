@@ -0,0 +1,305 @@
+# backend/generator/ai/breaker.py
+"""
+Per-model circuit breaker in front of the upstream call.
+
+    closed     calls go through; outcomes are counted in a rolling window
+    open       the failure rate tripped it; calls fail fast with
+               ModelCircuitOpen (generate_micro_sop then coerces) until
+               OPEN_S has passed
+    half_open  up to HALF_OPEN_PROBES trial calls go through; a success
+               closes the circuit, a failure opens it again
+
+Failures are the retryable upstream errors (429, timeouts, connection
+errors, 5xx), counted per attempt. With the redis backend the state and
+window live in the django-redis cache, so every worker sees the same
+circuit; transitions are compare-and-set, so each one is logged and
+counted once.
+
+Configured by settings.GENERATOR_CIRCUIT_BREAKER:
+    ENABLED           False lets every call through
+    BACKEND           "local" (per process) | "redis" | dotted path to a class
+    WINDOW_S          rolling window length, in BUCKET_S slices
+    MIN_CALLS         don't trip on fewer calls than this in the window
+    FAILURE_RATE      failures / calls at which the circuit opens
+    OPEN_S            how long to fail fast before probing
+    HALF_OPEN_PROBES  concurrent trial calls while half-open
+    CACHE_ALIAS       django-redis alias used by the redis backend
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from .errors import ModelCircuitOpen
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "BACKEND": "local",
+    "WINDOW_S": 60,
+    "BUCKET_S": 10,
+    "MIN_CALLS": 10,
+    "FAILURE_RATE": 0.5,
+    "OPEN_S": 30,
+    "HALF_OPEN_PROBES": 1,
+    "CACHE_ALIAS": "default",
+}
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {"short_circuited": 0, "transitions": defaultdict(int)}
+
+
+# -----------------------
+# State backends
+# -----------------------
+class LocalBreakerStore:
+    """Per-process state; each worker trips on its own traffic."""
+
+    def __init__(self, **_):
+        self._lock = threading.Lock()
+        self._state: Dict[str, Tuple[str, float]] = {}
+        self._buckets: Dict[str, Dict[int, list]] = defaultdict(dict)
+        self._probes: Dict[str, list] = defaultdict(list)
+
+    def get_state(self, model: str) -> Tuple[str, float]:
+        with self._lock:
+            return self._state.get(model, (CLOSED, 0.0))
+
+    def transition(self, model: str, expected: str, new: str, now: float) -> bool:
+        with self._lock:
+            if self._state.get(model, (CLOSED, 0.0))[0] != expected:
+                return False
+            self._state[model] = (new, now)
+            if new != OPEN:
+                self._buckets.pop(model, None)
+            self._probes.pop(model, None)
+            return True
+
+    def record(self, model: str, failed: bool, now: float, bucket_s: int, window_s: int) -> Tuple[int, int]:
+        slot = int(now // bucket_s)
+        with self._lock:
+            buckets = self._buckets[model]
+            counts = buckets.setdefault(slot, [0, 0])
+            counts[0] += 1
+            counts[1] += int(failed)
+            oldest = slot - window_s // bucket_s + 1
+            for s in [s for s in buckets if s < oldest]:
+                del buckets[s]
+            return sum(c[0] for c in buckets.values()), sum(c[1] for c in buckets.values())
+
+    def take_probe(self, model: str, limit: int, now: float, ttl: float) -> bool:
+        with self._lock:
+            live = [t for t in self._probes[model] if t > now]
+            if len(live) >= limit:
+                self._probes[model] = live
+                return False
+            self._probes[model] = live + [now + ttl]
+            return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state.clear()
+            self._buckets.clear()
+            self._probes.clear()
+
+
+class RedisBreakerStore:
+    """Shared state in Redis: one hash per model plus a hash of window slices."""
+    PREFIX = "microsop:cb:"
+
+    _TRANSITION = """
+    local cur = redis.call('HGET', KEYS[1], 'state') or 'closed'
+    if cur ~= ARGV[1] then return 0 end
+    redis.call('HSET', KEYS[1], 'state', ARGV[2], 'since', ARGV[3])
+    redis.call('DEL', KEYS[3])
+    if ARGV[2] ~= 'open' then redis.call('DEL', KEYS[2]) end
+    return 1
+    """
+
+    def __init__(self, *, cache_alias: str = "default", **_):
+        from django_redis import get_redis_connection
+
+        self.conn = get_redis_connection(cache_alias)
+        self._transition = self.conn.register_script(self._TRANSITION)
+
+    def _keys(self, model: str):
+        return [self.PREFIX + model, self.PREFIX + model + ":window", self.PREFIX + model + ":probes"]
+
+    def get_state(self, model: str) -> Tuple[str, float]:
+        state, since = self.conn.hmget(self._keys(model)[0], "state", "since")
+        state = state.decode() if isinstance(state, bytes) else state
+        return state or CLOSED, float(since or 0.0)
+
+    def transition(self, model: str, expected: str, new: str, now: float) -> bool:
+        return bool(self._transition(keys=self._keys(model), args=[expected, new, now]))
+
+    def record(self, model: str, failed: bool, now: float, bucket_s: int, window_s: int) -> Tuple[int, int]:
+        key = self._keys(model)[1]
+        slot = int(now // bucket_s)
+        oldest = slot - window_s // bucket_s + 1
+        pipe = self.conn.pipeline()
+        pipe.hincrby(key, f"{slot}:n", 1)
+        if failed:
+            pipe.hincrby(key, f"{slot}:f", 1)
+        pipe.expire(key, window_s * 2)
+        pipe.hgetall(key)
+        fields = pipe.execute()[-1]
+        calls = failures = 0
+        stale = []
+        for field, value in fields.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            s, kind = field.split(":")
+            if int(s) < oldest:
+                stale.append(field)
+            elif kind == "n":
+                calls += int(value)
+            else:
+                failures += int(value)
+        if stale:
+            self.conn.hdel(key, *stale)
+        return calls, failures
+
+    def take_probe(self, model: str, limit: int, now: float, ttl: float) -> bool:
+        key = self._keys(model)[2]
+        pipe = self.conn.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, max(1, int(ttl)))
+        return pipe.execute()[0] <= limit
+
+    def reset(self) -> None:
+        names = list(self.conn.scan_iter(self.PREFIX + "*"))
+        if names:
+            self.conn.delete(*names)
+
+
+BACKENDS = {
+    "local": LocalBreakerStore,
+    "redis": RedisBreakerStore,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_CIRCUIT_BREAKER", {}) or {})
+    return cfg
+
+
+def get_store():
+    """Process-wide state backend, or None when the breaker is disabled."""
+    global _backend
+    if _backend is not None:
+        return _backend or None
+    with _backend_lock:
+        if _backend is None:
+            cfg = _config()
+            if not cfg["ENABLED"]:
+                _backend = False
+            else:
+                name = str(cfg["BACKEND"] or "local")
+                try:
+                    if name.lower() in BACKENDS:
+                        cls = BACKENDS[name.lower()]
+                    else:
+                        from django.utils.module_loading import import_string
+                        cls = import_string(name)
+                    _backend = cls(cache_alias=cfg["CACHE_ALIAS"])
+                except Exception:
+                    logger.exception("Circuit breaker backend %r unavailable; using per-process state", name)
+                    _backend = LocalBreakerStore()
+    return _backend or None
+
+
+def reset() -> None:
+    """Drop the backend and counters so the next call re-reads settings (tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+    with _stats_lock:
+        _stats["short_circuited"] = 0
+        _stats["transitions"].clear()
+
+
+def _move(store, model: str, expected: str, new: str, reason: str) -> bool:
+    if not store.transition(model, expected, new, time.time()):
+        return False  # another worker got there first
+    with _stats_lock:
+        _stats["transitions"][f"{model}:{expected}->{new}"] += 1
+    log = logger.warning if new == OPEN else logger.info
+    log("Circuit %s -> %s for model=%s (%s)", expected, new, model, reason)
+    return True
+
+
+def before_call(model: str) -> None:
+    """Raise ModelCircuitOpen if the call must not go upstream right now."""
+    store = get_store()
+    if store is None:
+        return
+    cfg = _config()
+    try:
+        state, since = store.get_state(model)
+        if state == CLOSED:
+            return
+        now = time.time()
+        if state == OPEN and now - since >= float(cfg["OPEN_S"]):
+            _move(store, model, OPEN, HALF_OPEN, f"open for {now - since:.0f}s")
+            state = store.get_state(model)[0]
+        if state == HALF_OPEN and store.take_probe(model, int(cfg["HALF_OPEN_PROBES"]), now, float(cfg["OPEN_S"])):
+            return
+    except Exception:
+        logger.warning("Circuit breaker backend failed; letting the call through", exc_info=True)
+        return
+    with _stats_lock:
+        _stats["short_circuited"] += 1
+    raise ModelCircuitOpen(f"Circuit open for {model}")
+
+
+def _record(model: str, failed: bool) -> None:
+    store = get_store()
+    if store is None:
+        return
+    cfg = _config()
+    try:
+        state, _ = store.get_state(model)
+        if state == HALF_OPEN:
+            if failed:
+                _move(store, model, HALF_OPEN, OPEN, "trial call failed")
+            else:
+                _move(store, model, HALF_OPEN, CLOSED, "trial call succeeded")
+            return
+        if state == OPEN:
+            return  # a call that started before the trip
+        calls, failures = store.record(model, failed, time.time(), int(cfg["BUCKET_S"]), int(cfg["WINDOW_S"]))
+        if failed and calls >= int(cfg["MIN_CALLS"]) and failures / calls >= float(cfg["FAILURE_RATE"]):
+            _move(store, model, CLOSED, OPEN, f"{failures}/{calls} failed in {cfg['WINDOW_S']}s")
+    except Exception:
+        logger.warning("Circuit breaker backend failed to record an outcome", exc_info=True)
+
+
+def record_success(model: str) -> None:
+    _record(model, failed=False)
+
+
+def record_failure(model: str) -> None:
+    _record(model, failed=True)
+
+
+def state(model: str) -> Optional[str]:
+    store = get_store()
+    return store.get_state(model)[0] if store is not None else None
+
+
+def breaker_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {"short_circuited": _stats["short_circuited"], "transitions": dict(_stats["transitions"])}
@@ -0,0 +1,184 @@
+# backend/generator/ai/budgets.py
+"""
+max_output_tokens per request, instead of a flat 1200 for every asset.
+
+The budget for a (asset type, niche, language) is, in order:
+    1) observed: the configured percentile of recent output sizes for that
+       key, times HEADROOM, once MIN_SAMPLES outputs have been seen
+    2) the per-type default from settings
+and is then capped by what the schema allows (e.g. an SMS is at most
+message 320 + cta 120 characters) and clamped to [MIN, MAX]. A
+language="both" request holds the asset twice, so its default and MAX
+are doubled (its observed sizes are kept under their own key).
+
+Output sizes come from the upstream usage block when present, else from a
+local estimator (estimate_tokens). An output that used its whole budget
+was probably cut off, so it is recorded as twice the budget to push the
+percentile up.
+
+Configured by settings.GENERATOR_OUTPUT_BUDGETS:
+    ENABLED      False sends MAX on every call (the old behaviour)
+    DEFAULTS     {"sms": .., "email": .., "checklist": .., "bundle": ..}
+    MIN / MAX    clamp
+    MAX_BY_TYPE  a higher MAX for some types (a bundle holds three assets)
+    PERCENTILE   e.g. 95
+    HEADROOM     multiplier on the percentile
+    MIN_SAMPLES  outputs needed before the percentile is trusted
+    WINDOW       outputs kept per key
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "DEFAULTS": {"sms": 200, "email": 900, "checklist": 800, "bundle": 1900},
+    "MIN": 64,
+    "MAX": 1200,
+    "MAX_BY_TYPE": {"bundle": 2400},
+    "PERCENTILE": 95,
+    "HEADROOM": 1.25,
+    "MIN_SAMPLES": 20,
+    "WINDOW": 500,
+}
+
+# Words split into ~4-char pieces, each punctuation mark its own token;
+# close to cl100k/o200k for EN/PT prose and JSON.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_JSON_OVERHEAD_TOKENS = 24   # braces, quotes, keys
+_CHARS_PER_TOKEN_WORST = 3   # PT with accents tokenizes denser than EN
+
+Key = Tuple[str, str, str]
+
+_lock = threading.Lock()
+_samples: Dict[Key, Deque[int]] = defaultdict(deque)
+_truncated: Dict[Key, int] = defaultdict(int)
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate for model text (no tokenizer dependency)."""
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_RE.findall(text))
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_OUTPUT_BUDGETS", {}) or {})
+    return cfg
+
+
+def schema_cap(schema_def: Dict[str, Any]) -> Optional[int]:
+    """
+    Most tokens a schema-valid object can need, if every string is
+    length-limited (nested objects, e.g. a language="both" pair, add up).
+    """
+    tokens = _JSON_OVERHEAD_TOKENS
+    for prop in (schema_def.get("properties") or {}).values():
+        if prop.get("type") == "object":
+            nested = schema_cap(prop)
+            if nested is None:
+                return None
+            tokens += nested
+        elif prop.get("type") != "string" or "maxLength" not in prop:
+            return None
+        else:
+            tokens += int(prop["maxLength"]) // _CHARS_PER_TOKEN_WORST
+    return tokens
+
+
+def _key(asset_type: str, niche: Optional[str], language: str) -> Key:
+    return (asset_type, niche or "none", language or "en")
+
+
+def _percentile(values, pct: float) -> int:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def choose(asset_type: str, *, niche: Optional[str], language: str, schema_def: Dict[str, Any]) -> int:
+    cfg = _config()
+    copies = 2 if language == "both" else 1
+    lo, hi = int(cfg["MIN"]), int((cfg.get("MAX_BY_TYPE") or {}).get(asset_type, cfg["MAX"])) * copies
+    if not cfg["ENABLED"]:
+        return hi
+
+    key = _key(asset_type, niche, language)
+    with _lock:
+        observed = list(_samples.get(key, ()))
+    if len(observed) >= int(cfg["MIN_SAMPLES"]):
+        p = _percentile(observed, float(cfg["PERCENTILE"]))
+        budget, source = math.ceil(p * float(cfg["HEADROOM"])), f"p{cfg['PERCENTILE']:g}={p} n={len(observed)}"
+    else:
+        budget, source = int((cfg["DEFAULTS"] or {}).get(asset_type, hi // copies)) * copies, f"default n={len(observed)}"
+
+    cap = schema_cap(schema_def)
+    if cap is not None and budget > cap:
+        budget, source = cap, source + " schema-cap"
+    budget = max(lo, min(hi, budget))
+    logger.info("Output budget type=%s niche=%s lang=%s max_output_tokens=%d (%s)", *key, budget, source)
+    return budget
+
+
+def observe(
+    asset_type: str,
+    *,
+    niche: Optional[str],
+    language: str,
+    budget: int,
+    output_text: str,
+    usage: Optional[Dict[str, Any]] = None,
+    latency_ms: Optional[float] = None,
+) -> int:
+    """Record one output's size; returns the token count used."""
+    tokens = int((usage or {}).get("completion_tokens") or 0) or estimate_tokens(output_text)
+    key = _key(asset_type, niche, language)
+    cut_off = tokens >= budget
+    window = int(_config()["WINDOW"])
+    with _lock:
+        samples = _samples[key]
+        samples.append(budget * 2 if cut_off else tokens)
+        while len(samples) > window:
+            samples.popleft()
+        if cut_off:
+            _truncated[key] += 1
+    log = logger.warning if cut_off else logger.info
+    log(
+        "Model output type=%s niche=%s lang=%s output_tokens=%d max_output_tokens=%d latency_ms=%s%s",
+        *key, tokens, budget, f"{latency_ms:.0f}" if latency_ms is not None else "-",
+        " (hit the budget; raising it)" if cut_off else "",
+    )
+    return tokens
+
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _truncated.clear()
+
+
+def budget_stats() -> Dict[str, Dict[str, Any]]:
+    """{"type/niche/lang": {n, p50, p95, truncated}}"""
+    with _lock:
+        snapshot = {k: list(v) for k, v in _samples.items()}
+        truncated = dict(_truncated)
+    return {
+        "/".join(k): {
+            "n": len(v),
+            "p50": _percentile(v, 50),
+            "p95": _percentile(v, 95),
+            "truncated": truncated.get(k, 0),
+        }
+        for k, v in snapshot.items() if v
+    }
@@ -0,0 +1,223 @@
+# backend/generator/ai/cache.py
+"""
+Exact-match response cache in front of call_model_with_schema.
+
+The key is a stable hash of everything that shapes the upstream request
+(resolved asset type, user prompt, system prompt, schema name, model,
+temperature). Values are the raw JSON text returned by the model, so hits
+still go through the schema check and final polish in generate_micro_sop.
+
+Configured by settings.GENERATOR_RESPONSE_CACHE:
+    BACKEND      "locmem" | "redis" | "none" | dotted path to a class
+    TTL          seconds an entry lives
+    MAX_ENTRIES  size cap; least recently stored entries are evicted
+    CACHE_ALIAS  django-redis alias used by the redis backend
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "BACKEND": "locmem",
+    "TTL": 24 * 3600,
+    "MAX_ENTRIES": 1000,
+    "CACHE_ALIAS": "default",
+}
+
+
+def cache_key(
+    *,
+    asset_type: str,
+    user_prompt: str,
+    system_prompt: str,
+    schema_name: str,
+    model: str,
+    temperature: float,
+) -> str:
+    raw = json.dumps(
+        [asset_type, user_prompt, system_prompt, schema_name, model, round(float(temperature), 4)],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LocMemLRUCache:
+    """Per-process LRU with TTL. Good enough for a single worker or tests."""
+
+    def __init__(self, *, ttl: int, max_entries: int, **_):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class RedisResponseCache:
+    """
+    Shared across gunicorn workers through django-redis.
+    TTL via SETEX; size eviction via a sorted-set index ordered by store time.
+    Hit/miss counters live in Redis so they aggregate over all workers.
+    """
+    PREFIX = "microsop:rc:"
+
+    def __init__(self, *, ttl: int, max_entries: int, cache_alias: str = "default", **_):
+        from django_redis import get_redis_connection
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = get_redis_connection(cache_alias)
+        self.index_key = self.PREFIX + "index"
+        self.hits_key = self.PREFIX + "hits"
+        self.misses_key = self.PREFIX + "misses"
+
+    def get(self, key: str) -> Optional[str]:
+        raw = self.conn.get(self.PREFIX + key)
+        self.conn.incr(self.hits_key if raw is not None else self.misses_key)
+        if raw is None:
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    def set(self, key: str, value: str) -> None:
+        pipe = self.conn.pipeline()
+        pipe.setex(self.PREFIX + key, self.ttl, value)
+        pipe.zadd(self.index_key, {key: time.time()})
+        pipe.zcard(self.index_key)
+        size = pipe.execute()[-1]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = self.conn.zpopmin(self.index_key, overflow)
+            if evicted:
+                self.conn.delete(*[self.PREFIX + (k.decode() if isinstance(k, bytes) else k) for k, _ in evicted])
+
+    def clear(self) -> None:
+        keys = self.conn.zrange(self.index_key, 0, -1)
+        names = [self.PREFIX + (k.decode() if isinstance(k, bytes) else k) for k in keys]
+        self.conn.delete(self.index_key, self.hits_key, self.misses_key, *names)
+
+    def stats(self) -> Dict[str, int]:
+        hits, misses, size = self.conn.get(self.hits_key), self.conn.get(self.misses_key), self.conn.zcard(self.index_key)
+        return {"hits": int(hits or 0), "misses": int(misses or 0), "size": int(size or 0)}
+
+
+BACKENDS = {
+    "locmem": LocMemLRUCache,
+    "redis": RedisResponseCache,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_RESPONSE_CACHE", {}) or {})
+    return cfg
+
+
+def get_response_cache():
+    """Process-wide backend instance, or None when caching is disabled."""
+    global _backend
+    if _backend is not None:
+        return _backend or None
+    with _backend_lock:
+        if _backend is None:
+            cfg = _config()
+            name = str(cfg["BACKEND"] or "none")
+            if name.lower() in ("none", "off"):
+                _backend = False
+            else:
+                try:
+                    if name.lower() in BACKENDS:
+                        cls = BACKENDS[name.lower()]
+                    else:
+                        from django.utils.module_loading import import_string
+                        cls = import_string(name)
+                    _backend = cls(ttl=int(cfg["TTL"]), max_entries=int(cfg["MAX_ENTRIES"]), cache_alias=cfg["CACHE_ALIAS"])
+                except Exception:
+                    logger.exception("Response cache backend %r unavailable; caching disabled", cfg["BACKEND"])
+                    _backend = False
+    return _backend or None
+
+
+def reset_response_cache() -> None:
+    """Drop the backend instance so the next call re-reads settings (tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def cache_get(key: str) -> Optional[str]:
+    backend = get_response_cache()
+    if backend is None:
+        return None
+    try:
+        value = backend.get(key)
+    except Exception:
+        logger.warning("Response cache get failed", exc_info=True)
+        return None
+    logger.debug("Response cache %s key=%s", "hit" if value is not None else "miss", key[:12])
+    return value
+
+
+def cache_set(key: str, value: str) -> None:
+    backend = get_response_cache()
+    if backend is None:
+        return
+    try:
+        backend.set(key, value)
+    except Exception:
+        logger.warning("Response cache set failed", exc_info=True)
+
+
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the active backend (zeros when disabled)."""
+    backend = get_response_cache()
+    if backend is None:
+        return {"hits": 0, "misses": 0, "size": 0}
+    try:
+        return backend.stats()
+    except Exception:
+        logger.warning("Response cache stats failed", exc_info=True)
+        return {"hits": 0, "misses": 0, "size": 0}
@@ -0,0 +1,107 @@
+# backend/generator/ai/capabilities.py
+"""
+Per-process memo of which call shape the installed SDK + model accept.
+
+call_model_with_schema used to walk all three shapes on every request:
+    responses_messages -> responses_input -> chat
+Once one shape has worked for a model we go straight to it. The memo is
+keyed by (openai SDK version, model) and dropped when the SDK rejects the
+shape (TypeError) or after settings.GENERATOR_CAPABILITY_ERROR_STREAK
+consecutive failures on the remembered path.
+
+round_trips_saved counts, per direct call, the earlier shapes the probe
+actually sent upstream; shapes the SDK rejected locally cost no round trip.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    from openai import __version__ as SDK_VERSION
+except Exception:  # very old SDK fallback
+    SDK_VERSION = "unknown"
+
+logger = logging.getLogger(__name__)
+
+SHAPES: Tuple[str, ...] = ("responses_messages", "responses_input", "chat")
+DEFAULT_ERROR_STREAK = 3
+
+_lock = threading.Lock()
+_memo: Dict[Tuple[str, str], str] = {}
+_sent_before: Dict[Tuple[str, str], int] = {}  # upstream requests the probe spent before the remembered shape
+_streaks: Dict[Tuple[str, str], int] = {}
+_stats = {"probes": 0, "direct": 0, "round_trips_saved": 0}
+
+
+def _key(model: str) -> Tuple[str, str]:
+    return (SDK_VERSION, model)
+
+
+def _error_streak_limit() -> int:
+    from django.conf import settings
+
+    if not settings.configured:
+        return DEFAULT_ERROR_STREAK
+    return int(getattr(settings, "GENERATOR_CAPABILITY_ERROR_STREAK", DEFAULT_ERROR_STREAK))
+
+
+def cached_shape(model: str) -> Optional[str]:
+    with _lock:
+        return _memo.get(_key(model))
+
+
+def remember(model: str, shape: str, sent_before: int = 0) -> None:
+    with _lock:
+        previous = _memo.get(_key(model))
+        _memo[_key(model)] = shape
+        _sent_before[_key(model)] = sent_before
+        _streaks[_key(model)] = 0
+        _stats["probes"] += 1
+    if previous != shape:
+        logger.info("Model call path selected: model=%s sdk=%s path=%s", model, SDK_VERSION, shape)
+
+
+def record_success(model: str, shape: str) -> None:
+    with _lock:
+        saved = _sent_before.get(_key(model), 0)
+        _streaks[_key(model)] = 0
+        _stats["direct"] += 1
+        _stats["round_trips_saved"] += saved
+    logger.debug("Model call via cached path=%s model=%s round_trips_saved=%d", shape, model, saved)
+
+
+def record_error(model: str) -> None:
+    limit = _error_streak_limit()
+    with _lock:
+        streak = _streaks.get(_key(model), 0) + 1
+        _streaks[_key(model)] = streak
+        dropped = streak >= limit and _memo.pop(_key(model), None)
+        if dropped:
+            _sent_before.pop(_key(model), None)
+    if dropped:
+        logger.warning("Model call path %s dropped after %d consecutive errors (model=%s); re-probing", dropped, streak, model)
+
+
+def invalidate(model: str, reason: str = "") -> None:
+    with _lock:
+        dropped = _memo.pop(_key(model), None)
+        _streaks.pop(_key(model), None)
+        _sent_before.pop(_key(model), None)
+    if dropped:
+        logger.warning("Model call path %s rejected (model=%s): %s; re-probing", dropped, model, reason)
+
+
+def reset() -> None:
+    with _lock:
+        _memo.clear()
+        _streaks.clear()
+        _sent_before.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+def capability_stats() -> Dict[str, object]:
+    with _lock:
+        return {**_stats, "paths": {f"{m}@{v}": s for (v, m), s in _memo.items()}}
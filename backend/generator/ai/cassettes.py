@@ -0,0 +1,279 @@
+# backend/generator/ai/cassettes.py
+"""
+Record/replay httpx transport for the OpenAI clients (clients.py).
+
+    record  every upstream exchange is saved as a cassette file: the request
+            (auth headers dropped), response status, headers and body chunks,
+            each with its time offset
+    replay  requests are answered from cassettes, with the recorded timing
+            (time to headers, then each chunk) times LATENCY_SCALE; a request
+            with no cassette raises CassetteMiss
+    auto    replay when a cassette exists, otherwise record
+
+The cassette key is a hash of the endpoint path and the canonical JSON body,
+i.e. of the prompts, model, schema and sampling settings. The same request
+always gets the same answer, so the whole GenerateSOPView flow, streaming
+included, runs offline at production-like latencies.
+
+Configured by settings.GENERATOR_CASSETTES:
+    MODE           None (off) | "record" | "replay" | "auto"
+    DIR            where cassette files live
+    LATENCY_SCALE  1.0 = recorded timing, 0 = instant, 2.0 = twice as slow
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "MODE": None,
+    "DIR": "cassettes",
+    "LATENCY_SCALE": 1.0,
+}
+
+MODES = ("record", "replay", "auto")
+_REDACTED_HEADERS = {"authorization", "cookie", "openai-organization", "openai-project", "api-key"}
+_DROPPED_RESPONSE_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "set-cookie"}
+
+_write_lock = threading.Lock()
+
+
+class CassetteMiss(httpx.TransportError):
+    """Replay mode got a request nothing was recorded for."""
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_CASSETTES", {}) or {})
+    return cfg
+
+
+def cassette_key(request: httpx.Request) -> str:
+    """<endpoint>-<sha256 of path + canonical body>, e.g. chat_completions-3f2a..."""
+    body = request.content or b""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        pass
+    digest = hashlib.sha256(request.method.encode() + b" " + request.url.path.encode() + b"\n" + body).hexdigest()
+    endpoint = request.url.path.strip("/").split("/", 1)[-1].replace("/", "_") or "root"
+    return f"{endpoint}-{digest[:24]}"
+
+
+def _encode(chunk: bytes) -> Dict[str, str]:
+    try:
+        return {"text": chunk.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(chunk).decode("ascii")}
+
+
+def _decode(item: Dict[str, str]) -> bytes:
+    return item["text"].encode("utf-8") if "text" in item else base64.b64decode(item["b64"])
+
+
+class CassetteStore:
+    """One JSON file per cassette key under `directory`."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(key), encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, request: httpx.Request, status: int, headers: httpx.Headers,
+             headers_s: float, chunks: List[Tuple[float, bytes]]) -> None:
+        body = request.content or b""
+        try:
+            request_body: Any = json.loads(body)
+        except ValueError:
+            request_body = _encode(body)
+        cassette = {
+            "request": {
+                "method": request.method,
+                "url": str(request.url),
+                "headers": {k: v for k, v in request.headers.items() if k.lower() not in _REDACTED_HEADERS},
+                "body": request_body,
+            },
+            "response": {
+                "status": status,
+                "headers": {k: v for k, v in headers.items() if k.lower() not in _DROPPED_RESPONSE_HEADERS},
+                "headers_s": round(headers_s, 4),
+                "chunks": [{"t": round(t, 4), **_encode(c)} for t, c in chunks],
+            },
+            "recorded_at": time.time(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.path(key) + f".{os.getpid()}.tmp"
+        with _write_lock:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(cassette, fh, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path(key))
+        logger.info("Recorded cassette %s (%d, %d chunks, %.0fms)", key, status, len(chunks), (chunks[-1][0] if chunks else headers_s) * 1000)
+
+
+# -----------------------
+# Streams
+# -----------------------
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, t0: float, on_close):
+        self.inner, self.t0, self.on_close = inner, t0, on_close
+        self.chunks: List[Tuple[float, bytes]] = []
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.inner:
+            self.chunks.append((time.perf_counter() - self.t0, chunk))
+            yield chunk
+
+    def close(self) -> None:
+        self.inner.close()
+        self.on_close(self.chunks)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, t0: float, on_close):
+        self.inner, self.t0, self.on_close = inner, t0, on_close
+        self.chunks: List[Tuple[float, bytes]] = []
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.inner:
+            self.chunks.append((time.perf_counter() - self.t0, chunk))
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+        self.on_close(self.chunks)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[Dict[str, Any]], t0: float, scale: float):
+        self.chunks, self.t0, self.scale = chunks, t0, scale
+
+    def __iter__(self) -> Iterator[bytes]:
+        for item in self.chunks:
+            delay = self.t0 + item["t"] * self.scale - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield _decode(item)
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[Dict[str, Any]], t0: float, scale: float):
+        self.chunks, self.t0, self.scale = chunks, t0, scale
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for item in self.chunks:
+            delay = self.t0 + item["t"] * self.scale - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield _decode(item)
+
+
+# -----------------------
+# Transports
+# -----------------------
+class _CassetteBase:
+    def __init__(self, mode: str, store: CassetteStore, latency_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {MODES}")
+        self.mode, self.store, self.latency_scale = mode, store, float(latency_scale)
+
+    def _lookup(self, request: httpx.Request) -> Tuple[str, Optional[Dict[str, Any]]]:
+        key = cassette_key(request)
+        cassette = self.store.load(key) if self.mode in ("replay", "auto") else None
+        if cassette is None and self.mode == "replay":
+            raise CassetteMiss(f"No cassette {key} for {request.method} {request.url.path}", request=request)
+        if cassette is None:
+            request.headers["accept-encoding"] = "identity"  # keep recorded bodies readable
+        return key, cassette
+
+    def _replayed(self, request: httpx.Request, cassette: Dict[str, Any], stream) -> httpx.Response:
+        resp = cassette["response"]
+        return httpx.Response(resp["status"], headers=resp["headers"], stream=stream, request=request)
+
+    def _saver(self, key: str, request: httpx.Request, response: httpx.Response, headers_s: float):
+        return lambda chunks: self.store.save(key, request, response.status_code, response.headers, headers_s, chunks)
+
+
+class CassetteTransport(_CassetteBase, httpx.BaseTransport):
+    def __init__(self, mode: str, store: CassetteStore, latency_scale: float = 1.0,
+                 inner: Optional[httpx.BaseTransport] = None):
+        super().__init__(mode, store, latency_scale)
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key, cassette = self._lookup(request)
+        t0 = time.perf_counter()
+        if cassette is not None:
+            delay = cassette["response"]["headers_s"] * self.latency_scale
+            if delay > 0:
+                time.sleep(delay)
+            stream = _ReplayStream(cassette["response"]["chunks"], t0, self.latency_scale)
+            return self._replayed(request, cassette, stream)
+
+        response = self.inner.handle_request(request)
+        headers_s = time.perf_counter() - t0
+        stream = _RecordingStream(response.stream, t0, self._saver(key, request, response, headers_s))
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              request=request, extensions=response.extensions)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncCassetteTransport(_CassetteBase, httpx.AsyncBaseTransport):
+    def __init__(self, mode: str, store: CassetteStore, latency_scale: float = 1.0,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(mode, store, latency_scale)
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key, cassette = self._lookup(request)
+        t0 = time.perf_counter()
+        if cassette is not None:
+            delay = cassette["response"]["headers_s"] * self.latency_scale
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stream = _AsyncReplayStream(cassette["response"]["chunks"], t0, self.latency_scale)
+            return self._replayed(request, cassette, stream)
+
+        response = await self.inner.handle_async_request(request)
+        headers_s = time.perf_counter() - t0
+        stream = _AsyncRecordingStream(response.stream, t0, self._saver(key, request, response, headers_s))
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              request=request, extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def wrap(inner, *, async_: bool):
+    """`inner` wrapped for record/replay when settings.GENERATOR_CASSETTES has a MODE, else `inner` itself."""
+    cfg = _config()
+    mode = cfg["MODE"]
+    if not mode:
+        return inner
+    store = CassetteStore(str(cfg["DIR"]))
+    cls = AsyncCassetteTransport if async_ else CassetteTransport
+    logger.info("OpenAI %sclient using cassettes: mode=%s dir=%s", "async " if async_ else "", mode, cfg["DIR"])
+    return cls(str(mode).lower(), store, latency_scale=float(cfg["LATENCY_SCALE"]), inner=inner)
@@ -0,0 +1,192 @@
+# backend/generator/ai/clients.py
+"""
+The per-process OpenAI clients api.py calls through.
+
+They are built on first use, not at import: `manage.py` commands that never
+call the model skip the SDK setup, and importing the app works without
+OPENAI_API_KEY. A forked worker builds its own (the pid is checked), so no
+connection pool is shared across processes.
+
+Both clients sit on a tuned httpx transport: a bounded keep-alive pool,
+HTTP/2 when the h2 package is installed, and explicit connect/read/write/
+pool timeouts. With settings.GENERATOR_CASSETTES the transport is wrapped
+for record/replay (cassettes.py).
+
+warm_up() opens keep-alive connections before traffic arrives, so the first
+user request doesn't pay for DNS + TCP + TLS. core/gunicorn.conf.py calls it
+from post_worker_init when WARMUP is on; benchmarks/first_request.py
+measures the difference.
+
+Configured by settings.GENERATOR_OPENAI_HTTP:
+    MAX_CONNECTIONS     pool size per client
+    MAX_KEEPALIVE       idle connections kept open
+    KEEPALIVE_EXPIRY_S  close idle connections after this long
+    HTTP2               use HTTP/2 if h2 is installed
+    CONNECT_TIMEOUT_S, READ_TIMEOUT_S, WRITE_TIMEOUT_S, POOL_TIMEOUT_S
+    WARMUP              warm the pool at worker boot
+    WARMUP_CONNECTIONS  connections to open
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from . import cassettes
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "MAX_CONNECTIONS": 100,
+    "MAX_KEEPALIVE": 20,
+    "KEEPALIVE_EXPIRY_S": 60.0,
+    "HTTP2": True,
+    "CONNECT_TIMEOUT_S": 5.0,
+    "READ_TIMEOUT_S": 120.0,
+    "WRITE_TIMEOUT_S": 10.0,
+    "POOL_TIMEOUT_S": 10.0,
+    "WARMUP": False,
+    "WARMUP_CONNECTIONS": 2,
+}
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_pid: Optional[int] = None
+_stats: Dict[str, Any] = {"built": 0, "warmups": 0, "warm_connections": 0, "warmup_ms": None}
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_OPENAI_HTTP", {}) or {})
+    return cfg
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def limits(cfg: Optional[Dict[str, Any]] = None) -> httpx.Limits:
+    cfg = cfg or _config()
+    return httpx.Limits(
+        max_connections=int(cfg["MAX_CONNECTIONS"]),
+        max_keepalive_connections=int(cfg["MAX_KEEPALIVE"]),
+        keepalive_expiry=float(cfg["KEEPALIVE_EXPIRY_S"]),
+    )
+
+
+def timeout(cfg: Optional[Dict[str, Any]] = None) -> httpx.Timeout:
+    cfg = cfg or _config()
+    return httpx.Timeout(
+        connect=float(cfg["CONNECT_TIMEOUT_S"]), read=float(cfg["READ_TIMEOUT_S"]),
+        write=float(cfg["WRITE_TIMEOUT_S"]), pool=float(cfg["POOL_TIMEOUT_S"]),
+    )
+
+
+def http_client(*, async_: bool = False, cfg: Optional[Dict[str, Any]] = None):
+    """The pooled httpx client under the OpenAI SDK (cassette-wrapped when cassettes are on)."""
+    cfg = cfg or _config()
+    http2 = bool(cfg["HTTP2"]) and http2_available()
+    if async_:
+        transport = cassettes.wrap(httpx.AsyncHTTPTransport(limits=limits(cfg), http2=http2), async_=True)
+        return httpx.AsyncClient(transport=transport, timeout=timeout(cfg))
+    transport = cassettes.wrap(httpx.HTTPTransport(limits=limits(cfg), http2=http2), async_=False)
+    return httpx.Client(transport=transport, timeout=timeout(cfg))
+
+
+def _get(name: str):
+    global _pid
+    with _lock:
+        if _pid != os.getpid():  # first use, or a forked worker: don't share the parent's sockets
+            _clients.clear()
+            _pid = os.getpid()
+        cli = _clients.get(name)
+        if cli is None:
+            # Retries happen in throttle.retry_delay (shared limiter, Retry-After aware), not in the SDK.
+            # The SDK sends its own timeout with every request, so it gets the same one as the transport.
+            cfg = _config()
+            if name == "async":
+                cli = AsyncOpenAI(max_retries=0, timeout=timeout(cfg), http_client=http_client(async_=True, cfg=cfg))
+            else:
+                cli = OpenAI(max_retries=0, timeout=timeout(cfg), http_client=http_client(cfg=cfg))
+            _clients[name] = cli
+            _stats["built"] += 1
+    return cli
+
+
+def get_client() -> OpenAI:
+    return _get("sync")
+
+
+def get_async_client() -> AsyncOpenAI:
+    return _get("async")
+
+
+def warm_up(connections: Optional[int] = None) -> int:
+    """
+    Open `connections` keep-alive connections on the sync client (GET /models
+    in parallel: no tokens spent) and return how many succeeded. The async
+    client's connections belong to an event loop, so it is only built here.
+    """
+    cfg = _config()
+    n = max(1, int(connections or cfg["WARMUP_CONNECTIONS"]))
+    cli = get_client()
+    get_async_client()
+    t0 = time.perf_counter()
+
+    def ping(_) -> bool:
+        try:
+            cli.models.with_raw_response.list()
+            return True
+        except Exception as e:  # a warm-up failure must never stop the worker from booting
+            logger.warning("OpenAI warm-up request failed: %s", e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="warmup") as pool:
+        ok = sum(pool.map(ping, range(n)))
+    elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+    with _lock:
+        _stats["warmups"] += 1
+        _stats["warm_connections"] = ok
+        _stats["warmup_ms"] = elapsed_ms
+    logger.info("OpenAI client warmed: %d/%d connections in %.0fms", ok, n, elapsed_ms)
+    return ok
+
+
+def warm_up_if_enabled() -> int:
+    return warm_up() if _config()["WARMUP"] else 0
+
+
+def reset() -> None:
+    """Close and forget the clients (and their stats); the next call builds new ones."""
+    global _pid
+    with _lock:
+        sync_client = _clients.pop("sync", None)
+        _clients.clear()
+        _pid = None
+        _stats.update(built=0, warmups=0, warm_connections=0, warmup_ms=None)
+    if sync_client is not None:
+        sync_client.close()
+
+
+def client_stats() -> Dict[str, Any]:
+    cfg = _config()
+    with _lock:
+        return {
+            **_stats,
+            "http2": bool(cfg["HTTP2"]) and http2_available(),
+            "max_connections": int(cfg["MAX_CONNECTIONS"]),
+            "max_keepalive": int(cfg["MAX_KEEPALIVE"]),
+        }
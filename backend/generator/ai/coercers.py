@@ -2,6 +2,12 @@
 from typing import Any, Dict, List, Optional
 import re
 
+from .schemas import BUNDLE_PARTS
+
+# Compiled once: these run per line of every coerced asset (and per row in recoerce_assets)
+_WHITESPACE_RE = re.compile(r"\s+")
+_LINE_SPLIT_RE = re.compile(r"[•\-\u2022]|[.;,\n]")
+
 def first_string(*vals) -> Optional[str]:
     for v in vals:
         if isinstance(v, str) and v.strip():
@@ -15,15 +21,16 @@ def _sanitize_line(ln: str) -> str:
     ln = ln.strip()
     ln = ln.lstrip("-*• ").strip()
     ln = ln.strip(" ,.;:—–-").strip()
-    ln = re.sub(r"\s+", " ", ln)
+    ln = _WHITESPACE_RE.sub(" ", ln)
     return ln
 
+_GENERIC_LABELS = frozenset({
+    "", "checklist", "check list", "lista", "lista de tarefas",
+    "tarefas", "to-do", "todo", "steps", "passos"
+})
+
 def _is_generic_label(s: str) -> bool:
-    s = s.lower().strip()
-    return s in {
-        "", "checklist", "check list", "lista", "lista de tarefas",
-        "tarefas", "to-do", "todo", "steps", "passos"
-    }
+    return s.lower().strip() in _GENERIC_LABELS
 
 # -----------------------
 # Coercers (auto-repair)
@@ -59,6 +66,22 @@ def _coerce_email(data: Any, fallback_prompt: str) -> Dict[str, Any]:
     summary = first_string(data.get("summary"), body[:160])
     return {"subject": subject, "body_markdown": body, "summary": summary}
 
+# Meaningful fillers in both languages
+_FILLERS_EN = [
+    {"text": "Clarify objective & success criteria", "priority": "high"},
+    {"text": "List tasks with owners and deadlines", "priority": "medium"},
+    {"text": "Prepare required resources/materials", "priority": "medium"},
+    {"text": "Review quality and finalize delivery", "priority": "medium"},
+    {"text": "Confirm next steps & follow-up", "priority": "low"},
+]
+_FILLERS_PT = [
+    {"text": "Clarificar objetivo e critérios de sucesso", "priority": "high"},
+    {"text": "Listar tarefas com responsáveis e prazos", "priority": "medium"},
+    {"text": "Preparar recursos/materiais necessários", "priority": "medium"},
+    {"text": "Rever qualidade e finalizar entrega", "priority": "medium"},
+    {"text": "Confirmar próximos passos e follow-up", "priority": "low"},
+]
+
 def _coerce_checklist(data: Any, fallback_prompt: str, *, language: str = "en") -> Dict[str, Any]:
     title = "Checklist" if language == "en" else "Checklist"
     items: List[Dict[str, str]] = []
@@ -87,7 +110,7 @@ def _coerce_checklist(data: Any, fallback_prompt: str, *, language: str = "en")
     if not items:
         raw_lines: List[str] = []
         for ln in fallback_prompt.splitlines():
-            parts = re.split(r"[•\-\u2022]|[.;,\n]", ln)
+            parts = _LINE_SPLIT_RE.split(ln)
             raw_lines.extend([p for p in parts if p is not None])
 
         lines: List[str] = []
@@ -99,26 +122,11 @@ def _coerce_checklist(data: Any, fallback_prompt: str, *, language: str = "en")
         for s in lines[:7]:
             items.append({"text": s, "priority": "medium"})
 
-    # Meaningful fillers in both languages
-    FILLERS_EN = [
-        {"text": "Clarify objective & success criteria", "priority": "high"},
-        {"text": "List tasks with owners and deadlines", "priority": "medium"},
-        {"text": "Prepare required resources/materials", "priority": "medium"},
-        {"text": "Review quality and finalize delivery", "priority": "medium"},
-        {"text": "Confirm next steps & follow-up", "priority": "low"},
-    ]
-    FILLERS_PT = [
-        {"text": "Clarificar objetivo e critérios de sucesso", "priority": "high"},
-        {"text": "Listar tarefas com responsáveis e prazos", "priority": "medium"},
-        {"text": "Preparar recursos/materiais necessários", "priority": "medium"},
-        {"text": "Rever qualidade e finalizar entrega", "priority": "medium"},
-        {"text": "Confirmar próximos passos e follow-up", "priority": "low"},
-    ]
-    fillers = FILLERS_PT if language == "pt" else FILLERS_EN
+    fillers = _FILLERS_PT if language == "pt" else _FILLERS_EN
 
     i = 0
     while len(items) < 3 and i < len(fillers):
-        items.append(fillers[i])
+        items.append(dict(fillers[i]))
         i += 1
 
     items = items[:12]
@@ -135,7 +143,7 @@ def _coerce_sms(data: Any, fallback_prompt: str, *, language: str = "en") -> Dic
         message = data.strip()
 
     if not message:
-        base = re.sub(r"\s+", " ", fallback_prompt.strip())
+        base = _WHITESPACE_RE.sub(" ", fallback_prompt.strip())
         if language == "pt":
             message = (base[:180].strip()) or "Olá! Preciso da sua confirmação. Pode responder a este SMS?"
         else:
@@ -147,6 +155,9 @@ def _coerce_sms(data: Any, fallback_prompt: str, *, language: str = "en") -> Dic
     return payload
 
 def coerce_to_schema(asset_type: str, raw: Any, fallback_prompt: str, *, language: str = "en") -> Dict[str, Any]:
+    if asset_type == "bundle":
+        raw = raw if isinstance(raw, dict) else {}
+        return {part: coerce_to_schema(part, raw.get(part), fallback_prompt, language=language) for part in BUNDLE_PARTS}
     if asset_type == "email":
         return _coerce_email(raw, fallback_prompt)
     if asset_type == "checklist":
@@ -13,3 +13,7 @@ class ModelTimeout(Exception):
 class ModelAPIError(Exception):
     """Generic upstream failure."""
     pass
+
+class ModelCircuitOpen(ModelAPIError):
+    """Circuit breaker is open for this model; the call was not attempted."""
+    pass
@@ -0,0 +1,356 @@
+# backend/generator/ai/hedge.py
+"""
+Hedged upstream requests: cut the latency tail caused by the occasional
+slow response.
+
+When a model call has not answered after the model's recent PERCENTILE
+latency, one duplicate request is fired and whichever answers first wins.
+Async callers cancel the loser; sync callers can't interrupt the SDK call,
+so the loser runs to completion in the pool and its result is dropped.
+Sync legs only ever take an idle pool thread: a call that finds the pool
+busy runs unhedged on the caller's thread instead of queueing behind other
+calls, and the delay is counted from when the primary actually started.
+
+Hedges are capped: at most BUDGET of the last WINDOW calls may hedge, and
+a hedge also needs its tokens from the rate limiter right away (it never
+waits for them). The stats compare p99 as served with p99 of the primary
+requests alone, next to the extra tokens the hedges cost. Pass
+`record_attempt` (accounting.attempt_recorder) to get a ModelCall row for
+the losing leg once it has settled.
+
+Configured by settings.GENERATOR_HEDGING:
+    ENABLED       off by default
+    PERCENTILE    hedge after this percentile of recent latency
+    MIN_SAMPLES   latencies needed per model before hedging starts
+    MIN_DELAY_MS  never hedge sooner than this
+    BUDGET        max share of calls that may hedge (0.05 = 5%)
+    WINDOW        calls/latencies remembered per model
+    MAX_THREADS   pool size for sync hedging (bounds hedgeable calls in flight, not calls)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .. import accounting
+from . import throttle
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": False,
+    "PERCENTILE": 95,
+    "MIN_SAMPLES": 20,
+    "MIN_DELAY_MS": 200,
+    "BUDGET": 0.05,
+    "WINDOW": 1000,
+    "MAX_THREADS": 8,
+}
+
+# A call: fills the meta dict it's given (shape, usage) and returns the JSON text
+Call = Callable[[Dict[str, Any]], str]
+AsyncCall = Callable[[Dict[str, Any]], Awaitable[str]]
+
+_lock = threading.Lock()
+_latencies: Dict[str, Deque[float]] = defaultdict(deque)   # per model, primary + winners
+_hedged_window: Deque[bool] = deque()
+_served_ms: Deque[float] = deque()
+_primary_ms: Deque[float] = deque()
+_stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0, "throttled": 0, "pool_busy": 0, "extra_tokens": 0}
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_size = 0
+_pool_busy = 0   # legs running in the pool; never more than _pool_size, so nothing queues
+_pool_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_HEDGING", {}) or {})
+    return cfg
+
+
+def enabled() -> bool:
+    return bool(_config()["ENABLED"])
+
+
+def _get_pool(size: int) -> ThreadPoolExecutor:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None:
+            _pool_size = max(2, size)
+            _pool = ThreadPoolExecutor(max_workers=_pool_size, thread_name_prefix="hedge")
+        return _pool
+
+
+def _claim() -> bool:
+    """Take an idle pool thread for one leg, or return False if every thread is busy."""
+    global _pool_busy
+    with _pool_lock:
+        if _pool_busy < _pool_size:
+            _pool_busy += 1
+            return True
+    with _lock:
+        _stats["pool_busy"] += 1
+    return False
+
+
+def _release(_fut: Optional[Future] = None) -> None:
+    global _pool_busy
+    with _pool_lock:
+        _pool_busy -= 1
+
+
+def _submit(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+    """Run `fn` on the pool thread taken by _claim(); the thread is given back when it returns."""
+    try:
+        fut = pool.submit(fn, *args)
+    except BaseException:
+        _release()
+        raise
+    fut.add_done_callback(_release)
+    return fut
+
+
+def _push(window: Deque, value, limit: int) -> None:
+    window.append(value)
+    while len(window) > limit:
+        window.popleft()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def hedge_delay(model: str) -> Optional[float]:
+    """Seconds to wait before hedging a call to `model`, or None if there's too little data."""
+    cfg = _config()
+    with _lock:
+        samples = list(_latencies.get(model, ()))
+    if len(samples) < int(cfg["MIN_SAMPLES"]):
+        return None
+    return max(float(cfg["MIN_DELAY_MS"]), _percentile(samples, float(cfg["PERCENTILE"]))) / 1000.0
+
+
+def _may_hedge(model: str, tokens: int, cfg: Dict[str, Any]) -> bool:
+    with _lock:
+        recent = len(_hedged_window)
+        used = sum(_hedged_window)
+        if recent and (used + 1) / recent > float(cfg["BUDGET"]):
+            _stats["over_budget"] += 1
+            return False
+    if not throttle.try_acquire(model, tokens):
+        with _lock:
+            _stats["throttled"] += 1
+        return False
+    return True
+
+
+def _record(model: str, *, served_ms: float, primary_ms: Optional[float], hedged: bool, hedge_won: bool, cfg: Dict[str, Any]) -> None:
+    window = int(cfg["WINDOW"])
+    with _lock:
+        _stats["calls"] += 1
+        _stats["hedged"] += int(hedged)
+        _stats["hedge_wins"] += int(hedge_won)
+        _push(_hedged_window, hedged, window)
+        _push(_latencies[model], served_ms, window)
+        _push(_served_ms, served_ms, window)
+        if primary_ms is not None:
+            _push(_primary_ms, primary_ms, window)
+
+
+def _extra_tokens(meta: Dict[str, Any], fallback: int) -> None:
+    usage = meta.get("usage") or {}
+    spent = int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0)
+    with _lock:
+        _stats["extra_tokens"] += spent or fallback
+
+
+def _record_loser(record_attempt: Optional[Callable[..., None]], leg: Dict[str, Any], started: float,
+                  error: Optional[BaseException] = None) -> None:
+    if record_attempt is not None:
+        record_attempt(
+            attempt=accounting.HEDGE_LOSER, shape=leg.get("shape", ""), usage=leg.get("usage"),
+            latency_ms=(time.perf_counter() - started) * 1000, error=error.__class__.__name__ if error else "",
+        )
+
+
+def run(call: Call, *, model: str, tokens: int, meta: Optional[Dict[str, Any]] = None,
+        record_attempt: Optional[Callable[..., None]] = None) -> str:
+    """Run `call`, hedging it once if it is slower than usual. The winner's meta is copied into `meta`."""
+    cfg = _config()
+    delay = hedge_delay(model) if cfg["ENABLED"] else None
+    t0 = time.perf_counter()
+    if delay is None:
+        legs = [{}]
+        text = call(legs[0])
+        _fill(meta, legs[0])
+        if cfg["ENABLED"]:
+            ms = (time.perf_counter() - t0) * 1000
+            _record(model, served_ms=ms, primary_ms=ms, hedged=False, hedge_won=False, cfg=cfg)
+        return text
+
+    pool = _get_pool(int(cfg["MAX_THREADS"]))
+    legs: List[Dict[str, Any]] = [{}, {}]
+    started = [t0, t0]
+    running = threading.Event()
+
+    def _primary(leg: Dict[str, Any]) -> str:
+        started[0] = time.perf_counter()
+        running.set()
+        return call(leg)
+
+    if not _claim():
+        # pool full: don't queue behind other calls, just make this one unhedged
+        text = call(legs[0])
+        _fill(meta, legs[0])
+        ms = (time.perf_counter() - t0) * 1000
+        _record(model, served_ms=ms, primary_ms=ms, hedged=False, hedge_won=False, cfg=cfg)
+        return text
+    primary = _submit(pool, _primary, legs[0])
+    running.wait()
+    done, _ = wait([primary], timeout=max(0.0, delay - (time.perf_counter() - started[0])))
+    hedge: Optional[Future] = None
+    if not done and _claim():
+        if _may_hedge(model, tokens, cfg):
+            started[1] = time.perf_counter()
+            hedge = _submit(pool, call, legs[1])
+        else:
+            _release()
+    if hedge is None:
+        text = primary.result()
+        _fill(meta, legs[0])
+        ms = (time.perf_counter() - t0) * 1000
+        _record(model, served_ms=ms, primary_ms=ms, hedged=False, hedge_won=False, cfg=cfg)
+        return text
+
+    logger.info("Hedging %s call after %.0fms", model, delay * 1000)
+    futures: List[Future] = [primary, hedge]
+    pending = set(futures)
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is not None:
+                error = error or fut.exception()
+                continue
+            won = futures.index(fut)
+            served = (time.perf_counter() - t0) * 1000
+            loser = futures[1 - won]
+            _fill(meta, legs[won])
+
+            def _settle(f: Future, won=won, served=served) -> None:
+                # loser finished (or failed) after we answered: count its latency and tokens
+                primary_ms = served if won == 0 else (time.perf_counter() - t0) * 1000
+                _record(model, served_ms=served, primary_ms=primary_ms, hedged=True, hedge_won=won == 1, cfg=cfg)
+                _extra_tokens(legs[1 - won], tokens)
+                _record_loser(record_attempt, legs[1 - won], started[1 - won], f.exception())
+
+            if loser.done():
+                _settle(loser)
+            else:
+                loser.add_done_callback(_settle)
+            return fut.result()
+    # both legs failed: the caller accounts for the error it gets, the other leg is the loser
+    other = 1 if futures[0].exception() is error else 0
+    _record_loser(record_attempt, legs[other], started[other], futures[other].exception())
+    raise error
+
+
+async def run_async(call: AsyncCall, *, model: str, tokens: int, meta: Optional[Dict[str, Any]] = None,
+                    record_attempt: Optional[Callable[..., None]] = None) -> str:
+    """Async twin of run(): the losing request is cancelled."""
+    cfg = _config()
+    delay = hedge_delay(model) if cfg["ENABLED"] else None
+    t0 = time.perf_counter()
+    if delay is None:
+        leg: Dict[str, Any] = {}
+        text = await call(leg)
+        _fill(meta, leg)
+        if cfg["ENABLED"]:
+            ms = (time.perf_counter() - t0) * 1000
+            _record(model, served_ms=ms, primary_ms=ms, hedged=False, hedge_won=False, cfg=cfg)
+        return text
+
+    from asgiref.sync import sync_to_async
+
+    legs: List[Dict[str, Any]] = [{}, {}]
+    primary = asyncio.ensure_future(call(legs[0]))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done or not await sync_to_async(_may_hedge, thread_sensitive=False)(model, tokens, cfg):
+        text = await primary
+        _fill(meta, legs[0])
+        ms = (time.perf_counter() - t0) * 1000
+        _record(model, served_ms=ms, primary_ms=ms, hedged=False, hedge_won=False, cfg=cfg)
+        return text
+
+    logger.info("Hedging %s call after %.0fms", model, delay * 1000)
+    started = [t0, time.perf_counter()]
+    tasks = [primary, asyncio.ensure_future(call(legs[1]))]
+    pending = set(tasks)
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                won = tasks.index(task)
+                served = (time.perf_counter() - t0) * 1000
+                _fill(meta, legs[won])
+                # a cancelled primary is only known to be slower than the winner: a lower bound
+                _record(model, served_ms=served, primary_ms=served, hedged=True, hedge_won=won == 1, cfg=cfg)
+                _extra_tokens(legs[1 - won], tokens)
+                loser = tasks[1 - won]
+                loser_error = loser.exception() if loser.done() else asyncio.CancelledError()
+                _record_loser(record_attempt, legs[1 - won], started[1 - won], loser_error)
+                return task.result()
+        # both legs failed: the caller accounts for the error it gets, the other leg is the loser
+        other = 1 if tasks[0].exception() is error else 0
+        _record_loser(record_attempt, legs[other], started[other], tasks[other].exception())
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _fill(meta: Optional[Dict[str, Any]], leg: Dict[str, Any]) -> None:
+    if meta is not None:
+        meta.update(leg)
+
+
+def reset() -> None:
+    with _lock:
+        _latencies.clear()
+        _hedged_window.clear()
+        _served_ms.clear()
+        _primary_ms.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+def hedge_stats() -> Dict[str, Any]:
+    """Counters plus p99 as served vs. p99 of the primary requests alone."""
+    with _lock:
+        out: Dict[str, Any] = dict(_stats)
+        served, primary = list(_served_ms), list(_primary_ms)
+    out["hedge_rate"] = round(out["hedged"] / out["calls"], 4) if out["calls"] else 0.0
+    out["p99_ms"] = round(_percentile(served, 99), 1) if served else None
+    out["p99_primary_ms"] = round(_percentile(primary, 99), 1) if primary else None
+    out["p99_saved_ms"] = (
+        round(out["p99_primary_ms"] - out["p99_ms"], 1) if served and primary else None
+    )
+    return out
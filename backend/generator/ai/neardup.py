@@ -0,0 +1,275 @@
+# backend/generator/ai/neardup.py
+"""
+Near-duplicate brief lookup: catches re-submissions that only differ in
+casing, accents, punctuation, whitespace or filler words.
+
+Briefs are normalized to word bigram shingles (word order counts: "Ana
+pays Bruno" is not "Bruno pays Ana"), fingerprinted with MinHash and
+indexed with LSH banding. Candidates from the LSH buckets are confirmed
+with exact Jaccard similarity against the configured threshold, and only
+reused when their key facts agree: the same amounts and other numbers,
+currency and dates (month/weekday names), in the same order, and every
+name (a title-case word not starting a sentence) in either brief present
+in the other. A brief for "€200 due 3 May" never gets the stored result
+for "€500 due 5 May", nor one for Rita the result for Ana.
+
+The index is per process and scoped, so only briefs with the same
+(niche, language, tone, asset type, other request fields) can match.
+
+Configured by settings.GENERATOR_NEAR_DUP:
+    ENABLED                 turn the layer on/off
+    THRESHOLD               minimum Jaccard similarity of the shingle sets
+    MAX_ENTRIES_PER_SCOPE   oldest entries are dropped past this size
+    NUM_PERM / BANDS        MinHash permutations and LSH bands (NUM_PERM % BANDS == 0)
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, FrozenSet, Hashable, List, NamedTuple, Optional, Tuple
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "THRESHOLD": 0.8,
+    "MAX_ENTRIES_PER_SCOPE": 500,
+    "NUM_PERM": 64,
+    "BANDS": 16,
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"[€$£]|\d+(?:[.,:/-]\d+)*")
+_NAME_RE = re.compile(r"[A-Z][a-z'-]+")
+_SENTENCE_END = (".", "!", "?", ":", ";", "\n")
+_MERSENNE = (1 << 61) - 1
+
+# Words that never change what is being asked for (EN + PT, accents stripped)
+STOPWORDS = frozenset("""
+a an the to of for and or in on at by with from this that these those is are be please pls
+send write make create give me my our your we i you it
+o os as um uma uns umas de do da dos das para por com em no na nos nas e ou que se
+envia enviar escreve escrever faz fazer cria criar meu minha nosso nossa teu tua favor
+""".split())
+
+# Words that are facts, not phrasing (EN + PT, accents stripped): reuse needs them equal
+FACT_WORDS = frozenset("""
+january february march april may june july august september october november december
+jan feb mar apr jun jul aug sep sept oct nov dec
+monday tuesday wednesday thursday friday saturday sunday today tomorrow yesterday
+janeiro fevereiro marco abril maio junho julho agosto setembro outubro novembro dezembro
+segunda terca quarta quinta sexta sabado domingo hoje amanha ontem
+eur euro euros usd dollar dollars gbp pound pounds
+""".split())
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents, drop punctuation and collapse whitespace."""
+    text = _PUNCT_RE.sub(" ", _strip_accents(text).lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def words(text: str) -> List[str]:
+    """Content words in order (stopwords dropped, unless that leaves nothing)."""
+    all_words = normalize(text).split()
+    return [w for w in all_words if w not in STOPWORDS] or all_words
+
+
+def tokens(text: str) -> FrozenSet[str]:
+    """Word bigram shingles (a single word is its own shingle)."""
+    ws = words(text)
+    if len(ws) < 2:
+        return frozenset(ws)
+    return frozenset(f"{a} {b}" for a, b in zip(ws, ws[1:]))
+
+
+class Facts(NamedTuple):
+    values: Tuple[str, ...]   # numbers, currency and date words, in order
+    names: FrozenSet[str]     # lowercased
+    words: FrozenSet[str]     # every normalized word, to find the other brief's names in
+
+    def agree(self, other: "Facts") -> bool:
+        return self.values == other.values and self.names <= other.words and other.names <= self.words
+
+
+def key_facts(text: str) -> Facts:
+    raw = _strip_accents(text)
+    all_words = normalize(text).split()
+    values = _NUMBER_RE.findall(raw) + [w for w in all_words if w in FACT_WORDS]
+    names = set()
+    sentence_start = True
+    for word in raw.split():
+        bare = word.strip("\"'()[]{},.!?:;")
+        if not sentence_start and _NAME_RE.fullmatch(bare) and bare.lower() not in STOPWORDS:
+            names.add(bare.lower())
+        sentence_start = word.endswith(_SENTENCE_END)
+    return Facts(tuple(values), frozenset(names), frozenset(all_words))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _token_hash(tok: str) -> int:
+    return int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int, seed: int = 1):
+        rnd = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rnd.randrange(1, _MERSENNE), rnd.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    def signature(self, toks: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [_token_hash(t) for t in toks] or [0]
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._params)
+
+
+class NearDupIndex:
+    """MinHash/LSH index of stored results, partitioned by scope."""
+
+    def __init__(self, *, threshold: float, max_entries_per_scope: int, num_perm: int, bands: int):
+        if num_perm % bands:
+            raise ValueError("NUM_PERM must be a multiple of BANDS")
+        self.threshold = threshold
+        self.max_entries = max_entries_per_scope
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._seq = 0
+        # scope -> entry id -> (shingles, key facts, signature, result)
+        self._entries: Dict[Hashable, "OrderedDict[int, Tuple[FrozenSet[str], Facts, Tuple[int, ...], Dict[str, Any]]]"] = defaultdict(OrderedDict)
+        # scope -> (band no, band hash) -> entry ids
+        self._buckets: Dict[Hashable, Dict[Tuple[int, int], set]] = defaultdict(lambda: defaultdict(set))
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, sig: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        return [(b, hash(sig[b * self.rows:(b + 1) * self.rows])) for b in range(self.bands)]
+
+    def lookup(self, scope: Hashable, brief: str) -> Optional[Dict[str, Any]]:
+        toks, facts = tokens(brief), key_facts(brief)
+        sig = self.hasher.signature(toks)
+        with self._lock:
+            entries = self._entries.get(scope)
+            best, best_sim = None, 0.0
+            if entries:
+                buckets = self._buckets[scope]
+                candidates = set()
+                for bk in self._band_keys(sig):
+                    candidates |= buckets.get(bk, set())
+                for eid in candidates:
+                    entry = entries.get(eid)
+                    if entry is None or not facts.agree(entry[1]):
+                        continue
+                    sim = jaccard(toks, entry[0])
+                    if sim >= self.threshold and sim > best_sim:
+                        best, best_sim = entry[3], sim
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(best)
+
+    def add(self, scope: Hashable, brief: str, result: Dict[str, Any]) -> None:
+        toks = tokens(brief)
+        sig = self.hasher.signature(toks)
+        with self._lock:
+            self._seq += 1
+            eid = self._seq
+            entries = self._entries[scope]
+            buckets = self._buckets[scope]
+            entries[eid] = (toks, key_facts(brief), sig, copy.deepcopy(result))
+            for bk in self._band_keys(sig):
+                buckets[bk].add(eid)
+            while len(entries) > self.max_entries:
+                old_id, (_, _, old_sig, _) = entries.popitem(last=False)
+                for bk in self._band_keys(old_sig):
+                    ids = buckets.get(bk)
+                    if ids is not None:
+                        ids.discard(old_id)
+                        if not ids:
+                            del buckets[bk]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "scopes": len(self._entries),
+                "size": sum(len(e) for e in self._entries.values()),
+            }
+
+
+_index: Optional[NearDupIndex] | bool = None
+_index_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_NEAR_DUP", {}) or {})
+    return cfg
+
+
+def get_index() -> Optional[NearDupIndex]:
+    """Process-wide index, or None when the layer is disabled."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                cfg = _config()
+                _index = NearDupIndex(
+                    threshold=float(cfg["THRESHOLD"]),
+                    max_entries_per_scope=int(cfg["MAX_ENTRIES_PER_SCOPE"]),
+                    num_perm=int(cfg["NUM_PERM"]),
+                    bands=int(cfg["BANDS"]),
+                ) if cfg["ENABLED"] else False
+    return _index or None
+
+
+def reset_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def make_scope(*, niche: Optional[str], language: str, tone: str, asset_type: str, extra: Any = None) -> Tuple[str, ...]:
+    """
+    Only the brief is matched fuzzily; every other request field must be equal.
+    `extra` carries those fields (audience, payment, signature...) and is hashed.
+    """
+    raw = json.dumps(extra, sort_keys=True, default=str, ensure_ascii=False)
+    extra_hash = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    return (niche or "general", language, tone, asset_type, extra_hash)
+
+
+def lookup(scope: Hashable, brief: str) -> Optional[Dict[str, Any]]:
+    index = get_index()
+    return index.lookup(scope, brief) if index is not None else None
+
+
+def remember(scope: Hashable, brief: str, result: Dict[str, Any]) -> None:
+    index = get_index()
+    if index is not None:
+        index.add(scope, brief, result)
+
+
+def near_dup_stats() -> Dict[str, int]:
+    index = get_index()
+    return index.stats() if index is not None else {"hits": 0, "misses": 0, "scopes": 0, "size": 0}
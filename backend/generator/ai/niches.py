@@ -100,10 +100,7 @@ NICHES: Dict[str, Dict[str, List[str] | str]] = {
     },
 }
 
-def niche_guide(niche_slug: str | None) -> str | None:
-    if not niche_slug:
-        return None
-    pack = NICHES.get(niche_slug.lower()) or NICHES["general"]
+def _render_guide(pack: Dict[str, List[str] | str]) -> str:
     lines: List[str] = []
     lines.append(f"Context: {pack['context']}")
     lines.append("Goals: " + "; ".join(pack["goals"]))          # type: ignore[index]
@@ -114,3 +111,11 @@ def niche_guide(niche_slug: str | None) -> str | None:
         lines.append("Preferred terms: " + ", ".join(pack["terms"]))  # type: ignore[index]
     lines.append("If a detail is unknown, keep it generic and do not invent specifics.")
     return "\n".join(lines)
+
+# Rendered once at import: the guide is part of the byte-stable prompt prefix
+NICHE_GUIDES: Dict[str, str] = {slug: _render_guide(pack) for slug, pack in NICHES.items()}
+
+def niche_guide(niche_slug: str | None) -> str | None:
+    if not niche_slug:
+        return None
+    return NICHE_GUIDES.get(niche_slug.lower()) or NICHE_GUIDES["general"]
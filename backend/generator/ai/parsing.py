@@ -1,3 +1,9 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
 def extract_json_text(resp: object) -> str:
     """
     Try multiple SDK response shapes to get the JSON output string.
@@ -22,3 +28,295 @@ def extract_json_text(resp: object) -> str:
         pass
 
     raise ValueError("Could not extract JSON text from model response")
+
+
+
+# -----------------------
+# Incremental parsing (streamed model output)
+# -----------------------
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS_RE = re.compile(r"[-+.\deE]+")
+_LITERALS = {"true": True, "false": False, "null": None}
+_WS = " \t\r\n"
+
+Path = Tuple[Any, ...]
+
+
+class SchemaViolation(ValueError):
+    """Streamed output can no longer match the schema (wrong value type)."""
+
+    def __init__(self, path: Path, reason: str):
+        super().__init__(f"{'/'.join(map(str, path)) or '<root>'}: {reason}")
+        self.path = path
+        self.reason = reason
+
+
+def _kind_of(ch: str) -> str:
+    if ch == "{":
+        return "object"
+    if ch == "[":
+        return "array"
+    if ch == '"':
+        return "string"
+    if ch in "tf":
+        return "boolean"
+    if ch == "n":
+        return "null"
+    return "number"
+
+
+def _type_ok(kind: str, expected) -> bool:
+    if expected is None:
+        return True
+    allowed = expected if isinstance(expected, list) else [expected]
+    if kind == "number" and "integer" in allowed:
+        return True
+    return kind in allowed
+
+
+class IncrementalJSONParser:
+    """
+    Feed model output chunk by chunk; get back every value that completed.
+
+    feed() returns a list of (path, value) events, where path is the tuple of
+    keys/indices leading to the value, e.g. ("subject",) or ("items", 2).
+    Containers are reported when they close, after their children.
+    Anything before the first "{" or "[" (code fences, chatter) is skipped.
+
+    With a JSON schema (an entry of SCHEMAS), values are checked as they
+    arrive. A value of the wrong type raises SchemaViolation as soon as its
+    first character is seen, so the caller can abort the upstream request.
+    Softer problems (unknown keys, enum, maxLength, required, minItems) are
+    collected in `violations` and left for coercion.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None):
+        self._buf = ""
+        self._pos = 0
+        self._stack: List[list] = []       # frames: [container, pending_key, schema]
+        self._state = "start"              # start | value | key_or_end | colon | comma_or_end | done
+        self._str_scan = 0                 # resume offset while waiting for a closing quote
+        self._schema = schema
+        self._pending_schema: Optional[Dict[str, Any]] = schema   # schema of the value about to start
+        self.violations: List[SchemaViolation] = []
+        self.value: Any = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def partial(self) -> Any:
+        """The object built so far (complete values only); useful after an abort."""
+        if self.done:
+            return self.value
+        return self._stack[0][0] if self._stack else None
+
+    def _path(self) -> Path:
+        path = []
+        for container, key, _ in self._stack:
+            path.append(key if isinstance(container, dict) else len(container))
+        return tuple(path)
+
+    # -- schema hooks --
+    def _soft(self, path: Path, reason: str) -> None:
+        self.violations.append(SchemaViolation(path, reason))
+
+    def _child_schema(self, key=None) -> Optional[Dict[str, Any]]:
+        if self._schema is None or not self._stack:
+            return None
+        container, _, schema = self._stack[-1]
+        if schema is None:
+            return None
+        if isinstance(container, dict):
+            props = schema.get("properties") or {}
+            if key not in props:
+                if schema.get("additionalProperties") is False:
+                    self._soft(self._path()[:-1] + (key,), "unexpected key")
+                return None
+            return props[key]
+        return schema.get("items")
+
+    def _start_value(self, ch: str) -> Optional[Dict[str, Any]]:
+        schema = self._pending_schema
+        if schema is not None and not _type_ok(_kind_of(ch), schema.get("type")):
+            raise SchemaViolation(self._path(), f"expected {schema.get('type')}, got {_kind_of(ch)}")
+        return schema
+
+    def _check_done(self, path: Path, value: Any, schema: Optional[Dict[str, Any]]) -> None:
+        if schema is None:
+            return
+        if "enum" in schema and value not in schema["enum"]:
+            self._soft(path, f"{value!r} not in {schema['enum']}")
+        if isinstance(value, str) and "maxLength" in schema and len(value) > schema["maxLength"]:
+            self._soft(path, f"longer than {schema['maxLength']}")
+        if isinstance(value, dict):
+            for key in schema.get("required", []):
+                if key not in value:
+                    self._soft(path, f"missing required key {key!r}")
+        if isinstance(value, list):
+            if len(value) < schema.get("minItems", 0):
+                self._soft(path, f"fewer than {schema['minItems']} items")
+            if "maxItems" in schema and len(value) > schema["maxItems"]:
+                self._soft(path, f"more than {schema['maxItems']} items")
+
+    # -- tokenizer --
+    def _read_string(self):
+        """Return (decoded, end) or None if the closing quote hasn't arrived yet."""
+        buf, start = self._buf, self._pos
+        i = max(self._str_scan, start + 1)
+        while True:
+            q = buf.find('"', i)
+            if q < 0:
+                self._str_scan = len(buf)
+                return None
+            bs = 0
+            j = q - 1
+            while buf[j] == "\\":
+                bs += 1
+                j -= 1
+            if bs % 2 == 0:
+                self._str_scan = 0
+                return json.loads(buf[start:q + 1]), q + 1
+            i = q + 1
+
+    def _emit_value(self, value, schema, events: list) -> None:
+        if not self._stack:
+            self._check_done((), value, schema)
+            self.value = value
+            self._state = "done"
+            events.append(((), value))
+            return
+        path = self._path()
+        self._check_done(path, value, schema)
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict):
+            frame[0][frame[1]] = value
+            frame[1] = None
+        else:
+            frame[0].append(value)
+        events.append((path, value))
+        self._state = "comma_or_end"
+
+    def feed(self, chunk: str, *, final: bool = False) -> List[Tuple[Path, Any]]:
+        events: List[Tuple[Path, Any]] = []
+        self._buf += chunk or ""
+        buf = self._buf
+        n = len(buf)
+
+        while self._pos < n and self._state != "done":
+            ch = buf[self._pos]
+            if ch in _WS:
+                self._pos += 1
+                continue
+            state = self._state
+
+            if state == "start":
+                if ch in "{[":
+                    self._state = "value"
+                else:
+                    self._pos += 1
+                continue
+
+            if state in ("value", "key_or_end", "comma_or_end") and ch in "}]":
+                if state == "value" and not (self._stack and isinstance(self._stack[-1][0], list) and not self._stack[-1][0]):
+                    raise ValueError(f"Unexpected {ch!r} at offset {self._pos}")
+                container, _, schema = self._stack.pop()
+                if (ch == "}") != isinstance(container, dict):
+                    raise ValueError(f"Mismatched {ch!r} at offset {self._pos}")
+                self._pos += 1
+                self._emit_value(container, schema, events)
+                continue
+
+            if state == "comma_or_end":
+                if ch != ",":
+                    raise ValueError(f"Expected ',' at offset {self._pos}")
+                self._pos += 1
+                if isinstance(self._stack[-1][0], dict):
+                    self._state = "key_or_end"
+                else:
+                    self._state = "value"
+                    self._pending_schema = self._child_schema()
+                continue
+
+            if state == "key_or_end":
+                if ch != '"':
+                    raise ValueError(f"Expected key at offset {self._pos}")
+                got = self._read_string()
+                if got is None:
+                    break
+                key, self._pos = got
+                self._stack[-1][1] = key
+                self._pending_schema = self._child_schema(key)
+                self._state = "colon"
+                continue
+
+            if state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Expected ':' at offset {self._pos}")
+                self._pos += 1
+                self._state = "value"
+                continue
+
+            # state == "value"
+            schema = self._start_value(ch)
+            if ch == "{":
+                self._stack.append([{}, None, schema])
+                self._pos += 1
+                self._state = "key_or_end"
+            elif ch == "[":
+                self._stack.append([[], None, schema])
+                self._pos += 1
+                self._state = "value"
+                self._pending_schema = self._child_schema()
+            elif ch == '"':
+                got = self._read_string()
+                if got is None:
+                    break
+                value, self._pos = got
+                self._emit_value(value, schema, events)
+            else:
+                m = _NUMBER_CHARS_RE.match(buf, self._pos)
+                if m:
+                    if m.end() == n and not final:
+                        break  # number may continue in the next chunk
+                    num = m.group(0)
+                    if not _NUMBER_RE.fullmatch(num):
+                        raise ValueError(f"Invalid number {num!r} at offset {self._pos}")
+                    self._pos = m.end()
+                    self._emit_value(float(num) if any(c in num for c in ".eE") else int(num), schema, events)
+                    continue
+                for lit, val in _LITERALS.items():
+                    if buf.startswith(lit, self._pos):
+                        self._pos += len(lit)
+                        self._emit_value(val, schema, events)
+                        break
+                else:
+                    if n - self._pos < 5 and not final:
+                        break  # partial literal
+                    raise ValueError(f"Unexpected {ch!r} at offset {self._pos}")
+
+        # Drop consumed text so the buffer only holds the unfinished token
+        if self._pos:
+            if self._str_scan:
+                self._str_scan -= self._pos
+            self._buf = buf[self._pos:]
+            self._pos = 0
+        return events
+
+    def close(self) -> Any:
+        """Flush the tail; returns the complete value or raises ValueError."""
+        if not self.done:
+            self.feed("", final=True)
+        if not self.done:
+            raise ValueError("Incomplete JSON")
+        return self.value
+
+
+def parse_json_text(text: str) -> Any:
+    """Single parse of a complete response (orjson); None when it isn't valid JSON."""
+    if not text:
+        return None
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
@@ -1,6 +1,22 @@
 # backend/generator/ai/prompts.py
+"""
+Prompt assembly, laid out for upstream prompt-prefix caching.
+
+OpenAI caches the longest previously seen prefix of a request, so every
+byte that is the same across requests goes first and in a fixed order:
+
+    system:  SYSTEM_PROMPT
+    user:    asset type + schema instructions + niche guide   (static per type/niche)
+             language, tone, audience, ... , user brief       (per request)
+
+The static block is built once per (asset type, niche) and reused verbatim.
+"""
+import json
+from functools import lru_cache
 from typing import Optional, Literal
 from .types import AssetType
+from .schemas import SCHEMAS
+from .niches import niche_guide
 
 SYSTEM_PROMPT = """You are a senior ops copywriter.
 - Output must follow the JSON schema exactly (no extra keys).
@@ -9,33 +25,64 @@ SYSTEM_PROMPT = """You are a senior ops copywriter.
 - Never include secrets, unsafe advice, or illegal guidance.
 """
 
+ASSET_NOTES = {
+    "bundle": "Write all three for the same brief: the email, a short SMS reminder of it and the checklist "
+              "to get it done. Keep names, dates and amounts identical across them.",
+}
+
+# Precompiled at import: one block per asset type
+SCHEMA_INSTRUCTIONS = {
+    asset_type: "\n".join([
+        f"Asset type: {asset_type}",
+        *([ASSET_NOTES[asset_type]] if asset_type in ASSET_NOTES else []),
+        f"Output: one JSON object ({name}) matching this schema:",
+        json.dumps(schema, separators=(",", ":"), sort_keys=True),
+    ])
+    for asset_type, (name, schema) in SCHEMAS.items()
+}
+
+# language="both" keeps the single-language static prefix (and its upstream cache) and asks for the pair here
+LANGUAGE_LINES = {
+    "en": "Language: English",
+    "pt": "Language: Português (PT)",
+    "both": 'Language: English and Português (PT). Return {"en": <the asset in English>, '
+            '"pt": <the same asset in Português (PT)>}, each matching the schema above, same facts in both.',
+}
+
+@lru_cache(maxsize=None)
+def static_prefix(asset_type: str, niche: Optional[str] = None) -> str:
+    """Byte-stable head of the user prompt for this asset type and niche."""
+    pieces = [SCHEMA_INSTRUCTIONS.get(asset_type) or f"Asset type: {asset_type}"]
+    guide = niche_guide(niche)
+    if guide:
+        pieces += [f"Niche: {niche}", "Niche guide:", guide]
+    return "\n".join(pieces)
+
 def build_user_prompt(
     asset_type: AssetType,
     prompt: str,
     *,
-    language: Literal["en", "pt"] = "en",
+    language: Literal["en", "pt", "both"] = "en",
     tone: Literal["professional", "friendly", "urgent", "casual"] = "professional",
     audience: Optional[str] = None,
     constraints: Optional[str] = None,
     brand_voice: Optional[str] = None,
     include_signature: bool = False,
     niche: Optional[str] = None,
-    niche_guide: Optional[str] = None,
 ) -> str:
+    # Static prefix first (cacheable upstream), request-specific fields last
     pieces = [
-        f"Asset type: {asset_type}",
-        f"Language: {'English' if language=='en' else 'Português (PT)'}",
+        static_prefix(asset_type, niche),
+        "Request:",
+        LANGUAGE_LINES.get(language, LANGUAGE_LINES["pt"]),
         f"Tone: {tone}",
         f"Audience: {audience or 'general client'}",
         f"Constraints: {constraints or 'be clear, short, and specific'}",
         f"Brand voice: {brand_voice or 'neutral'}",
         f"Include signature: {include_signature}",
+        "User brief:",
+        prompt.strip(),
     ]
-    if niche:
-        pieces.append(f"Niche: {niche}")
-    if niche_guide:
-        pieces += ["Niche guide:", niche_guide]
-    pieces += ["User brief:", prompt.strip()]
     return "\n".join(pieces)
 
 def detect_asset_type(prompt: str) -> str:
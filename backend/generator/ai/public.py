@@ -2,49 +2,52 @@
 from __future__ import annotations
 
 import json
-from typing import Optional, Dict, Any, Literal
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Literal, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
 
 from .types import AssetType
-from .schemas import SCHEMAS
+from .schemas import BUNDLE_PARTS, LANGUAGES, PAIRED_SCHEMAS, SCHEMAS
 from .prompts import SYSTEM_PROMPT, build_user_prompt, detect_asset_type
-from .niches import niche_guide as build_niche_guide
 from .coercers import coerce_to_schema, truncate
-from .api import call_model_with_schema, client
-from .errors import ModelQuotaExceeded, ModelRateLimited, ModelTimeout, ModelAPIError
+from . import api
+from .api import call_model_with_schema, call_model_with_schema_async
+from .parsing import parse_json_text
+from .validation import repair, validate
+from .cache import cache_key, cache_get, cache_set
+from . import budgets, neardup, router, singleflight, usage
+from .. import accounting, timing
+from .errors import ModelCircuitOpen, ModelQuotaExceeded, ModelRateLimited, ModelTimeout, ModelAPIError
 
+UPSTREAM_ERRORS = (ModelQuotaExceeded, ModelRateLimited, ModelTimeout, ModelAPIError)
 
-def generate_micro_sop(
+
+def _niche_of(constraints: Optional[Any]) -> Optional[str]:
+    return constraints.get("niche") if isinstance(constraints, dict) else None
+
+
+def _prepare(
     asset_type: AssetType,
     prompt: str,
     *,
-    language: Literal["en", "pt"] = "en",   # <-- output language is user-selected
-    tone: Literal["professional", "friendly", "urgent", "casual"] = "professional",
-    audience: Optional[str] = None,
-    constraints: Optional[Any] = None,  # may be a dict (we read constraints["niche"]) or a string
-    brand_voice: Optional[str] = None,
-    include_signature: bool = False,
-    model: str = "gpt-4o-mini",
-    temperature: float = 0.4,
-    max_output_tokens: int = 1200,
-    auto_coerce: bool = True,
-) -> Dict[str, Any]:
-    """
-    - Select schema by asset_type (or auto-detect).
-    - Build user prompt incl. niche guide and requested output language (EN/PT).
-    - Call model with SDK-compatible wrapper.
-    - On upstream failure, synthesize a valid object (respecting language).
-    """
-    if asset_type not in ("email", "checklist", "sms", "auto"):
+    language: str,
+    tone: str,
+    audience: Optional[str],
+    constraints: Optional[Any],
+    brand_voice: Optional[str],
+    include_signature: bool,
+) -> Tuple[str, str, Dict[str, Any], str]:
+    """Resolve the asset type and schema (paired for language="both"), and build the user prompt."""
+    if asset_type not in ("email", "checklist", "sms", "bundle", "auto"):
         raise ValueError(f"Unsupported asset_type: {asset_type}")
 
     resolved_type = detect_asset_type(prompt) if asset_type == "auto" else asset_type
-    schema_name, schema_def = SCHEMAS[resolved_type]
+    schema_name, schema_def = (PAIRED_SCHEMAS if language == "both" else SCHEMAS)[resolved_type]
 
-    # Niche (from constraints dict, if present)
-    niche_slug: Optional[str] = None
-    if isinstance(constraints, dict):
-        niche_slug = constraints.get("niche")
-    guide = build_niche_guide(niche_slug)
+    # Niche (from constraints dict, if present); its guide is part of the static prompt prefix
+    niche_slug = _niche_of(constraints)
 
     user_prompt = build_user_prompt(
         resolved_type,
@@ -56,57 +59,102 @@ def generate_micro_sop(
         brand_voice=brand_voice,
         include_signature=include_signature,
         niche=niche_slug,
-        niche_guide=guide,
     )
+    return resolved_type, schema_name, schema_def, user_prompt
 
-    # Call model, with graceful fallbacks
-    try:
-        json_text = call_model_with_schema(
-            user_prompt=user_prompt,
-            schema_name=schema_name,
-            schema_def=schema_def,
-            system_prompt=SYSTEM_PROMPT,
-            model=model,
-            temperature=temperature,
-            max_output_tokens=max_output_tokens,
-        )
-    except (ModelQuotaExceeded, ModelRateLimited, ModelTimeout, ModelAPIError) as e:
-        if auto_coerce:
-            # Synthesize minimal valid asset from the prompt (respect language)
-            data = coerce_to_schema(resolved_type, None, prompt, language=language)
-            if resolved_type == "sms":
-                data["message"] = truncate(str(data.get("message", "")), 320)
-                if "cta" in data and data["cta"]:
-                    data["cta"] = truncate(str(data["cta"]), 120)
-            if resolved_type == "email":
-                data.setdefault("summary", str(data.get("body_markdown", ""))[:160])
-            return data
-        # clean, user-facing error
-        msg = "Upstream model unavailable"
-        if isinstance(e, ModelQuotaExceeded):
-            msg = "Model quota exceeded"
-        elif isinstance(e, ModelRateLimited):
-            msg = "Model temporarily rate-limited"
-        elif isinstance(e, ModelTimeout):
-            msg = "Upstream model timeout"
-        raise ValueError(msg) from e
-
-    # Parse or coerce to schema
-    try:
-        data = json.loads(json_text)
-        for key in schema_def.get("required", []):
-            if key not in data:
-                raise KeyError(f"Missing required key '{key}'")
-    except Exception:
-        if not auto_coerce:
-            snippet = (json_text or "")[:500]
-            raise ValueError(f"Model did not return valid {resolved_type} JSON. Raw snippet:\n{snippet}")
+
+def _route(resolved_type: str, prompt: str, *, constraints: Optional[Any], model: Optional[str], temperature: Optional[float]) -> router.Route:
+    """An explicit model wins; otherwise the router picks model and temperature (router.py)."""
+    if model is not None:
+        return router.explicit(model, 0.4 if temperature is None else temperature)
+    route = router.choose(resolved_type, prompt, niche=_niche_of(constraints))
+    return route if temperature is None else route._replace(temperature=float(temperature))
+
+
+def _routed(route: router.Route, call: Callable[[], str], meta: Optional[Dict[str, Any]] = None) -> Callable[[], str]:
+    """
+    Wrap the upstream call so its latency/outcome feed the router (once, in
+    the coalescing leader); a failed call notes its error in `meta`.
+    """
+    def run() -> str:
+        t0 = time.perf_counter()
+        try:
+            text = call()
+        except UPSTREAM_ERRORS as e:
+            if not isinstance(e, ModelCircuitOpen):
+                router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=True)
+                if meta is not None:
+                    meta["error"] = e.__class__.__name__
+            raise
+        router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=False)
+        return text
+    return run
+
+
+def _routed_async(
+    route: router.Route, call: Callable[[], Awaitable[str]], meta: Optional[Dict[str, Any]] = None,
+) -> Callable[[], Awaitable[str]]:
+    async def run() -> str:
+        t0 = time.perf_counter()
         try:
-            parsed_any = json.loads(json_text) if json_text else None
-        except Exception:
-            parsed_any = None
-        data = coerce_to_schema(resolved_type, parsed_any, prompt, language=language)
+            text = await call()
+        except UPSTREAM_ERRORS as e:
+            if not isinstance(e, ModelCircuitOpen):
+                router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=True)
+                if meta is not None:
+                    meta["error"] = e.__class__.__name__
+            raise
+        router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=False)
+        return text
+    return run
+
+
+def _output_budget(
+    resolved_type: str, schema_def: Dict[str, Any], *, constraints: Optional[Any], language: str, requested: Optional[int],
+) -> int:
+    """An explicit max_output_tokens wins; otherwise the budget policy picks one (budgets.py)."""
+    if requested is not None:
+        return int(requested)
+    return budgets.choose(resolved_type, niche=_niche_of(constraints), language=language, schema_def=schema_def)
+
 
+def _record_call(
+    meta: Dict[str, Any], json_text: str, resolved_type: str, *,
+    route: router.Route, constraints: Optional[Any], language: str, budget: int, t0: float, observe: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """
+    Usage and output size of a call this request made itself (coalesced
+    followers have no meta). Returns the call's ModelCall row (accounting.py)
+    for the caller to record once the output has been checked.
+    """
+    if not meta:
+        return None
+    niche = _niche_of(constraints)
+    latency_ms = (time.perf_counter() - t0) * 1000
+    if observe and "error" not in meta:
+        usage.record(niche=niche, asset_type=resolved_type, model=route.model, usage=meta.get("usage"))
+        budgets.observe(
+            resolved_type, niche=niche, language=language, budget=budget, output_text=json_text,
+            usage=meta.get("usage"), latency_ms=latency_ms,
+        )
+    return accounting.call_row(
+        model=route.model, route=route.name, shape=meta.get("shape", ""), asset_type=resolved_type, niche=niche,
+        language=language, usage=meta.get("usage"), max_output_tokens=budget, latency_ms=latency_ms,
+        error=meta.get("error", ""),
+    )
+
+
+def _attempt_recorder(resolved_type: str, *, route: router.Route, constraints: Optional[Any], language: str, budget: int):
+    """ModelCall rows for the retried attempts and hedge losers of this request's call (api.py, hedge.py)."""
+    return accounting.attempt_recorder(
+        model=route.model, route=route.name, asset_type=resolved_type, niche=_niche_of(constraints),
+        language=language, max_output_tokens=budget,
+    )
+
+
+def _polish(resolved_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    if resolved_type == "bundle":
+        return {part: _polish(part, data[part]) for part in BUNDLE_PARTS}
     # Final polish per type
     if resolved_type == "sms":
         data["message"] = truncate(str(data.get("message", "")), 320)
@@ -114,8 +162,331 @@ def generate_micro_sop(
             data["cta"] = truncate(str(data["cta"]), 120)
     if resolved_type == "email":
         data.setdefault("summary", str(data.get("body_markdown", ""))[:160])
+    return data
+
+
+def _on_upstream_error(e: Exception, resolved_type: str, prompt: str, *, language: str, auto_coerce: bool) -> Dict[str, Any]:
+    if auto_coerce and language == "both":
+        return {lang: _on_upstream_error(e, resolved_type, prompt, language=lang, auto_coerce=True) for lang in LANGUAGES}
+    if auto_coerce:
+        # Synthesize minimal valid asset from the prompt (respect language)
+        data = coerce_to_schema(resolved_type, None, prompt, language=language)
+        return _polish(resolved_type, data)
+    # clean, user-facing error
+    msg = "Upstream model unavailable"
+    if isinstance(e, ModelQuotaExceeded):
+        msg = "Model quota exceeded"
+    elif isinstance(e, ModelRateLimited):
+        msg = "Model temporarily rate-limited"
+    elif isinstance(e, ModelTimeout):
+        msg = "Upstream model timeout"
+    raise ValueError(msg) from e
+
+
+_UNPARSED = object()
+
 
+def _finalize(
+    json_text: str,
+    resolved_type: str,
+    schema_def: Dict[str, Any],
+    prompt: str,
+    *,
+    language: str,
+    auto_coerce: bool,
+    parsed: Any = _UNPARSED,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Return (data, coerced); coerced is True when the model output had to be
+    rebuilt by coerce_to_schema (small issues are fixed in place, see validation.py).
+    Pass `parsed` when the text was already parsed (e.g. incrementally while
+    streaming) so it isn't decoded again; the text is decoded at most once.
+    """
+    if parsed is _UNPARSED:
+        parsed = parse_json_text(json_text)
+    if language == "both":  # each language is checked (and repaired) on its own
+        parsed = parsed if isinstance(parsed, dict) else {}
+        pair = {
+            lang: _finalize(json_text, resolved_type, SCHEMAS[resolved_type][1], prompt,
+                            language=lang, auto_coerce=auto_coerce, parsed=parsed.get(lang))
+            for lang in LANGUAGES
+        }
+        return {lang: data for lang, (data, _) in pair.items()}, any(coerced for _, coerced in pair.values())
+    issues = validate(resolved_type, parsed)
+    if not issues:
+        return _polish(resolved_type, parsed), False
+
+    if not auto_coerce:
+        snippet = (json_text or "")[:500]
+        problems = "\n".join(map(str, issues[:5]))
+        raise ValueError(f"Model did not return valid {resolved_type} JSON:\n{problems}\nRaw snippet:\n{snippet}")
+    data, rebuilt = repair(resolved_type, parsed, issues, prompt, language=language)
+    return _polish(resolved_type, data), rebuilt
+
+
+def _cache_key(resolved_type: str, user_prompt: str, schema_name: str, model: str, temperature: float) -> str:
+    return cache_key(
+        asset_type=resolved_type, user_prompt=user_prompt, system_prompt=SYSTEM_PROMPT,
+        schema_name=schema_name, model=model, temperature=temperature,
+    )
+
+
+def _near_dup_scope(resolved_type: str, *, language, tone, audience, constraints, brand_voice, include_signature, model):
+    niche_slug = _niche_of(constraints)
+    return neardup.make_scope(
+        niche=niche_slug, language=language, tone=tone, asset_type=resolved_type,
+        extra=[audience, brand_voice, include_signature, constraints, model],
+    )
+
+
+def _remember_counterparts(
+    data: Dict[str, Any], resolved_type: str, prompt: str, *,
+    tone, audience, constraints, brand_voice, include_signature, model: str, temperature: float,
+) -> None:
+    """
+    Cache each language of a language="both" result under the exact key and
+    near-dup scope the single-language request would use, so a later
+    request for either language is served without a model call.
+    """
+    schema_name = SCHEMAS[resolved_type][0]
+    for lang in LANGUAGES:
+        user_prompt = build_user_prompt(
+            resolved_type, prompt, language=lang, tone=tone, audience=audience, constraints=constraints,
+            brand_voice=brand_voice, include_signature=include_signature, niche=_niche_of(constraints),
+        )
+        cache_set(_cache_key(resolved_type, user_prompt, schema_name, model, temperature), json.dumps(data[lang], ensure_ascii=False))
+        scope = _near_dup_scope(
+            resolved_type, language=lang, tone=tone, audience=audience, constraints=constraints,
+            brand_voice=brand_voice, include_signature=include_signature, model=model,
+        )
+        neardup.remember(scope, prompt, data[lang])
+
+
+class _Request(NamedTuple):
+    """One generate call once its prompt is built and routed; what the sync and async paths share."""
+    prompt: str
+    resolved_type: str
+    schema_name: str
+    schema_def: Dict[str, Any]
+    user_prompt: str
+    route: router.Route
+    key: str                  # exact response cache key
+    scope: Tuple[str, ...]    # near-duplicate scope
+    language: str
+    auto_coerce: bool
+    brief: Dict[str, Any]     # tone, audience, constraints, brand_voice, include_signature
+
+
+def _start(
+    asset_type: AssetType, prompt: str, *, language: str, model: Optional[str], temperature: Optional[float],
+    auto_coerce: bool, meta: Dict[str, Any], **brief: Any,
+) -> _Request:
+    """Build the prompt and pick the route; no I/O, so both paths call it directly."""
+    with timing.stage("prompt"):
+        resolved_type, schema_name, schema_def, user_prompt = _prepare(asset_type, prompt, language=language, **brief)
+        route = _route(resolved_type, prompt, constraints=brief["constraints"], model=model, temperature=temperature)
+    timing.label(asset_type=resolved_type, niche=_niche_of(brief["constraints"]), model=route.model, fallback=False)
+    meta["route"] = route.as_dict()
+    return _Request(
+        prompt, resolved_type, schema_name, schema_def, user_prompt, route,
+        key=_cache_key(resolved_type, user_prompt, schema_name, route.model, route.temperature),
+        scope=_near_dup_scope(resolved_type, language=language, model=route.model, **brief),
+        language=language, auto_coerce=auto_coerce, brief=brief,
+    )
+
+
+def _lookup(req: _Request, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A stored answer from the exact cache, then the near-dup index; None means call the model."""
+    with timing.stage("cache"):
+        cached = cache_get(req.key)
+    if cached is not None:
+        with timing.stage("parse"):
+            data, _ = _finalize(cached, req.resolved_type, req.schema_def, req.prompt, language=req.language, auto_coerce=req.auto_coerce)
+        meta["served_from"] = "cache"
+        return data
+    with timing.stage("cache"):
+        near = neardup.lookup(req.scope, req.prompt)
+    if near is not None:
+        meta["served_from"] = "near_dup"
+    return near
+
+
+def _call_kwargs(req: _Request, call_meta: Dict[str, Any], *, requested: Optional[int]) -> Dict[str, Any]:
+    """Arguments for call_model_with_schema(_async), with the output budget for this request."""
+    constraints = req.brief["constraints"]
+    budget = _output_budget(req.resolved_type, req.schema_def, constraints=constraints, language=req.language, requested=requested)
+    return dict(
+        user_prompt=req.user_prompt,
+        schema_name=req.schema_name,
+        schema_def=req.schema_def,
+        system_prompt=SYSTEM_PROMPT,
+        model=req.route.model,
+        temperature=req.route.temperature,
+        max_output_tokens=budget,
+        meta=call_meta,
+        record_attempt=_attempt_recorder(req.resolved_type, route=req.route, constraints=constraints, language=req.language, budget=budget),
+    )
+
+
+def _fallback(req: _Request, e: Exception, call_meta: Dict[str, Any], *, budget: int, t0: float, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """The model call failed: record it, then synthesize the asset (or raise a clean error)."""
+    accounting.record(_record_call(
+        call_meta, "", req.resolved_type, route=req.route, constraints=req.brief["constraints"], language=req.language,
+        budget=budget, t0=t0,
+    ))
+    meta["served_from"] = "fallback"
+    timing.label(fallback=True)
+    with timing.stage("parse"):
+        return _on_upstream_error(e, req.resolved_type, req.prompt, language=req.language, auto_coerce=req.auto_coerce)
+
+
+def _accept(
+    req: _Request, json_text: str, call_meta: Dict[str, Any], *, budget: int, t0: float, meta: Dict[str, Any],
+) -> Tuple[Dict[str, Any], bool]:
+    """Check (and repair) the model's answer and record the call; returns (data, coerced) like _finalize."""
+    call_row = _record_call(
+        call_meta, json_text, req.resolved_type, route=req.route, constraints=req.brief["constraints"], language=req.language,
+        budget=budget, t0=t0,
+    )
+    meta["served_from"] = "model"
+    with timing.stage("parse"), accounting.recording(call_row) as row:
+        data, coerced = _finalize(json_text, req.resolved_type, req.schema_def, req.prompt, language=req.language, auto_coerce=req.auto_coerce)
+        row["coerced"] = coerced
+    return data, coerced
+
+
+def _remember(req: _Request, json_text: str, data: Dict[str, Any]) -> None:
+    """Store a clean answer in the exact cache and near-dup index (and each language of a pair)."""
+    with timing.stage("cache"):
+        cache_set(req.key, json_text)
+        neardup.remember(req.scope, req.prompt, data)
+        if req.language == "both":
+            _remember_counterparts(
+                data, req.resolved_type, req.prompt, model=req.route.model, temperature=req.route.temperature, **req.brief,
+            )
+
+
+def generate_micro_sop(
+    asset_type: AssetType,
+    prompt: str,
+    *,
+    language: Literal["en", "pt", "both"] = "en",   # <-- output language is user-selected
+    tone: Literal["professional", "friendly", "urgent", "casual"] = "professional",
+    audience: Optional[str] = None,
+    constraints: Optional[Any] = None,  # may be a dict (we read constraints["niche"]) or a string
+    brand_voice: Optional[str] = None,
+    include_signature: bool = False,
+    model: Optional[str] = None,              # None: routed (router.py)
+    temperature: Optional[float] = None,      # None: the route's temperature
+    max_output_tokens: Optional[int] = None,  # None: per-type budget (budgets.py)
+    auto_coerce: bool = True,
+    use_cache: bool = True,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    - Select schema by asset_type (or auto-detect). "bundle" gets the
+      email, SMS and checklist for one brief in a single call, as
+      {"email": {...}, "sms": {...}, "checklist": {...}}; each part is
+      repaired or coerced on its own.
+    - Build user prompt incl. niche guide and requested output language (EN/PT).
+      language="both" returns {"en": {...}, "pt": {...}} from one call (a
+      paired schema); each language is also cached as the single-language
+      result, so asking for the other one later needs no model call.
+    - Serve from the exact response cache, then the near-duplicate index
+      (use_cache=False bypasses both, and coalescing).
+    - Call model with SDK-compatible wrapper; concurrent identical calls
+      share one upstream request (singleflight.py).
+    - model/temperature default to the route for the asset type, brief
+      length and niche, skipping unhealthy models (router.py);
+      max_output_tokens defaults to the budget for the asset type, niche and
+      language (budgets.py).
+    - On upstream failure, synthesize a valid object (respecting language).
+    - The prompt, cache, model and parse stages are timed for the
+      Server-Timing header and /metrics (generator/timing.py).
+    - Each upstream call this makes is recorded as a ModelCall row
+      (generator/accounting.py).
+
+    Pass a dict as `meta` to get the routing decision ("route") and where
+    the result came from ("served_from": cache, near_dup, model or fallback).
+    """
+    if meta is None:
+        meta = {}
+    req = _start(
+        asset_type, prompt, language=language, model=model, temperature=temperature, auto_coerce=auto_coerce, meta=meta,
+        tone=tone, audience=audience, constraints=constraints, brand_voice=brand_voice, include_signature=include_signature,
+    )
+    stored = _lookup(req, meta) if use_cache else None
+    if stored is not None:
+        return stored
+
+    # Call model, with graceful fallbacks; identical in-flight calls share one request
+    call_meta: Dict[str, Any] = {}
+    kwargs = _call_kwargs(req, call_meta, requested=max_output_tokens)
+    call = _routed(req.route, partial(call_model_with_schema, **kwargs), call_meta)
+    t0 = time.perf_counter()
+    try:
+        with timing.stage("model"):
+            json_text = singleflight.do(req.key, call) if use_cache else call()
+    except UPSTREAM_ERRORS as e:
+        return _fallback(req, e, call_meta, budget=kwargs["max_output_tokens"], t0=t0, meta=meta)
+    data, coerced = _accept(req, json_text, call_meta, budget=kwargs["max_output_tokens"], t0=t0, meta=meta)
+    if use_cache and not coerced:
+        _remember(req, json_text, data)
     return data
 
 
-__all__ = ["generate_micro_sop", "client", "AssetType"]
+async def generate_micro_sop_async(
+    asset_type: AssetType,
+    prompt: str,
+    *,
+    language: Literal["en", "pt", "both"] = "en",
+    tone: Literal["professional", "friendly", "urgent", "casual"] = "professional",
+    audience: Optional[str] = None,
+    constraints: Optional[Any] = None,
+    brand_voice: Optional[str] = None,
+    include_signature: bool = False,
+    model: Optional[str] = None,              # None: routed (router.py)
+    temperature: Optional[float] = None,      # None: the route's temperature
+    max_output_tokens: Optional[int] = None,  # None: per-type budget (budgets.py)
+    auto_coerce: bool = True,
+    use_cache: bool = True,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Async twin of generate_micro_sop: same prompt, schema, routing and
+    fallbacks, but the upstream call awaits AsyncOpenAI instead of blocking a worker.
+    Cache, near-dup and limiter backends (possibly redis) run via sync_to_async.
+    """
+    if meta is None:
+        meta = {}
+    req = _start(
+        asset_type, prompt, language=language, model=model, temperature=temperature, auto_coerce=auto_coerce, meta=meta,
+        tone=tone, audience=audience, constraints=constraints, brand_voice=brand_voice, include_signature=include_signature,
+    )
+    stored = await sync_to_async(_lookup, thread_sensitive=False)(req, meta) if use_cache else None
+    if stored is not None:
+        return stored
+
+    call_meta: Dict[str, Any] = {}
+    kwargs = _call_kwargs(req, call_meta, requested=max_output_tokens)
+    call = _routed_async(req.route, partial(call_model_with_schema_async, **kwargs), call_meta)
+    t0 = time.perf_counter()
+    try:
+        with timing.stage("model"):
+            json_text = await (singleflight.do_async(req.key, call) if use_cache else call())
+    except UPSTREAM_ERRORS as e:
+        return _fallback(req, e, call_meta, budget=kwargs["max_output_tokens"], t0=t0, meta=meta)
+    data, coerced = _accept(req, json_text, call_meta, budget=kwargs["max_output_tokens"], t0=t0, meta=meta)
+    if use_cache and not coerced:
+        await sync_to_async(_remember, thread_sensitive=False)(req, json_text, data)
+    return data
+
+
+def __getattr__(name: str):
+    if name == "client":  # built lazily (clients.py)
+        return api.client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# "client" is provided lazily by __getattr__ above; kept so star-imports still export it
+__all__ = ["generate_micro_sop", "generate_micro_sop_async", "client", "AssetType"]  # noqa: F822
@@ -0,0 +1,218 @@
+# backend/generator/ai/router.py
+"""
+Per-request model and temperature, instead of gpt-4o-mini for everything.
+
+A route matches on the resolved asset type, the brief length and the niche;
+the first matching route in settings wins, else DEFAULT. A route lists its
+models in order of preference (cheapest first). The router takes the first
+one that is healthy right now:
+
+    - its circuit is not open (breaker.py)
+    - its error-rate EWMA is below MAX_ERROR_RATE
+    - its latency EWMA is below MAX_LATENCY_MS
+
+and the least-bad one when none is. EWMAs are per process, fed by every
+routed call. Each decision is logged and returned to the caller (as
+meta["route"] from generate_micro_sop); per-route p50/p95 latency is in
+router_stats() on the stats endpoint.
+
+Configured by settings.GENERATOR_ROUTER:
+    ENABLED         False always uses DEFAULT's first model
+    DEFAULT         {"models": [...], "temperature": ..}
+    ROUTES          [{"name", "asset_types", "min_brief_chars", "max_brief_chars",
+                      "niches", "models", "temperature"}], all match keys optional
+    EWMA_ALPHA      weight of the newest observation
+    MIN_SAMPLES     calls before a model's EWMAs can mark it unhealthy
+    MAX_ERROR_RATE  / MAX_LATENCY_MS  health thresholds
+    WINDOW          latencies kept per route for the percentiles
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from . import breaker
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "DEFAULT": {"models": ["gpt-4o-mini"], "temperature": 0.4},
+    "ROUTES": [],
+    "EWMA_ALPHA": 0.2,
+    "MIN_SAMPLES": 5,
+    "MAX_ERROR_RATE": 0.3,
+    "MAX_LATENCY_MS": 20_000,
+    "WINDOW": 500,
+}
+
+
+class Route(NamedTuple):
+    name: str
+    model: str
+    temperature: float
+    reason: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class _Health:
+    __slots__ = ("n", "latency_ms", "error_rate")
+
+    def __init__(self):
+        self.n = 0
+        self.latency_ms = 0.0
+        self.error_rate = 0.0
+
+
+_lock = threading.Lock()
+_health: Dict[str, _Health] = defaultdict(_Health)
+_latencies: Dict[str, Deque[float]] = defaultdict(deque)
+_route_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "errors": 0})
+_route_models: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_ROUTER", {}) or {})
+    return cfg
+
+
+def _matches(route: Dict[str, Any], asset_type: str, brief_chars: int, niche: Optional[str]) -> bool:
+    if route.get("asset_types") and asset_type not in route["asset_types"]:
+        return False
+    if route.get("niches") and niche not in route["niches"]:
+        return False
+    if brief_chars < int(route.get("min_brief_chars") or 0):
+        return False
+    if route.get("max_brief_chars") is not None and brief_chars > int(route["max_brief_chars"]):
+        return False
+    return True
+
+
+def _unhealthy(model: str, cfg: Dict[str, Any]) -> Optional[str]:
+    """Why the model should be skipped right now, or None."""
+    try:
+        if breaker.state(model) == breaker.OPEN:
+            return "circuit open"
+    except Exception:
+        logger.warning("Circuit breaker state unavailable for routing", exc_info=True)
+    with _lock:
+        h = _health.get(model)
+        if h is None or h.n < int(cfg["MIN_SAMPLES"]):
+            return None
+        if h.error_rate > float(cfg["MAX_ERROR_RATE"]):
+            return f"error_rate={h.error_rate:.2f}"
+        if h.latency_ms > float(cfg["MAX_LATENCY_MS"]):
+            return f"latency_ms={h.latency_ms:.0f}"
+    return None
+
+
+def _least_bad(models: List[str]) -> str:
+    with _lock:
+        return min(models, key=lambda m: (_health[m].error_rate, _health[m].latency_ms) if m in _health else (0.0, 0.0))
+
+
+def choose(asset_type: str, prompt: str, *, niche: Optional[str] = None) -> Route:
+    cfg = _config()
+    default = cfg["DEFAULT"] or DEFAULTS["DEFAULT"]
+    spec, name = default, "default"
+    brief_chars = len(prompt or "")
+    if cfg["ENABLED"]:
+        for i, route in enumerate(cfg["ROUTES"] or []):
+            if _matches(route, asset_type, brief_chars, niche):
+                spec, name = route, route.get("name") or f"route{i}"
+                break
+    models = list(spec.get("models") or default["models"])
+    temperature = float(spec.get("temperature", default.get("temperature", 0.4)))
+
+    model, reason, skipped = None, "preferred", []
+    if cfg["ENABLED"]:
+        for candidate in models:
+            why = _unhealthy(candidate, cfg)
+            if why is None:
+                model = candidate
+                break
+            skipped.append(f"{candidate}: {why}")
+    if model is None:
+        model = _least_bad(models) if skipped else models[0]
+    if skipped:
+        reason = "skipped " + "; ".join(skipped)
+
+    decision = Route(name, model, temperature, reason)
+    logger.info(
+        "Route %s type=%s brief_chars=%d niche=%s -> model=%s temperature=%.2f (%s)",
+        name, asset_type, brief_chars, niche or "-", model, temperature, reason,
+    )
+    return decision
+
+
+def explicit(model: str, temperature: float) -> Route:
+    """The caller picked the model; still tracked so it shows up in the stats."""
+    return Route("explicit", model, float(temperature), "caller")
+
+
+def record(route: Route, *, latency_ms: float, failed: bool) -> None:
+    """Feed one routed call's outcome into the model EWMAs and the route's latency window."""
+    cfg = _config()
+    alpha = float(cfg["EWMA_ALPHA"])
+    window = int(cfg["WINDOW"])
+    with _lock:
+        h = _health[route.model]
+        if h.n == 0:
+            h.latency_ms, h.error_rate = latency_ms, float(failed)
+        else:
+            h.error_rate += alpha * (float(failed) - h.error_rate)
+            if not failed:
+                h.latency_ms += alpha * (latency_ms - h.latency_ms)
+        h.n += 1
+
+        counts = _route_counts[route.name]
+        counts["calls"] += 1
+        counts["errors"] += int(failed)
+        _route_models[route.name][route.model] += 1
+        if not failed:
+            samples = _latencies[route.name]
+            samples.append(latency_ms)
+            while len(samples) > window:
+                samples.popleft()
+
+
+def reset() -> None:
+    with _lock:
+        _health.clear()
+        _latencies.clear()
+        _route_counts.clear()
+        _route_models.clear()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return round(ordered[idx], 1)
+
+
+def router_stats() -> Dict[str, Any]:
+    """{"models": {model: {n, latency_ms_ewma, error_rate_ewma}}, "routes": {name: {calls, errors, p50_ms, p95_ms, models}}}"""
+    with _lock:
+        models = {
+            m: {"n": h.n, "latency_ms_ewma": round(h.latency_ms, 1), "error_rate_ewma": round(h.error_rate, 3)}
+            for m, h in _health.items()
+        }
+        routes = {}
+        for name, counts in _route_counts.items():
+            samples = list(_latencies.get(name, ()))
+            routes[name] = {
+                **counts,
+                "p50_ms": _percentile(samples, 50) if samples else None,
+                "p95_ms": _percentile(samples, 95) if samples else None,
+                "models": dict(_route_models[name]),
+            }
+    return {"models": models, "routes": routes}
@@ -37,14 +37,51 @@ SMS_SCHEMA = {
     "type": "object",
     "properties": {
         "message": {"type": "string", "maxLength": 320},
-        "cta": {"type": "string"},
+        "cta": {"type": "string", "maxLength": 120},
     },
     "required": ["message"],
     "additionalProperties": False,
 }
 
+# Email, SMS reminder and checklist for the same brief, generated in one call
+BUNDLE_PARTS = ("email", "sms", "checklist")
+
+BUNDLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "email": EMAIL_SCHEMA,
+        "sms": SMS_SCHEMA,
+        "checklist": CHECKLIST_SCHEMA,
+    },
+    "required": list(BUNDLE_PARTS),
+    "additionalProperties": False,
+}
+
 SCHEMAS: Dict[str, Tuple[str, Dict[str, Any]]] = {
     "email": ("EmailAsset", EMAIL_SCHEMA),
     "checklist": ("ChecklistAsset", CHECKLIST_SCHEMA),
     "sms": ("SmsAsset", SMS_SCHEMA),
+    "bundle": ("AssetBundle", BUNDLE_SCHEMA),
 }
+
+
+def is_bundle(result: Any) -> bool:
+    return isinstance(result, dict) and set(result) == set(BUNDLE_PARTS)
+
+
+# language="both": one object holding the same asset in each language
+LANGUAGES = ("en", "pt")
+
+PAIRED_SCHEMAS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    asset_type: (f"Bilingual{name}", {
+        "type": "object",
+        "properties": {lang: schema for lang in LANGUAGES},
+        "required": list(LANGUAGES),
+        "additionalProperties": False,
+    })
+    for asset_type, (name, schema) in SCHEMAS.items()
+}
+
+
+def is_bilingual(result: Any) -> bool:
+    return isinstance(result, dict) and set(result) == set(LANGUAGES)
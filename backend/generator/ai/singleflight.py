@@ -0,0 +1,282 @@
+# backend/generator/ai/singleflight.py
+"""
+Single-flight coalescing of identical in-flight model calls.
+
+Double-clicks, HTMX retries and teammates submitting the same brief at the
+same moment used to start one upstream request each. Calls that share a key
+(the response-cache key: prompt, schema, model, temperature) while one of
+them is in flight now wait for that leader and get its result (or its
+exception). Credits are untouched: every caller has already been gated by
+the view and is charged there as usual.
+
+In-process coalescing always applies. With BACKEND "redis" the leader in
+each process also takes a short Redis lock, and leaders in other workers
+wait for the result it publishes instead of calling upstream themselves.
+
+A sync follower waits at most FOLLOWER_WAIT_S for its leader, then calls
+upstream itself. Async calls run as a task of their own that the leader and
+followers all shield, so a leader whose request is cancelled (its client
+went away) doesn't take the followers' result down with it.
+
+Configured by settings.GENERATOR_SINGLE_FLIGHT:
+    ENABLED       False calls through directly
+    BACKEND       "local" | "redis"
+    LOCK_TTL_S    cross-worker lock lifetime (longest a follower waits)
+    RESULT_TTL_S  how long the leader's result stays readable for followers
+    POLL_S        follower polling interval for the Redis result
+    CACHE_ALIAS   django-redis alias used by the redis backend
+    FOLLOWER_WAIT_S  how long a sync follower waits for its leader; None =
+                  one upstream attempt's timeouts (GENERATOR_OPENAI_HTTP)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "BACKEND": "local",
+    "LOCK_TTL_S": 60,
+    "RESULT_TTL_S": 30,
+    "POLL_S": 0.1,
+    "CACHE_ALIAS": "default",
+    "FOLLOWER_WAIT_S": None,
+}
+
+_stats_lock = threading.Lock()
+_stats = {"leaders": 0, "followers": 0, "remote_followers": 0, "follower_timeouts": 0}
+
+
+def _bump(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_SINGLE_FLIGHT", {}) or {})
+    return cfg
+
+
+def _follower_wait_s(cfg: Dict[str, Any]) -> float:
+    if cfg["FOLLOWER_WAIT_S"] is not None:
+        return float(cfg["FOLLOWER_WAIT_S"])
+    from .clients import _config as http_config
+
+    http = http_config()
+    return float(http["CONNECT_TIMEOUT_S"]) + float(http["WRITE_TIMEOUT_S"]) + float(http["READ_TIMEOUT_S"])
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RedisFlight:
+    """Cross-worker leg: SET NX lock, leader publishes the result, others poll for it."""
+    PREFIX = "microsop:sf:"
+
+    _RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+    return 0
+    """
+
+    def __init__(self, *, cache_alias: str = "default", lock_ttl_s: float = 60, result_ttl_s: float = 30, poll_s: float = 0.1):
+        from django_redis import get_redis_connection
+
+        self.conn = get_redis_connection(cache_alias)
+        self.lock_ttl_s = lock_ttl_s
+        self.result_ttl_s = result_ttl_s
+        self.poll_s = poll_s
+        self._release = self.conn.register_script(self._RELEASE)
+
+    def _keys(self, key: str) -> Tuple[str, str]:
+        return self.PREFIX + key + ":lock", self.PREFIX + key + ":result"
+
+    def try_lead(self, key: str) -> Optional[str]:
+        """Lock token if we are the cross-worker leader, else None."""
+        lock_key, result_key = self._keys(key)
+        token = secrets.token_hex(8)
+        if self.conn.set(lock_key, token, nx=True, px=int(self.lock_ttl_s * 1000)):
+            self.conn.delete(result_key)  # a result left over from an earlier flight is not ours
+            return token
+        return None
+
+    def publish(self, key: str, token: str, value: Optional[str]) -> None:
+        lock_key, result_key = self._keys(key)
+        if value is not None:
+            self.conn.setex(result_key, max(1, int(self.result_ttl_s)), value)
+        self._release(keys=[lock_key], args=[token])
+
+    def poll(self, key: str) -> Tuple[Optional[str], bool]:
+        """(published result, lock still held)."""
+        lock_key, result_key = self._keys(key)
+        pipe = self.conn.pipeline()
+        pipe.get(result_key)
+        pipe.exists(lock_key)
+        raw, locked = pipe.execute()
+        if raw is not None and isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        return raw, bool(locked)
+
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        deadline = time.monotonic() + self.lock_ttl_s
+        while True:
+            token = self.try_lead(key)
+            if token is not None:
+                value = None
+                try:
+                    value = fn()
+                    return value
+                finally:
+                    self.publish(key, token, value)
+            value, locked = self.poll(key)
+            if value is not None:
+                _bump("remote_followers")
+                return value
+            if time.monotonic() > deadline:
+                return fn()
+            if locked:
+                time.sleep(self.poll_s)
+            # lock gone without a result (leader failed): loop and try to lead
+
+
+class SingleFlight:
+    """In-process coalescing (threads and event loops), optionally backed by RedisFlight."""
+
+    def __init__(self, remote: Optional[RedisFlight] = None, follower_wait_s: Optional[float] = None):
+        self.remote = remote
+        self.follower_wait_s = follower_wait_s
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], "asyncio.Task[Any]"] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            _bump("followers")
+            if not call.event.wait(self.follower_wait_s):
+                # the leader is stuck (slow retries/hedges): don't tie up this thread behind it
+                logger.warning("Single-flight leader for %s still running after %.0fs; calling directly",
+                               key, self.follower_wait_s)
+                _bump("follower_timeouts")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        _bump("leaders")
+        try:
+            call.result = self._remote_do(key, fn) if self.remote is not None else fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _remote_do(self, key: str, fn: Callable[[], Any]) -> Any:
+        try:
+            return self.remote.do(key, fn)
+        except Exception as e:
+            if getattr(e, "__module__", "").startswith("redis"):
+                logger.warning("Single-flight Redis leg failed; calling directly", exc_info=True)
+                return fn()
+            raise
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Coalesces coroutines on the same event loop (the cross-worker leg is
+        sync-only). The call runs in its own task, shielded for every caller:
+        cancelling one caller, the leader included, leaves it running for the rest.
+        """
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        task = self._tasks.get(slot)
+        if task is not None:
+            _bump("followers")
+            return await asyncio.shield(task)
+
+        _bump("leaders")
+        task = self._tasks[slot] = asyncio.ensure_future(fn())
+
+        def _done(t: "asyncio.Task[Any]") -> None:
+            if self._tasks.get(slot) is t:
+                del self._tasks[slot]
+            if not t.cancelled():
+                t.exception()  # mark retrieved: every caller may have been cancelled
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+
+_group: Optional[SingleFlight] = None
+_group_lock = threading.Lock()
+
+
+def get_group() -> Optional[SingleFlight]:
+    """Process-wide group, or None when coalescing is disabled."""
+    global _group
+    if _group is not None:
+        return _group or None
+    with _group_lock:
+        if _group is None:
+            cfg = _config()
+            if not cfg["ENABLED"]:
+                _group = False
+            else:
+                remote = None
+                if str(cfg["BACKEND"]).lower() == "redis":
+                    try:
+                        remote = RedisFlight(
+                            cache_alias=cfg["CACHE_ALIAS"], lock_ttl_s=float(cfg["LOCK_TTL_S"]),
+                            result_ttl_s=float(cfg["RESULT_TTL_S"]), poll_s=float(cfg["POLL_S"]),
+                        )
+                    except Exception:
+                        logger.exception("Single-flight Redis backend unavailable; coalescing in-process only")
+                _group = SingleFlight(remote, follower_wait_s=_follower_wait_s(cfg))
+    return _group or None
+
+
+def reset() -> None:
+    """Drop the group and counters so the next call re-reads settings (tests)."""
+    global _group
+    with _group_lock:
+        _group = None
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def do(key: str, fn: Callable[[], Any]) -> Any:
+    group = get_group()
+    return group.do(key, fn) if group is not None else fn()
+
+
+async def do_async(key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    group = get_group()
+    return await group.do_async(key, fn) if group is not None else await fn()
+
+
+def single_flight_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,181 @@
+# backend/generator/ai/streaming.py
+"""
+Streaming generation: surface each part of the asset as soon as the model
+has finished writing it, then a final validated object.
+
+Events (StreamEvent.kind):
+    "field"  a top-level string is complete, e.g. the email subject or SMS message
+    "item"   a checklist item is complete
+    "final"  the schema-checked, polished asset (same as generate_micro_sop)
+A language="both" stream only sends "final" (its fields are nested per language).
+
+The parser checks the output against the asset's schema as it arrives; when
+a value has the wrong type the upstream request is aborted and the final
+asset is coerced from what had been parsed so far.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+from .api import stream_model_with_schema
+from .errors import ModelCircuitOpen
+from .cache import cache_get, cache_set
+from . import neardup, router
+from .parsing import IncrementalJSONParser, SchemaViolation
+from .prompts import SYSTEM_PROMPT
+from .. import accounting
+from .public import (
+    UPSTREAM_ERRORS, _attempt_recorder, _cache_key, _finalize, _near_dup_scope, _on_upstream_error, _output_budget, _prepare, _record_call,
+    _remember_counterparts, _route,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEvent(NamedTuple):
+    kind: str
+    data: Dict[str, Any]
+
+
+def _to_event(path, value) -> Optional[StreamEvent]:
+    if len(path) == 1 and isinstance(value, str):
+        return StreamEvent("field", {"name": path[0], "text": value})
+    if len(path) == 2 and path[0] == "items" and isinstance(value, dict):
+        return StreamEvent("item", {"index": path[1], **value})
+    return None
+
+
+def _close(parser: IncrementalJSONParser) -> Any:
+    try:
+        return parser.close()
+    except ValueError:
+        return None  # truncated output; coercion fills it in
+
+
+def stream_micro_sop(
+    asset_type: str,
+    prompt: str,
+    *,
+    language: str = "en",
+    tone: str = "professional",
+    audience: Optional[str] = None,
+    constraints: Optional[Any] = None,
+    brand_voice: Optional[str] = None,
+    include_signature: bool = False,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_output_tokens: Optional[int] = None,
+    auto_coerce: bool = True,
+    use_cache: bool = True,
+) -> Iterator[StreamEvent]:
+    resolved_type, schema_name, schema_def, user_prompt = _prepare(
+        asset_type, prompt, language=language, tone=tone, audience=audience,
+        constraints=constraints, brand_voice=brand_voice, include_signature=include_signature,
+    )
+    route = _route(resolved_type, prompt, constraints=constraints, model=model, temperature=temperature)
+    model, temperature = route.model, route.temperature
+
+    key = _cache_key(resolved_type, user_prompt, schema_name, model, temperature)
+    cached = cache_get(key) if use_cache else None
+    if cached is not None:
+        data, _ = _finalize(cached, resolved_type, schema_def, prompt, language=language, auto_coerce=auto_coerce)
+        yield StreamEvent("final", data)
+        return
+
+    scope = _near_dup_scope(
+        resolved_type, language=language, tone=tone, audience=audience, constraints=constraints,
+        brand_voice=brand_voice, include_signature=include_signature, model=model,
+    )
+    near = neardup.lookup(scope, prompt) if use_cache else None
+    if near is not None:
+        yield StreamEvent("final", near)
+        return
+
+    budget = _output_budget(resolved_type, schema_def, constraints=constraints, language=language, requested=max_output_tokens)
+    t0 = time.perf_counter()
+    first_content_ms = None
+    parser: Optional[IncrementalJSONParser] = IncrementalJSONParser(schema_def)
+    aborted: Optional[SchemaViolation] = None
+    chunks = []
+    meta: Dict[str, Any] = {}
+    deltas = stream_model_with_schema(
+        user_prompt=user_prompt,
+        schema_name=schema_name,
+        schema_def=schema_def,
+        system_prompt=SYSTEM_PROMPT,
+        model=model,
+        temperature=temperature,
+        max_output_tokens=budget,
+        meta=meta,
+        record_attempt=_attempt_recorder(resolved_type, route=route, constraints=constraints, language=language, budget=budget),
+    )
+    try:
+        for delta in deltas:
+            chunks.append(delta)
+            if parser is None:
+                continue
+            try:
+                parsed = parser.feed(delta)
+            except SchemaViolation as e:
+                aborted = e  # output can't match the schema: stop paying for tokens
+                break
+            except ValueError:
+                parser = None  # malformed output: stop streaming parts, the final step repairs it
+                continue
+            for path, value in parsed:
+                event = _to_event(path, value)
+                if event is None:
+                    continue
+                if first_content_ms is None:
+                    first_content_ms = (time.perf_counter() - t0) * 1000
+                yield event
+    except UPSTREAM_ERRORS as e:
+        if not isinstance(e, ModelCircuitOpen):
+            router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=True)
+            meta["error"] = e.__class__.__name__
+            accounting.record(_record_call(
+                meta, "", resolved_type, route=route, constraints=constraints, language=language, budget=budget, t0=t0,
+            ))
+        yield StreamEvent("final", _on_upstream_error(e, resolved_type, prompt, language=language, auto_coerce=auto_coerce))
+        return
+    finally:
+        deltas.close()
+
+    router.record(route, latency_ms=(time.perf_counter() - t0) * 1000, failed=False)
+    json_text = "".join(chunks)
+    # an aborted stream says nothing about how long the asset would have been, but its tokens were paid for
+    if aborted is not None:
+        meta.setdefault("shape", "chat")  # the usage chunk never arrived
+    call_row = _record_call(
+        meta, json_text, resolved_type, route=route, constraints=constraints, language=language, budget=budget, t0=t0,
+        observe=aborted is None,
+    )
+    if aborted is not None:
+        logger.warning("Aborted %s stream after %d chars: %s", resolved_type, len(json_text), aborted)
+        parsed_obj = parser.partial()
+    elif parser is not None and parser.done:
+        parsed_obj = parser.value
+    else:
+        parsed_obj = None if parser is None else _close(parser)
+    with accounting.recording(call_row) as row:
+        data, coerced = _finalize(
+            json_text, resolved_type, schema_def, prompt,
+            language=language, auto_coerce=auto_coerce, parsed=parsed_obj,
+        )
+        row["coerced"] = coerced
+    if use_cache and not coerced:
+        cache_set(key, json_text)
+        neardup.remember(scope, prompt, data)
+        if language == "both":
+            _remember_counterparts(
+                data, resolved_type, prompt, tone=tone, audience=audience, constraints=constraints,
+                brand_voice=brand_voice, include_signature=include_signature, model=model, temperature=temperature,
+            )
+    logger.info(
+        "Streamed %s via %s/%s: first_content_ms=%s total_ms=%.0f coerced=%s",
+        resolved_type, route.name, model, f"{first_content_ms:.0f}" if first_content_ms is not None else "-",
+        (time.perf_counter() - t0) * 1000, coerced,
+    )
+    yield StreamEvent("final", data)
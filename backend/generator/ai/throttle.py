@@ -0,0 +1,352 @@
+# backend/generator/ai/throttle.py
+"""
+Client-side requests-per-minute / tokens-per-minute limiter and the retry
+policy for OpenAI calls.
+
+Every model call first takes 1 request and its estimated tokens (prompt +
+max output, which is what the org TPM limit counts) from two token buckets
+per model. When a bucket is short the caller waits for it to refill instead
+of sending a request that would come back 429. With the redis backend the
+buckets live in the django-redis cache, so all gunicorn workers share one
+budget; a 429 that does get through pauses the model for every worker for
+its Retry-After.
+
+Retryable failures (429 without insufficient_quota, timeouts, connection
+errors, 5xx) are retried with full-jitter exponential backoff, never
+sooner than the upstream Retry-After.
+
+Configured by settings.GENERATOR_RATE_LIMIT:
+    ENABLED       False skips the buckets (retries still apply)
+    BACKEND       "local" (per process) | "redis" | dotted path to a class
+    RPM / TPM     default limits per model
+    MODELS        {"model": {"RPM": .., "TPM": ..}} overrides
+    MAX_WAIT_S    longest a call waits for the buckets before ModelRateLimited
+    RETRY         {"MAX_ATTEMPTS": 3, "BASE_S": 0.5, "MAX_S": 8.0}
+    CACHE_ALIAS   django-redis alias used by the redis backend
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from .errors import ModelAPIError, ModelRateLimited, ModelTimeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: Dict[str, Any] = {
+    "ENABLED": True,
+    "BACKEND": "local",
+    "RPM": 500,
+    "TPM": 200_000,
+    "MODELS": {},
+    "MAX_WAIT_S": 20.0,
+    "RETRY": {"MAX_ATTEMPTS": 3, "BASE_S": 0.5, "MAX_S": 8.0},
+    "CACHE_ALIAS": "default",
+}
+
+_stats_lock = threading.Lock()
+_stats = {"acquired": 0, "waits": 0, "waited_s": 0.0, "rejected": 0, "retries": 0, "upstream_429": 0}
+
+
+def _bump(key: str, amount=1) -> None:
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def estimate_tokens(*texts: str, max_output_tokens: int = 0) -> int:
+    """~4 characters per token for the prompt, plus the output budget."""
+    return sum(len(t or "") for t in texts) // 4 + 1 + int(max_output_tokens or 0)
+
+
+# -----------------------
+# Bucket backends
+# -----------------------
+class LocalBuckets:
+    """Per-process buckets. Limits are per worker, so divide them by the worker count."""
+
+    def __init__(self, **_):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}  # (model, kind) -> (level, updated)
+        self._blocked: Dict[str, float] = {}
+
+    def _take(self, key, capacity: float, cost: float, now: float) -> float:
+        level, updated = self._buckets.get(key, (capacity, now))
+        level = min(capacity, level + (now - updated) * capacity / 60.0)
+        self._buckets[key] = (level, now)
+        if level >= cost:
+            return 0.0
+        return (cost - level) * 60.0 / capacity
+
+    def try_acquire(self, model: str, tokens: int, rpm: int, tpm: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            blocked = self._blocked.get(model, 0.0) - now
+            if blocked > 0:
+                return blocked
+            wait = max(self._take((model, "rpm"), rpm, 1, now), self._take((model, "tpm"), tpm, tokens, now))
+            if wait == 0:
+                for kind, cost in (("rpm", 1), ("tpm", tokens)):
+                    level, _ = self._buckets[(model, kind)]
+                    self._buckets[(model, kind)] = (level - cost, now)
+            return wait
+
+    def block(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._blocked[model] = max(self._blocked.get(model, 0.0), time.monotonic() + seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._blocked.clear()
+
+
+class RedisBuckets:
+    """
+    Shared buckets in Redis. One Lua script refills and takes from both
+    buckets atomically, using the Redis clock so workers agree on time.
+    """
+    PREFIX = "microsop:rl:"
+
+    _SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local blocked = tonumber(redis.call('GET', KEYS[3]) or '0')
+    if blocked > now then return tostring(blocked - now) end
+    local wait = 0
+    local levels = {}
+    for i = 1, 2 do
+      local cap = tonumber(ARGV[i * 2 - 1])
+      local cost = tonumber(ARGV[i * 2])
+      local b = redis.call('HMGET', KEYS[i], 'level', 'ts')
+      local level = tonumber(b[1]) or cap
+      local ts = tonumber(b[2]) or now
+      level = math.min(cap, level + (now - ts) * cap / 60)
+      levels[i] = level
+      if level < cost then wait = math.max(wait, (cost - level) * 60 / cap) end
+    end
+    for i = 1, 2 do
+      local cost = tonumber(ARGV[i * 2])
+      local level = levels[i]
+      if wait == 0 then level = level - cost end
+      redis.call('HSET', KEYS[i], 'level', tostring(level), 'ts', tostring(now))
+      redis.call('EXPIRE', KEYS[i], 120)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, *, cache_alias: str = "default", **_):
+        from django_redis import get_redis_connection
+
+        self.conn = get_redis_connection(cache_alias)
+        self._script = self.conn.register_script(self._SCRIPT)
+
+    def _keys(self, model: str):
+        return [self.PREFIX + model + ":rpm", self.PREFIX + model + ":tpm", self.PREFIX + model + ":blocked"]
+
+    def try_acquire(self, model: str, tokens: int, rpm: int, tpm: int) -> float:
+        return float(self._script(keys=self._keys(model), args=[rpm, 1, tpm, tokens]))
+
+    def block(self, model: str, seconds: float) -> None:
+        key = self._keys(model)[2]
+        until = float(self.conn.time()[0]) + seconds
+        self.conn.set(key, until, px=max(1, int(seconds * 1000)))
+
+    def reset(self) -> None:
+        names = list(self.conn.scan_iter(self.PREFIX + "*"))
+        if names:
+            self.conn.delete(*names)
+
+
+BACKENDS = {
+    "local": LocalBuckets,
+    "redis": RedisBuckets,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_RATE_LIMIT", {}) or {})
+    cfg["RETRY"] = {**DEFAULTS["RETRY"], **(cfg.get("RETRY") or {})}
+    return cfg
+
+
+def _limits(cfg: Dict[str, Any], model: str) -> Tuple[int, int]:
+    per_model = (cfg.get("MODELS") or {}).get(model) or {}
+    return int(per_model.get("RPM", cfg["RPM"])), int(per_model.get("TPM", cfg["TPM"]))
+
+
+def get_buckets():
+    """Process-wide bucket backend, or None when the limiter is disabled."""
+    global _backend
+    if _backend is not None:
+        return _backend or None
+    with _backend_lock:
+        if _backend is None:
+            cfg = _config()
+            if not cfg["ENABLED"]:
+                _backend = False
+            else:
+                name = str(cfg["BACKEND"] or "local")
+                try:
+                    if name.lower() in BACKENDS:
+                        cls = BACKENDS[name.lower()]
+                    else:
+                        from django.utils.module_loading import import_string
+                        cls = import_string(name)
+                    _backend = cls(cache_alias=cfg["CACHE_ALIAS"])
+                except Exception:
+                    logger.exception("Rate limit backend %r unavailable; using per-process buckets", name)
+                    _backend = LocalBuckets()
+    return _backend or None
+
+
+def reset() -> None:
+    """Drop the backend and counters so the next call re-reads settings (tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def _try(model: str, tokens: int) -> Tuple[float, float]:
+    """(wait seconds, max wait) for one attempt at the buckets; fails open if the backend errors."""
+    cfg = _config()
+    buckets = get_buckets()
+    if buckets is None:
+        return 0.0, 0.0
+    rpm, tpm = _limits(cfg, model)
+    try:
+        return buckets.try_acquire(model, min(tokens, tpm), rpm, tpm), float(cfg["MAX_WAIT_S"])
+    except Exception:
+        logger.warning("Rate limit backend failed; letting the call through", exc_info=True)
+        return 0.0, 0.0
+
+
+def _waited(model: str, waited: float, wait: float, max_wait: float) -> float:
+    if waited + wait > max_wait:
+        _bump("rejected")
+        raise ModelRateLimited(f"Local rate limit for {model}: would wait {waited + wait:.1f}s")
+    return wait
+
+
+def _acquired(waited: float) -> None:
+    _bump("acquired")
+    if waited:
+        _bump("waits")
+        _bump("waited_s", waited)
+
+
+def acquire(model: str, tokens: int) -> float:
+    """Block until the model's buckets allow the call; returns seconds waited."""
+    waited = 0.0
+    while True:
+        wait, max_wait = _try(model, tokens)
+        if wait <= 0:
+            _acquired(waited)
+            return waited
+        time.sleep(_waited(model, waited, wait, max_wait))
+        waited += wait
+
+
+def try_acquire(model: str, tokens: int) -> bool:
+    """Take the call's budget only if it is available right now (never waits)."""
+    wait, _ = _try(model, tokens)
+    if wait > 0:
+        return False
+    _acquired(0.0)
+    return True
+
+
+async def acquire_async(model: str, tokens: int) -> float:
+    from asgiref.sync import sync_to_async
+
+    waited = 0.0
+    while True:
+        wait, max_wait = await sync_to_async(_try, thread_sensitive=False)(model, tokens)
+        if wait <= 0:
+            _acquired(waited)
+            return waited
+        await asyncio.sleep(_waited(model, waited, wait, max_wait))
+        waited += wait
+
+
+def note_rate_limited(model: str, retry_after: Optional[float]) -> None:
+    """An upstream 429 got through: pause the model for every worker."""
+    _bump("upstream_429")
+    buckets = get_buckets()
+    if buckets is None or not retry_after:
+        return
+    try:
+        buckets.block(model, retry_after)
+    except Exception:
+        logger.warning("Rate limit backend failed to record a 429", exc_info=True)
+
+
+# -----------------------
+# Retry policy
+# -----------------------
+def retry_after_seconds(err: Exception) -> Optional[float]:
+    """Retry-After / retry-after-ms from the upstream response, if any."""
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return max(0.0, float(ms) / 1000.0)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _retryable(err: Exception) -> bool:
+    if isinstance(err, (ModelRateLimited, ModelTimeout)):
+        return True
+    # no status: the request never got an answer (connection reset, DNS, ...)
+    status = getattr(err, "status_code", None)
+    return isinstance(err, ModelAPIError) and (status is None or status >= 500)
+
+
+def retry_delay(attempt: int, err: Exception) -> Optional[float]:
+    """
+    Seconds to sleep before attempt `attempt + 1`, or None to give up.
+    Full jitter (uniform 0..base*2^n, capped), but never less than Retry-After.
+    """
+    policy = _config()["RETRY"]
+    if attempt >= int(policy["MAX_ATTEMPTS"]) or not _retryable(err):
+        return None
+    backoff = random.uniform(0, min(float(policy["MAX_S"]), float(policy["BASE_S"]) * (2 ** (attempt - 1))))
+    after = getattr(err, "retry_after", None)
+    if after is not None and after > float(policy["MAX_S"]):
+        return None  # upstream asked for longer than we're willing to hold the request
+    delay = max(backoff, after or 0.0)
+    _bump("retries")
+    logger.info("Retrying model call in %.2fs (attempt %d, %s)", delay, attempt, err.__class__.__name__)
+    return delay
+
+
+def throttle_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats)
+    out["waited_s"] = round(out["waited_s"], 3)
+    return out
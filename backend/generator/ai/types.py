@@ -1,3 +1,3 @@
 from typing import Literal
 
-AssetType = Literal["email", "checklist", "sms", "auto"]
+AssetType = Literal["email", "checklist", "sms", "bundle", "auto"]
@@ -0,0 +1,49 @@
+# backend/generator/ai/usage.py
+"""
+Upstream token usage per niche, to verify prompt-prefix cache hits.
+
+Every successful model call reports prompt, cached and completion tokens
+(call_model_with_schema fills them into `meta`). cached_tokens / prompt_tokens
+per niche is the share of input OpenAI served from its prefix cache; see
+prompts.py for the layout that makes the prefix byte-stable.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_by_niche: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0})
+
+
+def record(*, niche: Optional[str], asset_type: str, model: str, usage: Optional[Dict[str, Any]]) -> None:
+    if not usage:
+        return
+    key = niche or "none"
+    with _lock:
+        row = _by_niche[key]
+        row["calls"] += 1
+        for field in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+            row[field] += int(usage.get(field) or 0)
+    logger.info(
+        "Model usage niche=%s type=%s model=%s prompt_tokens=%s cached_tokens=%s completion_tokens=%s",
+        key, asset_type, model, usage.get("prompt_tokens"), usage.get("cached_tokens"), usage.get("completion_tokens"),
+    )
+
+
+def reset() -> None:
+    with _lock:
+        _by_niche.clear()
+
+
+def usage_stats() -> Dict[str, Dict[str, Any]]:
+    """{niche: {calls, prompt_tokens, cached_tokens, completion_tokens, cache_hit_rate}}"""
+    with _lock:
+        out = {k: dict(v) for k, v in _by_niche.items()}
+    for row in out.values():
+        row["cache_hit_rate"] = round(row["cached_tokens"] / row["prompt_tokens"], 3) if row["prompt_tokens"] else 0.0
+    return out
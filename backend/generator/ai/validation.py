@@ -0,0 +1,188 @@
+# backend/generator/ai/validation.py
+"""
+Schema validation of model output, compiled once per asset type.
+
+Every SCHEMAS entry is compiled at import: a jsonschema validator, plus a
+plain-Python check for the happy path (see _compile_check). Invalid output
+yields Issues: the JSON path, the failing keyword and a message. repair()
+fixes what it can in place (over-long strings, out-of-enum priorities,
+unknown keys) and only falls back to the full coerce_to_schema rebuild
+when something structural is missing or mistyped.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from jsonschema import Draft202012Validator
+
+from .coercers import coerce_to_schema, truncate
+from .schemas import BUNDLE_PARTS, SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+Path = Tuple[Any, ...]
+
+
+class Issue(NamedTuple):
+    path: Path       # e.g. ("items", 2, "priority"); () is the object itself
+    keyword: str     # the failing schema keyword: type, required, enum, maxLength, ...
+    message: str
+
+    def __str__(self) -> str:
+        return f"{'/'.join(map(str, self.path)) or '<root>'}: {self.keyword}: {self.message}"
+
+
+def _compile(schema_def: Dict[str, Any]) -> Draft202012Validator:
+    Draft202012Validator.check_schema(schema_def)
+    return Draft202012Validator(schema_def)
+
+
+_CHECKABLE = {"type", "properties", "required", "additionalProperties", "items", "enum", "maxLength", "minItems", "maxItems"}
+
+
+def _compile_check(schema: Dict[str, Any]) -> Optional[Callable[[Any], bool]]:
+    """
+    A plain-Python is_valid for the keyword subset our schemas use, or None
+    if the schema uses anything else. jsonschema dispatches every keyword
+    through generic handlers per call; this is a few isinstance checks.
+    """
+    if not set(schema) <= _CHECKABLE:
+        return None
+    kind = schema.get("type")
+
+    if kind == "string":
+        limit = schema.get("maxLength")
+        allowed = frozenset(schema["enum"]) if "enum" in schema else None
+
+        def check_string(v: Any) -> bool:
+            return (
+                isinstance(v, str)
+                and (limit is None or len(v) <= limit)
+                and (allowed is None or v in allowed)
+            )
+        return check_string
+
+    if kind == "object":
+        props: Dict[str, Callable[[Any], bool]] = {}
+        for name, sub in (schema.get("properties") or {}).items():
+            sub_check = _compile_check(sub)
+            if sub_check is None:
+                return None
+            props[name] = sub_check
+        required = tuple(schema.get("required") or ())
+        closed = schema.get("additionalProperties") is False
+
+        def check_object(v: Any) -> bool:
+            if not isinstance(v, dict):
+                return False
+            for k in required:
+                if k not in v:
+                    return False
+            for k, x in v.items():
+                sub_check = props.get(k)
+                if sub_check is None:
+                    if closed:
+                        return False
+                elif not sub_check(x):
+                    return False
+            return True
+        return check_object
+
+    if kind == "array":
+        item_check = _compile_check(schema["items"]) if "items" in schema else None
+        if "items" in schema and item_check is None:
+            return None
+        lo, hi = int(schema.get("minItems", 0)), schema.get("maxItems")
+
+        def check_array(v: Any) -> bool:
+            if not isinstance(v, list) or len(v) < lo or (hi is not None and len(v) > hi):
+                return False
+            if item_check is not None:
+                for x in v:
+                    if not item_check(x):
+                        return False
+            return True
+        return check_array
+
+    return None
+
+
+VALIDATORS: Dict[str, Draft202012Validator] = {asset_type: _compile(schema) for asset_type, (_, schema) in SCHEMAS.items()}
+# Fast happy-path check per type; jsonschema only runs to explain a failure
+_FAST_CHECKS = {
+    asset_type: _compile_check(schema) or VALIDATORS[asset_type].is_valid
+    for asset_type, (_, schema) in SCHEMAS.items()
+}
+
+# Keywords repair() fixes in place; anything else needs a coerce_to_schema rebuild
+_TARGETED = {"maxLength", "enum", "additionalProperties"}
+
+
+def validate(asset_type: str, data: Any) -> List[Issue]:
+    """Every schema issue in `data`, [] when it is valid."""
+    if _FAST_CHECKS[asset_type](data):
+        return []
+    return [Issue(tuple(e.absolute_path), str(e.validator), e.message) for e in VALIDATORS[asset_type].iter_errors(data)]
+
+
+def _parent(data: Any, path: Path) -> Tuple[Any, Any]:
+    """(container, key) of the value at `path`."""
+    node = data
+    for step in path[:-1]:
+        node = node[step]
+    return node, path[-1]
+
+
+def _fix(data: Any, issue: Issue, schema_def: Dict[str, Any]) -> None:
+    sub = schema_def
+    for step in issue.path:
+        sub = sub["items"] if isinstance(step, int) else sub["properties"][step]
+    if issue.keyword == "maxLength":
+        node, key = _parent(data, issue.path)
+        node[key] = truncate(node[key], int(sub["maxLength"]))
+    elif issue.keyword == "enum":
+        node, key = _parent(data, issue.path)
+        node[key] = "medium" if "medium" in sub["enum"] else sub["enum"][0]
+    elif issue.keyword == "additionalProperties":
+        node = data
+        for step in issue.path:
+            node = node[step]
+        for extra in [k for k in node if k not in (sub.get("properties") or {})]:
+            del node[extra]
+
+
+def _repair_bundle(data: Any, fallback_prompt: str, *, language: str) -> Tuple[Dict[str, Any], bool]:
+    data = data if isinstance(data, dict) else {}
+    out, rebuilt = {}, False
+    for part in BUNDLE_PARTS:
+        value = data.get(part)
+        issues = validate(part, value)
+        if issues:
+            value, part_rebuilt = repair(part, value, issues, fallback_prompt, language=language)
+            rebuilt = rebuilt or part_rebuilt
+        out[part] = value
+    return out, rebuilt
+
+
+def repair(asset_type: str, data: Any, issues: List[Issue], fallback_prompt: str, *, language: str = "en") -> Tuple[Dict[str, Any], bool]:
+    """
+    Return (valid data, rebuilt). rebuilt is False when targeted fixes were
+    enough, True when the asset had to be rebuilt with coerce_to_schema.
+    A bundle is repaired part by part, so one bad part doesn't cost the others.
+    """
+    if asset_type == "bundle":
+        return _repair_bundle(data, fallback_prompt, language=language)
+    if isinstance(data, dict) and issues and all(i.keyword in _TARGETED for i in issues):
+        schema_def = SCHEMAS[asset_type][1]
+        try:
+            for issue in issues:
+                _fix(data, issue, schema_def)
+        except (KeyError, IndexError, TypeError):
+            logger.debug("Targeted repair failed for %s", asset_type, exc_info=True)
+        else:
+            if _FAST_CHECKS[asset_type](data):
+                logger.info("Repaired %s output in place: %s", asset_type, "; ".join(map(str, issues)))
+                return data, False
+    logger.info("Rebuilding %s output: %s", asset_type, "; ".join(map(str, issues[:5])) or "not an object")
+    return coerce_to_schema(asset_type, data, fallback_prompt, language=language), True
@@ -0,0 +1,62 @@
+# backend/generator/benchmarks/async_throughput.py
+"""
+Requests/sec of generate_micro_sop vs generate_micro_sop_async against a
+simulated upstream.
+
+    PYTHONPATH=backend python -m generator.benchmarks.async_throughput --latency 3 --requests 60 --workers 4
+
+The sync path is measured with a thread pool of `--workers` threads (one per
+gunicorn sync worker); the async path runs every request on one event loop.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from generator.ai import api  # noqa: E402
+from generator.ai.public import generate_micro_sop, generate_micro_sop_async  # noqa: E402
+from generator.benchmarks.fake_upstream import FakeOpenAI, FakeAsyncOpenAI  # noqa: E402
+
+PROMPT = "Send an SMS to confirm tomorrow's meeting at 10:00"
+
+
+def run_sync(n: int, workers: int, latency: float) -> float:
+    api.client = FakeOpenAI(latency=latency)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda _: generate_micro_sop("auto", PROMPT, use_cache=False), range(n)))
+    return n / (time.perf_counter() - t0)
+
+
+async def _run_async(n: int) -> None:
+    await asyncio.gather(*(generate_micro_sop_async("auto", PROMPT, use_cache=False) for _ in range(n)))
+
+
+def run_async(n: int, latency: float) -> float:
+    api.async_client = FakeAsyncOpenAI(latency=latency)
+    t0 = time.perf_counter()
+    asyncio.run(_run_async(n))
+    return n / (time.perf_counter() - t0)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--latency", type=float, default=3.0, help="simulated upstream seconds")
+    ap.add_argument("--requests", type=int, default=60)
+    ap.add_argument("--workers", type=int, default=4, help="sync workers to compare against")
+    args = ap.parse_args(argv)
+
+    sync_rps = run_sync(args.requests, args.workers, args.latency)
+    async_rps = run_async(args.requests, args.latency)
+    print(f"upstream latency: {args.latency:.1f}s, requests: {args.requests}")
+    print(f"sync  ({args.workers} workers): {sync_rps:8.2f} req/s")
+    print(f"async (1 event loop): {async_rps:8.2f} req/s  ({async_rps / sync_rps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
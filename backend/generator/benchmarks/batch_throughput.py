@@ -0,0 +1,60 @@
+# backend/generator/benchmarks/batch_throughput.py
+"""
+Rows/sec of the batch fan-out (services.batch.iter_batch) at several
+concurrency limits against a simulated upstream.
+
+    PYTHONPATH=backend DJANGO_SETTINGS_MODULE=core.settings python -m generator.benchmarks.batch_throughput --latency 1 --rows 48
+
+Concurrency 1 is the old way: one brief after another.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from generator.ai import api  # noqa: E402
+from generator.benchmarks.fake_upstream import FakeOpenAI  # noqa: E402
+from generator.services.batch import validate_rows, iter_batch  # noqa: E402
+
+BRIEFS = [
+    {"prompt": "Send an SMS to confirm tomorrow's meeting at 10:00", "niche": "consulting", "tone": "friendly"},
+    {"prompt": "Email the client a reminder that the invoice is due Friday", "niche": "freelance", "language": "pt"},
+    {"prompt": "Checklist for the event day setup", "niche": "events", "tone": "urgent"},
+]
+
+
+def run(rows: int, concurrency: int, latency: float) -> float:
+    api.client = FakeOpenAI(latency=latency)
+    forms, _ = validate_rows([dict(BRIEFS[i % len(BRIEFS)], prompt=f"{BRIEFS[i % len(BRIEFS)]['prompt']} #{i}")
+                              for i in range(rows)])
+    t0 = time.perf_counter()
+    for _ in iter_batch(forms, concurrency=concurrency, use_cache=False):
+        pass
+    return rows / (time.perf_counter() - t0)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--latency", type=float, default=1.0, help="simulated upstream seconds")
+    ap.add_argument("--rows", type=int, default=48)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = ap.parse_args(argv)
+
+    print(f"upstream latency: {args.latency:.1f}s, rows: {args.rows}")
+    baseline = None
+    for c in args.concurrency:
+        rps = run(args.rows, c, args.latency)
+        baseline = baseline or rps
+        print(f"concurrency {c:3d}: {rps:8.2f} rows/s  ({rps / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
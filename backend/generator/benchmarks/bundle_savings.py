@@ -0,0 +1,76 @@
+# backend/generator/benchmarks/bundle_savings.py
+"""
+Tokens, cost and modeled latency of one asset_type="bundle" call against
+three separate email / sms / checklist calls for the same brief.
+
+    PYTHONPATH=backend python -m generator.benchmarks.bundle_savings
+    PYTHONPATH=backend python -m generator.benchmarks.bundle_savings --ttft 0.6 --tps 60
+
+Calls go to the in-process FakeOpenAI; token counts come from the ModelCall
+rows the generate flow records (generator/accounting.py), so they follow the
+real prompts: system prompt, niche guide and schema instructions are sent
+once for a bundle instead of three times. Latency is modeled per call as
+TTFT + output tokens / TPS; "parallel" is the slowest of the three.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from generator import accounting  # noqa: E402
+from generator.ai import api  # noqa: E402
+from generator.ai.public import generate_micro_sop  # noqa: E402
+from generator.benchmarks.fake_upstream import FakeOpenAI  # noqa: E402
+
+PROMPT = "Client is two weeks late on the March invoice; remind them politely and list next steps"
+
+
+def run(asset_types, *, niche: str, ttft: float, tps: float) -> dict:
+    api.client = FakeOpenAI(latency=0)  # a fresh fake: no prefix shared with the other scenario
+    with accounting.collect() as calls:
+        for asset_type in asset_types:
+            generate_micro_sop(asset_type, PROMPT, constraints={"niche": niche}, use_cache=False)
+        rows = list(calls.rows)
+        calls.rows = []  # measured only, never written
+    latencies = [ttft + row["completion_tokens"] / tps for row in rows]
+    return {
+        "calls": len(rows),
+        "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+        "cached_tokens": sum(row["cached_tokens"] for row in rows),
+        "completion_tokens": sum(row["completion_tokens"] for row in rows),
+        "cost_usd": float(sum(row["cost_usd"] or 0 for row in rows)),
+        "sequential_s": sum(latencies),
+        "parallel_s": max(latencies),
+    }
+
+
+def _saved(before: float, after: float) -> str:
+    return f"{(1 - after / before) * 100:.0f}%" if before else "-"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--niche", default="freelance")
+    ap.add_argument("--ttft", type=float, default=0.5, help="modeled time to first token, seconds")
+    ap.add_argument("--tps", type=float, default=80.0, help="modeled output tokens per second")
+    args = ap.parse_args(argv)
+
+    separate = run(("email", "sms", "checklist"), niche=args.niche, ttft=args.ttft, tps=args.tps)
+    bundle = run(("bundle",), niche=args.niche, ttft=args.ttft, tps=args.tps)
+
+    print(f"{'':20}{'separate':>12}{'bundle':>12}{'saved':>8}")
+    for key in ("calls", "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd", "sequential_s", "parallel_s"):
+        fmt = "{:>12.6f}" if key == "cost_usd" else "{:>12.2f}" if key.endswith("_s") else "{:>12}"
+        saved = "" if key == "cached_tokens" else _saved(separate[key], bundle[key])
+        print(f"{key:20}" + fmt.format(separate[key]) + fmt.format(bundle[key]) + f"{saved:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# backend/generator/benchmarks/fake_server.py
+"""
+OpenAI-compatible HTTP stand-in for load tests and capacity planning.
+
+Implements the two endpoints call_model_with_schema uses:
+
+    POST /v1/responses          Responses API (json_schema response_format)
+    POST /v1/chat/completions   Chat Completions, incl. stream=True (SSE) and
+                                stream_options.include_usage
+    GET  /v1/models             a static model list (the client warm-up ping)
+    GET  /stats                 request and fault counters as JSON
+
+Answers are schema-valid email/checklist/sms objects generated from
+generator.ai.schemas.SCHEMAS (seeded by the prompt, so the same prompt gets
+the same answer). Latency is drawn from a configurable distribution, and a
+share of requests can fail like the real upstream: 429 with Retry-After,
+429 insufficient_quota, 500, or a hang until the client times out.
+
+Run it with `manage.py fake_openai_server` and point OPENAI_BASE_URL at it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from generator.ai.schemas import SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+_ASSET_TYPE_RE = re.compile(r"Asset type: (\w+)")
+_SCHEMA_NAMES = {name: asset_type for asset_type, (name, _) in SCHEMAS.items()}
+_WORDS = (
+    "confirm schedule review invoice team client update deadline prepare venue send reminder "
+    "check follow-up deliver access contact report order stock shift meeting payment"
+).split()
+
+
+# -----------------------
+# Latency distributions
+# -----------------------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    "fixed:0.8" | "uniform:0.2,1.5" | "normal:0.8,0.2" | "lognormal:0.8,0.5"
+    (median seconds, sigma) | "exp:0.8" (mean seconds). Values are seconds.
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        nums = [float(x) for x in args.split(",") if x.strip()]
+        if kind == "fixed":
+            (value,) = nums
+            return lambda rng: value
+        if kind == "uniform":
+            lo, hi = nums
+            return lambda rng: rng.uniform(lo, hi)
+        if kind == "normal":
+            mean, sd = nums
+            return lambda rng: max(0.0, rng.gauss(mean, sd))
+        if kind == "lognormal":
+            median, sigma = nums
+            mu = math.log(median)
+            return lambda rng: rng.lognormvariate(mu, sigma)
+        if kind == "exp":
+            (mean,) = nums
+            return lambda rng: rng.expovariate(1.0 / mean)
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r}; e.g. fixed:0.8, uniform:0.2,1.5, lognormal:0.8,0.5, exp:0.8")
+
+
+class Behaviour:
+    """What the server does per request. Fault rates are probabilities in [0, 1]."""
+
+    def __init__(
+        self,
+        *,
+        latency: str = "lognormal:0.8,0.4",
+        chunk_chars: int = 8,
+        rate_429: float = 0.0,
+        retry_after: float = 1.0,
+        rate_quota: float = 0.0,
+        rate_500: float = 0.0,
+        rate_timeout: float = 0.0,
+        hang_s: float = 60.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = parse_latency(latency)
+        self.chunk_chars = max(1, chunk_chars)
+        self.rate_429, self.retry_after = rate_429, retry_after
+        self.rate_quota, self.rate_500 = rate_quota, rate_500
+        self.rate_timeout, self.hang_s = rate_timeout, hang_s
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "ok": 0, "streamed": 0, "429": 0, "quota": 0, "500": 0, "timeout": 0}
+
+    def draw(self) -> Tuple[Optional[str], float]:
+        """(fault or None, latency seconds) for one request."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            latency = self.latency(self.rng)
+        for fault, rate in (("429", self.rate_429), ("quota", self.rate_quota), ("500", self.rate_500), ("timeout", self.rate_timeout)):
+            if roll < rate:
+                self.count(fault)
+                return fault, latency
+            roll -= rate
+        return None, latency
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+# -----------------------
+# Schema-valid outputs
+# -----------------------
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[:1].upper() + text[1:]
+
+
+def sample_from_schema(schema: Dict[str, Any], rng: random.Random) -> Any:
+    kind = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "object":
+        return {name: sample_from_schema(sub, rng) for name, sub in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        lo = int(schema.get("minItems", 1))
+        hi = int(schema.get("maxItems", lo + 4))
+        return [sample_from_schema(schema.get("items") or {"type": "string"}, rng) for _ in range(rng.randint(lo, hi))]
+    if kind == "string":
+        text = _sentence(rng, rng.randint(4, 40))
+        return text[: int(schema["maxLength"])] if "maxLength" in schema else text
+    if kind in ("integer", "number"):
+        return rng.randint(0, 100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for m in body.get("messages") or body.get("input") or []:
+        content = m.get("content") if isinstance(m, dict) else ""
+        if isinstance(content, list):
+            content = "".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def output_for(body: Dict[str, Any]) -> Tuple[str, str]:
+    """(JSON text, prompt text) answering a request body."""
+    prompt = _prompt_text(body)
+    fmt = body.get("response_format") or (body.get("text") or {}).get("format") or {}
+    name = (fmt.get("json_schema") or {}).get("name") or fmt.get("name")
+    asset_type = _SCHEMA_NAMES.get(name)
+    if asset_type is None:
+        m = _ASSET_TYPE_RE.search(prompt)
+        asset_type = m.group(1) if m and m.group(1) in SCHEMAS else "email"
+    rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+    return json.dumps(sample_from_schema(SCHEMAS[asset_type][1], rng), ensure_ascii=False), prompt
+
+
+def _usage(prompt: str, output: str) -> Dict[str, int]:
+    return {"prompt_tokens": len(prompt) // 4 + 1, "completion_tokens": len(output) // 4 + 1, "total_tokens": (len(prompt) + len(output)) // 4 + 2}
+
+
+# -----------------------
+# HTTP
+# -----------------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes; don't let delayed ACKs add 40ms
+
+    @property
+    def behaviour(self) -> Behaviour:
+        return self.server.behaviour  # type: ignore[attr-defined]
+
+    def log_message(self, fmt, *args):  # route access logs through logging, not stderr
+        logger.debug("%s " + fmt, self.address_string(), *args)
+
+    def _json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/stats":
+            with self.behaviour._lock:
+                self._json(200, dict(self.behaviour.stats))
+        elif path == "/v1/models":  # what clients.warm_up() pings
+            self._json(200, {"object": "list", "data": [
+                {"id": name, "object": "model", "created": 0, "owned_by": "fake"} for name in ("gpt-4o-mini", "gpt-4o")
+            ]})
+        else:
+            self._json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path not in ("/v1/responses", "/v1/chat/completions"):
+            self._json(404, {"error": {"message": f"Unknown endpoint {path}", "type": "invalid_request_error"}})
+            return
+
+        fault, latency = self.behaviour.draw()
+        if fault:
+            self._fault(fault)
+            return
+        output, prompt = output_for(body)
+        usage = _usage(prompt, output)
+        if path == "/v1/chat/completions" and body.get("stream"):
+            self._stream(body, output, usage, latency)
+            return
+        time.sleep(latency)
+        self.behaviour.count("ok")
+        if path == "/v1/responses":
+            self._json(200, {
+                "id": "resp_fake", "object": "response", "created_at": int(time.time()), "status": "completed",
+                "model": body.get("model"),
+                "output": [{"type": "message", "id": "msg_fake", "role": "assistant", "status": "completed",
+                            "content": [{"type": "output_text", "text": output, "annotations": []}]}],
+                "usage": {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                          "total_tokens": usage["total_tokens"], "input_tokens_details": {"cached_tokens": 0},
+                          "output_tokens_details": {"reasoning_tokens": 0}},
+            })
+        else:
+            self._json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": output}}],
+                "usage": usage,
+            })
+
+    def _fault(self, fault: str) -> None:
+        b = self.behaviour
+        if fault == "429":
+            self._json(429, {"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+                       headers={"Retry-After": f"{b.retry_after:g}", "retry-after-ms": str(int(b.retry_after * 1000))})
+        elif fault == "quota":
+            self._json(429, {"error": {"message": "You exceeded your current quota, please check your plan and billing details.",
+                                       "type": "insufficient_quota", "code": "insufficient_quota"}})
+        elif fault == "500":
+            self._json(500, {"error": {"message": "The server had an error while processing your request.", "type": "server_error"}})
+        elif fault == "timeout":
+            time.sleep(b.hang_s)  # the client gives up first; then drop the connection without answering
+            self.close_connection = True
+
+    def _stream(self, body: Dict[str, Any], output: str, usage: Dict[str, int], latency: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [output[i:i + self.behaviour.chunk_chars] for i in range(0, len(output), self.behaviour.chunk_chars)]
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model")}
+        try:
+            for piece in pieces:
+                time.sleep(latency / max(1, len(pieces)))
+                chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self.wfile.write(f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.behaviour.count("streamed")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client aborted the stream
+
+
+def make_server(host: str, port: int, behaviour: Behaviour) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.behaviour = behaviour  # type: ignore[attr-defined]
+    return server
@@ -0,0 +1,162 @@
+# backend/generator/benchmarks/fake_upstream.py
+"""
+In-process stand-ins for OpenAI / AsyncOpenAI with a fixed simulated latency.
+
+Only the surface used by generator.ai.api is implemented:
+client.responses.create(...) and client.chat.completions.create(...),
+including chat streaming on the sync client.
+
+Responses carry a usage block. cached_tokens models an idealized upstream
+prefix cache: the longest prompt prefix shared with an earlier request,
+at ~4 characters per token (no 1024-token minimum).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+SAMPLE_OUTPUTS: Dict[str, Dict[str, Any]] = {
+    "EmailAsset": {
+        "subject": "Payment reminder",
+        "body_markdown": "Hi,\n\nA quick reminder that the invoice is due on Friday.\n\nThanks!",
+        "summary": "Polite reminder that the invoice is due on Friday.",
+    },
+    "ChecklistAsset": {
+        "title": "Event day checklist",
+        "items": [
+            {"text": "Confirm venue access times", "priority": "high"},
+            {"text": "Send run-of-show to vendors", "priority": "medium"},
+            {"text": "Prepare contingency contacts", "priority": "low"},
+        ],
+    },
+    "SmsAsset": {"message": "Hi! Can you confirm tomorrow's 10:00 meeting?", "cta": "Reply YES"},
+}
+SAMPLE_OUTPUTS["AssetBundle"] = {
+    "email": SAMPLE_OUTPUTS["EmailAsset"], "sms": SAMPLE_OUTPUTS["SmsAsset"], "checklist": SAMPLE_OUTPUTS["ChecklistAsset"],
+}
+
+
+_SCHEMA_BY_TYPE = {"email": "EmailAsset", "checklist": "ChecklistAsset", "sms": "SmsAsset", "bundle": "AssetBundle"}
+_ASSET_TYPE_RE = re.compile(r"Asset type: (\w+)")
+
+
+def sample_for(kwargs: Dict[str, Any]) -> str:
+    fmt = kwargs.get("response_format") or {}
+    name = (fmt.get("json_schema") or {}).get("name")
+    if not name:
+        # chat.completions carries no schema; read the asset type (and language="both") from the prompt
+        text = " ".join(str(m.get("content")) for m in kwargs.get("messages") or [] if isinstance(m, dict))
+        m = _ASSET_TYPE_RE.search(text)
+        name = _SCHEMA_BY_TYPE.get(m.group(1) if m else "", "EmailAsset")
+        if "Language: English and Português" in text:
+            name = "Bilingual" + name
+    if name.startswith("Bilingual"):
+        sample = SAMPLE_OUTPUTS.get(name[len("Bilingual"):], SAMPLE_OUTPUTS["EmailAsset"])
+        return json.dumps({"en": sample, "pt": sample}, ensure_ascii=False)
+    return json.dumps(SAMPLE_OUTPUTS.get(name, SAMPLE_OUTPUTS["EmailAsset"]), ensure_ascii=False)
+
+
+def _prompt_text(kwargs: Dict[str, Any]) -> str:
+    parts = []
+    for m in kwargs.get("messages") or kwargs.get("input") or []:
+        content = m.get("content") if isinstance(m, dict) else ""
+        if isinstance(content, list):
+            content = "".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+class _PrefixCache:
+    def __init__(self):
+        self.seen: List[str] = []
+
+    def usage(self, kwargs: Dict[str, Any], output: str):
+        prompt = _prompt_text(kwargs)
+        shared = max((len(os.path.commonprefix([prompt, p])) for p in self.seen), default=0)
+        self.seen.append(prompt)
+        details = SimpleNamespace(cached_tokens=shared // 4)
+        return SimpleNamespace(
+            prompt_tokens=len(prompt) // 4, completion_tokens=len(output) // 4, prompt_tokens_details=details,
+        )
+
+
+def _response(text: str, usage=None):
+    return SimpleNamespace(output=None, output_text=text, usage=usage)
+
+
+def _completion(text: str, usage=None):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+
+def _delta(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+def _pieces(text: str, chunk_chars: int):
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+
+class FakeOpenAI:
+    """
+    Blocking client: each call sleeps `latency` seconds (like a sync worker).
+    With stream=True the latency is spread over chunks of `chunk_chars`.
+    """
+
+    def __init__(self, latency: float = 3.0, chunk_chars: int = 8):
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.prefix_cache = _PrefixCache()
+        self.responses = SimpleNamespace(create=self._responses_create)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+
+    def _responses_create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        text = sample_for(kwargs)
+        return _response(text, self.prefix_cache.usage(kwargs, text))
+
+    def _chat_create(self, stream: bool = False, stream_options=None, **kwargs):
+        self.calls += 1
+        text = sample_for(kwargs)
+        usage = self.prefix_cache.usage(kwargs, text)
+        if stream:
+            return self._stream(text, usage if (stream_options or {}).get("include_usage") else None)
+        time.sleep(self.latency)
+        return _completion(text, usage)
+
+    def _stream(self, text: str, usage=None):
+        pieces = _pieces(text, self.chunk_chars)
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            yield _delta(piece)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeAsyncOpenAI:
+    """Non-blocking client: each call awaits `latency` seconds."""
+
+    def __init__(self, latency: float = 3.0):
+        self.latency = latency
+        self.calls = 0
+        self.prefix_cache = _PrefixCache()
+        self.responses = SimpleNamespace(create=self._responses_create)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+
+    async def _responses_create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        text = sample_for(kwargs)
+        return _response(text, self.prefix_cache.usage(kwargs, text))
+
+    async def _chat_create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        text = sample_for(kwargs)
+        return _completion(text, self.prefix_cache.usage(kwargs, text))
@@ -0,0 +1,84 @@
+# backend/generator/benchmarks/first_request.py
+"""
+Latency of a worker's first model call with and without the client warm-up
+(generator/ai/clients.py).
+
+    PYTHONPATH=backend python -m generator.benchmarks.first_request --rounds 10
+    PYTHONPATH=backend OPENAI_API_KEY=sk-... python -m generator.benchmarks.first_request --url https://api.openai.com/v1
+
+Each round starts from a fresh process state (clients.reset()):
+    cold    the first call_model_with_schema builds the client and opens the connection
+    warm    clients.warm_up() runs first (as at gunicorn worker boot), then the call
+Without --url a local fake_server answers (plain HTTP, so only client setup
+and TCP connect are saved); against the real API the TLS handshake is too.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from generator.ai import api, capabilities, clients  # noqa: E402
+from generator.ai.prompts import SYSTEM_PROMPT, build_user_prompt  # noqa: E402
+from generator.ai.schemas import SCHEMAS  # noqa: E402
+from generator.benchmarks.fake_server import Behaviour, make_server  # noqa: E402
+
+PROMPT = "Send an SMS to confirm tomorrow's meeting at 10:00"
+
+
+def first_call_ms(warm: bool, model: str) -> float:
+    clients.reset()
+    capabilities.reset()
+    if warm:
+        clients.warm_up()
+    schema_name, schema_def = SCHEMAS["sms"]
+    t0 = time.perf_counter()
+    api.call_model_with_schema(
+        user_prompt=build_user_prompt("sms", PROMPT), schema_name=schema_name, schema_def=schema_def,
+        system_prompt=SYSTEM_PROMPT, model=model, temperature=0.2, max_output_tokens=200,
+    )
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(rounds: int, model: str) -> dict:
+    results = {"cold": [], "warm": []}
+    for _ in range(rounds):
+        for mode in ("cold", "warm"):
+            results[mode].append(first_call_ms(mode == "warm", model))
+    return {mode: statistics.median(values) for mode, values in results.items()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--url", help="OpenAI-compatible base URL (default: a local fake_server)")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--rounds", type=int, default=10)
+    ap.add_argument("--latency", default="fixed:0.05", help="fake_server latency spec")
+    args = ap.parse_args(argv)
+
+    server = None
+    if args.url:
+        os.environ["OPENAI_BASE_URL"] = args.url
+    else:
+        server = make_server("127.0.0.1", 0, Behaviour(latency=args.latency, seed=1))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        medians = run(args.rounds, args.model)
+    finally:
+        clients.reset()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(f"upstream: {os.environ['OPENAI_BASE_URL']}, rounds: {args.rounds}, http2: {clients.client_stats()['http2']}")
+    print(f"first call, cold:   {medians['cold']:8.1f} ms (median)")
+    print(f"first call, warmed: {medians['warm']:8.1f} ms (median)  ({medians['cold'] - medians['warm']:+.1f} ms saved)")
+
+
+if __name__ == "__main__":
+    main()
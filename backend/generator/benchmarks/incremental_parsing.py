@@ -0,0 +1,107 @@
+# backend/generator/benchmarks/incremental_parsing.py
+"""
+Old path (join every chunk, then json.loads; a second json.loads on the
+repair path) vs IncrementalJSONParser on large checklist outputs.
+
+    PYTHONPATH=backend python -m generator.benchmarks.incremental_parsing --items 500 --chunk-chars 8
+
+Reports parse CPU time for the whole output, when the first checklist item
+becomes available (counted in chunks received, i.e. upstream time), and how
+much of a schema-violating output is read before the request is aborted.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from generator.ai.parsing import IncrementalJSONParser, SchemaViolation  # noqa: E402
+from generator.ai.schemas import SCHEMAS  # noqa: E402
+from generator.benchmarks.fake_upstream import _pieces  # noqa: E402
+
+SCHEMA = SCHEMAS["checklist"][1]
+
+
+def checklist_output(n_items: int) -> str:
+    priorities = ("high", "medium", "low")
+    return json.dumps({
+        "title": "Warehouse opening checklist",
+        "items": [
+            {"text": f"Step {i}: verify dock door {i} sensors and log the \"result\"", "priority": priorities[i % 3]}
+            for i in range(n_items)
+        ],
+    }, ensure_ascii=False)
+
+
+def bad_checklist_output(n_items: int) -> str:
+    """Title, then a summary string where the items array should be."""
+    good = json.loads(checklist_output(n_items))
+    return json.dumps({"title": good["title"], "items": "See the list below:\n" + "\n".join(i["text"] for i in good["items"])})
+
+
+def old_path(chunks, *, repair: bool) -> int:
+    text = "".join(chunks)
+    data = json.loads(text)
+    if repair:
+        data = json.loads(text)  # generate_micro_sop re-parsed the text before coercing
+    return 1 if data else 0
+
+
+def new_path(chunks) -> int:
+    parser = IncrementalJSONParser(SCHEMA)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return 1 if parser.close() else 0
+
+
+def first_item_chunk(chunks) -> int:
+    parser = IncrementalJSONParser(SCHEMA)
+    for i, chunk in enumerate(chunks, 1):
+        if any(path[:1] == ("items",) and len(path) == 2 for path, _ in parser.feed(chunk)):
+            return i
+    return len(chunks)
+
+
+def abort_chunk(chunks) -> int:
+    parser = IncrementalJSONParser(SCHEMA)
+    for i, chunk in enumerate(chunks, 1):
+        try:
+            parser.feed(chunk)
+        except SchemaViolation:
+            return i
+    return len(chunks)
+
+
+def timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--items", type=int, default=500)
+    ap.add_argument("--chunk-chars", type=int, default=8, help="characters per streamed delta")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    chunks = _pieces(checklist_output(args.items), args.chunk_chars)
+    bad = _pieces(bad_checklist_output(args.items), args.chunk_chars)
+    total_chars = sum(map(len, chunks))
+
+    print(f"checklist: {args.items} items, {total_chars} chars, {len(chunks)} chunks of {args.chunk_chars}")
+    print(f"parse, old path:            {timed(lambda: old_path(chunks, repair=False), args.repeat):8.2f} ms")
+    print(f"parse, old path (repair):   {timed(lambda: old_path(chunks, repair=True), args.repeat):8.2f} ms")
+    print(f"parse, incremental:         {timed(lambda: new_path(chunks), args.repeat):8.2f} ms  (spread over the stream)")
+    first = first_item_chunk(chunks)
+    print(f"first item after:           {first:8d} / {len(chunks)} chunks  (old path: {len(chunks)})")
+    stop = abort_chunk(bad)
+    print(f"bad output aborted after:   {stop:8d} / {len(bad)} chunks  (old path: {len(bad)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# backend/generator/benchmarks/loadtest.py
+"""
+End-to-end load test of the HTMX flows, run in-process with django.test.Client.
+
+Each virtual user logs in through login_htmx and then loops over weighted
+journeys until the run ends:
+
+    generate  open the generate modal, submit GenerateSOPView (and poll the
+              job until it finishes, when the job queue is on), poll
+              usage-tracker/ twice, list my-assets/
+    browse    usage-tracker/, then my-assets/
+    login     log out, fetch a CSRF cookie, log back in via login_htmx
+
+Users start evenly over the ramp. The model is a simulated upstream: the
+in-process FakeOpenAI (fixed latency), or a fake_openai_server given by URL.
+Generation runs inline in the request by default; with job_workers > 0 the
+GenerationJob queue is on and that many in-process workers drain it.
+Every request's latency, status and DB query count (CaptureQueriesContext on
+the user's thread) is recorded. The report has per-endpoint and per-journey
+p50/p95/p99, error rates and queries per request, plus the git commit, so
+runs can be compared across commits (see compare()).
+
+Used by the `loadtest` management command.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import translation
+
+from generator.services.jobs import job_config, run_pending
+
+logger = logging.getLogger(__name__)
+
+USER_EMAIL = "loadtest+{}@example.invalid"
+PASSWORD = "loadtest-pass-123"
+JOB_TIMEOUT_S = 120.0
+_POLL_URL_RE = re.compile(r'hx-get="([^"]+/generate/jobs/\d+/)"')
+DEFAULT_MIX = {"generate": 3, "browse": 5, "login": 1}
+BRIEFS = [
+    ("Remind a client that invoice #{n} is due on Friday", "freelance"),
+    ("Checklist for opening the venue before the {n}th wedding of the season", "events"),
+    ("SMS to confirm tomorrow's coaching session at {n}:00", "coaching"),
+    ("Follow-up email after design review round {n} with next steps", "design"),
+    ("Weekly status update for consulting engagement week {n}", "consulting"),
+]
+
+# endpoint name -> statuses that count as success
+_EXPECTED = {
+    "csrf": {200},
+    "login_htmx": {200},
+    "logout": {204},
+    "generate_form": {200},
+    "generate_submit": {201, 202},
+    "job_status": {200, 201},
+    "usage_tracker": {200},
+    "my_assets": {200},
+}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return round(ordered[idx], 1)
+
+
+def _summary(samples: List[Tuple[float, bool, int]], elapsed: float) -> Dict[str, Any]:
+    """samples: (latency_ms, ok, queries)."""
+    latencies = [s[0] for s in samples]
+    queries = [s[2] for s in samples]
+    errors = sum(1 for s in samples if not s[1])
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": round(max(latencies), 1),
+        "queries_mean": round(sum(queries) / len(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, List[Tuple[float, bool, int]]] = {}
+        self.journeys: Dict[str, List[Tuple[float, bool, int]]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    def request(self, name: str, latency_ms: float, status: int, queries: int) -> bool:
+        ok = status in _EXPECTED.get(name, {200})
+        with self._lock:
+            self.requests.setdefault(name, []).append((latency_ms, ok, queries))
+            by_status = self.statuses.setdefault(name, {})
+            by_status[status] = by_status.get(status, 0) + 1
+        return ok
+
+    def journey(self, name: str, latency_ms: float, ok: bool, queries: int) -> None:
+        with self._lock:
+            self.journeys.setdefault(name, []).append((latency_ms, ok, queries))
+
+
+class VirtualUser:
+    """One browser session: its own Client, cookies and DB connection."""
+
+    def __init__(self, email: str, recorder: Recorder, rng: random.Random, host: str):
+        self.email, self.recorder, self.rng = email, recorder, rng
+        self.client = Client(enforce_csrf_checks=True, raise_request_exception=False, HTTP_HOST=host)
+        self.htmx = {"HTTP_HX_REQUEST": "true"}
+
+    def _csrf(self) -> Dict[str, str]:
+        cookie = self.client.cookies.get(settings.CSRF_COOKIE_NAME)
+        return {"HTTP_X_CSRFTOKEN": cookie.value} if cookie else {}
+
+    def _hit(self, name: str, method: str, url: str, data: Optional[Dict[str, Any]] = None) -> Tuple[bool, int, Any]:
+        """(ok, queries, response) for one request; response is None if the view raised."""
+        send = self.client.post if method == "POST" else self.client.get
+        headers = {**self.htmx, **(self._csrf() if method == "POST" else {})}
+        response = None
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            try:
+                response = send(url, data or {}, **headers)
+            except Exception:
+                logger.exception("Load test request %s failed", name)
+            latency_ms = (time.perf_counter() - t0) * 1000
+        queries = len(ctx.captured_queries)
+        status = response.status_code if response is not None else 599
+        return self.recorder.request(name, latency_ms, status, queries), queries, response
+
+    def _steps(self, *steps: Tuple[bool, int, Any]) -> Tuple[bool, int]:
+        return all(s[0] for s in steps), sum(s[1] for s in steps)
+
+    # -- journeys: each returns (ok, queries) --
+    def login(self) -> Tuple[bool, int]:
+        return self._steps(
+            self._hit("csrf", "GET", reverse("csrf-ping")),
+            self._hit("login_htmx", "POST", reverse("auth_login_htmx"), {"email": self.email, "password": PASSWORD}),
+        )
+
+    def relogin(self) -> Tuple[bool, int]:
+        ok, queries = self._steps(self._hit("logout", "POST", reverse("auth_logout_htmx")))
+        ok2, queries2 = self.login()
+        return ok and ok2, queries + queries2
+
+    def browse(self) -> Tuple[bool, int]:
+        return self._steps(
+            self._hit("usage_tracker", "GET", reverse("usage-tracker")),
+            self._hit("my_assets", "GET", reverse("user_assets")),
+        )
+
+    def _wait_for_job(self, fragment: str) -> Tuple[bool, int]:
+        """Poll the queued job like the htmx fragment does, until it swaps in a result."""
+        m = _POLL_URL_RE.search(fragment)
+        if not m:
+            return False, 0
+        poll_s = job_config()["POLL_MS"] / 1000.0
+        deadline = time.perf_counter() + JOB_TIMEOUT_S
+        queries = 0
+        while time.perf_counter() < deadline:
+            time.sleep(poll_s)
+            ok, q, response = self._hit("job_status", "GET", m.group(1))
+            queries += q
+            if not ok or response.status_code == 201:
+                return ok and response.status_code == 201, queries
+            if "hx-get" not in response.content.decode():
+                return False, queries  # finished with an error fragment
+        return False, queries
+
+    def generate(self, use_cache: bool) -> Tuple[bool, int]:
+        brief, niche = self.rng.choice(BRIEFS)
+        form = {
+            "prompt": brief.format(n=self.rng.randint(1, 999)), "niche": niche, "tone": "professional",
+            "language": self.rng.choice(("en", "pt")), "payment_method": "none",
+        }
+        if not use_cache:
+            form["skip_cache"] = "on"
+        opened = self._hit("generate_form", "GET", reverse("api-generate-form"))
+        submitted = self._hit("generate_submit", "POST", reverse("api-generate-sop"), form)
+        ok, queries = self._steps(opened, submitted)
+        if ok and submitted[2].status_code == 202:
+            job_ok, job_queries = self._wait_for_job(submitted[2].content.decode())
+            ok, queries = ok and job_ok, queries + job_queries
+        rest_ok, rest_queries = self._steps(
+            self._hit("usage_tracker", "GET", reverse("usage-tracker")),
+            self._hit("usage_tracker", "GET", reverse("usage-tracker")),
+            self._hit("my_assets", "GET", reverse("user_assets")),
+        )
+        return ok and rest_ok, queries + rest_queries
+
+
+def ensure_users(n: int) -> List[str]:
+    """Create (once) n verified users on the unlimited "free" plan."""
+    from allauth.account.models import EmailAddress
+    from django.contrib.auth import get_user_model
+
+    from billing.models import Subscription
+
+    User = get_user_model()
+    emails = [USER_EMAIL.format(i) for i in range(n)]
+    existing = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+    for email in emails:
+        if email in existing:
+            continue
+        user = User.objects.create_user(email=email, password=PASSWORD)
+        EmailAddress.objects.create(user=user, email=email, verified=True, primary=True)
+        Subscription.objects.update_or_create(user=user, defaults={"plan": "free"})
+    return emails
+
+
+def delete_users() -> int:
+    from django.contrib.auth import get_user_model
+
+    deleted, _ = get_user_model().objects.filter(email__startswith="loadtest+", email__endswith="@example.invalid").delete()
+    return deleted
+
+
+def _install_upstream(latency: float, url: Optional[str]) -> Callable[[], None]:
+    """Point generator.ai.api at a simulated upstream; returns a restore function."""
+    from generator.ai import api
+
+    # read the module dict, not the attributes: those would build the real clients (and need OPENAI_API_KEY)
+    saved = {name: api.__dict__.get(name) for name in ("client", "async_client")}
+    if url:
+        from openai import AsyncOpenAI, OpenAI
+
+        api.client = OpenAI(base_url=url, api_key="sk-loadtest", max_retries=0)
+        api.async_client = AsyncOpenAI(base_url=url, api_key="sk-loadtest", max_retries=0)
+    else:
+        from generator.benchmarks.fake_upstream import FakeAsyncOpenAI, FakeOpenAI
+
+        api.client, api.async_client = FakeOpenAI(latency=latency), FakeAsyncOpenAI(latency=latency)
+
+    def restore() -> None:
+        for name, value in saved.items():
+            if value is None:
+                api.__dict__.pop(name, None)  # back to lazy
+            else:
+                setattr(api, name, value)
+    return restore
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=settings.BASE_DIR)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(
+    *,
+    users: int = 10,
+    ramp_s: float = 5.0,
+    duration_s: float = 30.0,
+    iterations: Optional[int] = None,
+    mix: Optional[Dict[str, int]] = None,
+    think_s: float = 0.0,
+    upstream_latency: float = 1.0,
+    upstream_url: Optional[str] = None,
+    use_cache: bool = False,
+    ratelimit: bool = False,
+    job_workers: int = 0,
+    language: str = "en",
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Run the load test and return the report dict. Each user runs journeys
+    until ramp_s + duration_s have passed, or exactly `iterations` journeys
+    when given (a fixed workload, easier to compare across commits).
+    """
+    mix = {k: v for k, v in (mix or DEFAULT_MIX).items() if v > 0}
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown or not mix:
+        raise ValueError(f"Unknown journeys {sorted(unknown)}; expected weights for {sorted(DEFAULT_MIX)}")
+    emails = ensure_users(users)
+    host = next((h for h in settings.ALLOWED_HOSTS if h and not h.startswith(".") and h != "*"), "localhost")
+    recorder = Recorder()
+    master = random.Random(seed)
+    restore = _install_upstream(upstream_latency, upstream_url)
+    t_start = time.perf_counter()
+    deadline = t_start + ramp_s + duration_s
+    stop = threading.Event()
+
+    def job_worker(i: int) -> None:
+        try:
+            while not stop.is_set():
+                if not run_pending(max_jobs=1, worker=f"loadtest-{i}"):
+                    stop.wait(0.05)
+        finally:
+            connection.close()
+
+    def session(i: int) -> None:
+        translation.activate(language)  # i18n_patterns: reverse() needs the language prefix
+        rng = random.Random(master.random() if seed is not None else None)
+        time.sleep(max(0.0, t_start + ramp_s * i / max(1, users) - time.perf_counter()))
+        vu = VirtualUser(emails[i], recorder, rng, host)
+        try:
+            t0 = time.perf_counter()
+            ok, queries = vu.login()
+            recorder.journey("login", (time.perf_counter() - t0) * 1000, ok, queries)
+            names, weights = list(mix), list(mix.values())
+            done = 0
+            while (time.perf_counter() < deadline) if iterations is None else (done < iterations):
+                done += 1
+                name = rng.choices(names, weights)[0]
+                t0 = time.perf_counter()
+                if name == "generate":
+                    ok, queries = vu.generate(use_cache)
+                elif name == "browse":
+                    ok, queries = vu.browse()
+                else:
+                    ok, queries = vu.relogin()
+                recorder.journey(name, (time.perf_counter() - t0) * 1000, ok, queries)
+                if think_s:
+                    time.sleep(rng.uniform(0, 2 * think_s))
+        finally:
+            connection.close()
+
+    jobs_cfg = {**job_config(), "ENABLED": job_workers > 0}
+    workers = [threading.Thread(target=job_worker, args=(i,), daemon=True) for i in range(job_workers)]
+    try:
+        with override_settings(RATELIMIT_ENABLE=ratelimit, GENERATOR_JOBS=jobs_cfg):
+            for w in workers:
+                w.start()
+            with ThreadPoolExecutor(max_workers=users) as pool:
+                list(pool.map(session, range(users)))
+    finally:
+        stop.set()
+        for w in workers:
+            w.join()
+        restore()
+    elapsed = time.perf_counter() - t_start
+
+    all_requests = [s for samples in recorder.requests.values() for s in samples]
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(time.time() - elapsed)),
+            "users": users, "ramp_s": ramp_s, "duration_s": duration_s, "iterations": iterations, "think_s": think_s, "mix": mix,
+            "upstream": upstream_url or f"in-process latency={upstream_latency}s",
+            "use_cache": use_cache, "ratelimit": ratelimit, "job_workers": job_workers, "db": connection.vendor,
+        },
+        "totals": {**(_summary(all_requests, elapsed) if all_requests else {"count": 0}), "elapsed_s": round(elapsed, 2)},
+        "endpoints": {name: {**_summary(s, elapsed), "statuses": recorder.statuses[name]} for name, s in sorted(recorder.requests.items())},
+        "journeys": {name: _summary(s, elapsed) for name, s in sorted(recorder.journeys.items())},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One line per endpoint: p50/p95/p99 and queries vs a baseline report."""
+    lines = [f"vs {baseline['meta'].get('commit') or 'baseline'}:"]
+    for name, cur in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            lines.append(f"  {name:<16} new")
+            continue
+        deltas = " ".join(
+            f"{k}={cur[k]}({cur[k] - old[k]:+.1f})" for k in ("p50_ms", "p95_ms", "p99_ms", "queries_mean")
+        )
+        lines.append(f"  {name:<16} {deltas} err={cur['error_rate']:.2%}")
+    return lines
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
@@ -0,0 +1,73 @@
+# backend/generator/benchmarks/validation.py
+"""
+Old finalize check (json.loads + a loop over "required", and a second
+json.loads when the output needed coercion) vs the compiled jsonschema
+validators with orjson, per asset type.
+
+    PYTHONPATH=backend python -m generator.benchmarks.validation --rounds 20000
+
+Reports microseconds per asset for valid output and for output that fails
+the schema (the old check passes most of those through unnoticed).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from generator.ai.coercers import coerce_to_schema  # noqa: E402
+from generator.ai.parsing import parse_json_text  # noqa: E402
+from generator.ai.schemas import SCHEMAS  # noqa: E402
+from generator.ai.validation import repair, validate  # noqa: E402
+from generator.benchmarks.fake_upstream import SAMPLE_OUTPUTS  # noqa: E402
+
+INVALID = {
+    "email": {"subject": "Follow-up", "body_markdown": "Hi team,\n\nQuick update.", "tags": ["x"]},
+    "checklist": {"title": "Open", "items": [{"text": "Unlock doors", "priority": "urgent"}, {"text": "Lights"}, {"text": "Till"}]},
+    "sms": {"message": "Your appointment is confirmed. " * 15, "cta": "Reply YES"},
+}
+
+
+def old_finalize(asset_type: str, text: str) -> dict:
+    schema_def = SCHEMAS[asset_type][1]
+    data = json.loads(text)
+    if isinstance(data, dict) and all(k in data for k in schema_def.get("required", [])):
+        return data
+    return coerce_to_schema(asset_type, json.loads(text), "fallback prompt")
+
+
+def new_finalize(asset_type: str, text: str) -> dict:
+    data = parse_json_text(text)
+    issues = validate(asset_type, data)
+    if not issues:
+        return data
+    return repair(asset_type, data, issues, "fallback prompt")[0]
+
+
+def bench(fn, asset_type: str, text: str, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(asset_type, text)
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"{'type':<10} {'output':<8} {'old_us':>8} {'new_us':>8} {'old_catches':>12}")
+    for asset_type, (schema_name, schema_def) in SCHEMAS.items():
+        cases = {"valid": json.dumps(SAMPLE_OUTPUTS[schema_name]), "invalid": json.dumps(INVALID[asset_type])}
+        for label, text in cases.items():
+            old_us = bench(old_finalize, asset_type, text, args.rounds)
+            new_us = bench(new_finalize, asset_type, text, args.rounds)
+            caught = "-" if label == "valid" else str(old_finalize(asset_type, text) != json.loads(text))
+            print(f"{asset_type:<10} {label:<8} {old_us:>8.1f} {new_us:>8.1f} {caught:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,23 @@ from django import forms
 
 ALLOWED_NICHES = {"general", "freelance", "consulting", "events", "coaching", "design"}
 TONES = {"professional", "friendly", "urgent", "casual"}
-LANGS = {"en", "pt"}
+LANGS = {"en", "pt", "both"}
+ASSET_TYPES = {"auto", "email", "sms", "checklist", "bundle"}
 PAYMENT_METHODS = {"none", "mbway", "iban", "stripe"}
 
 class GenerateForm(forms.Form):
     prompt = forms.CharField(min_length=3, max_length=2000)
+    asset_type = forms.CharField(required=False, initial="auto")  # "bundle": email + SMS + checklist in one go
     niche = forms.CharField(initial="general")
     tone = forms.CharField(initial="professional")
-    language = forms.CharField(initial="en")
+    language = forms.CharField(initial="en")  # "both": EN + PT variants from one call
     payment_method = forms.CharField(initial="none")
     payment_value = forms.CharField(required=False)
     add_to_calendar = forms.BooleanField(required=False)
     audience = forms.CharField(required=False)
     brand_voice = forms.CharField(required=False)
     include_signature = forms.BooleanField(required=False)
+    skip_cache = forms.BooleanField(required=False)  # force a fresh generation
 
     def clean_niche(self):
         n = (self.cleaned_data["niche"] or "").lower()
@@ -28,6 +31,10 @@ class GenerateForm(forms.Form):
         t = (self.cleaned_data["tone"] or "").lower()
         return t if t in TONES else "professional"
 
+    def clean_asset_type(self):
+        a = (self.cleaned_data["asset_type"] or "").lower()
+        return a if a in ASSET_TYPES else "auto"
+
     def clean_language(self):
         l = (self.cleaned_data["language"] or "").lower()
         return l if l in LANGS else "en"
@@ -0,0 +1,52 @@
+# backend/generator/management/commands/fake_openai_server.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.benchmarks.fake_server import Behaviour, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve an OpenAI-compatible stand-in (responses + chat.completions) returning schema-valid "
+        "assets, with configurable latency and injected 429/quota/500/timeout failures. "
+        "Point OPENAI_BASE_URL at it for load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8089)
+        parser.add_argument("--latency", default="lognormal:0.8,0.4",
+                            help="fixed:S | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA | exp:MEAN (seconds)")
+        parser.add_argument("--chunk-chars", type=int, default=8, help="characters per streamed delta")
+        parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered 429 rate_limit_exceeded")
+        parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with those 429s")
+        parser.add_argument("--rate-quota", type=float, default=0.0, help="share answered 429 insufficient_quota")
+        parser.add_argument("--rate-500", type=float, default=0.0, help="share answered 500")
+        parser.add_argument("--rate-timeout", type=float, default=0.0, help="share left hanging until the client times out")
+        parser.add_argument("--hang", type=float, default=60.0, help="seconds a 'timeout' request hangs before the connection drops")
+        parser.add_argument("--seed", type=int, default=None, help="seed for latency and fault draws")
+
+    def handle(self, *args, **opts):
+        rates = [opts["rate_429"], opts["rate_quota"], opts["rate_500"], opts["rate_timeout"]]
+        if any(r < 0 for r in rates) or sum(rates) > 1:
+            raise CommandError("fault rates must be >= 0 and add up to at most 1")
+        try:
+            behaviour = Behaviour(
+                latency=opts["latency"], chunk_chars=opts["chunk_chars"],
+                rate_429=opts["rate_429"], retry_after=opts["retry_after"], rate_quota=opts["rate_quota"],
+                rate_500=opts["rate_500"], rate_timeout=opts["rate_timeout"], hang_s=opts["hang"], seed=opts["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        server = make_server(opts["host"], opts["port"], behaviour)
+        host, port = server.server_address[:2]
+        self.stderr.write(f"Fake OpenAI listening; use OPENAI_BASE_URL=http://{host}:{port}/v1 (stats at /stats)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(json.dumps(behaviour.stats))
@@ -0,0 +1,50 @@
+# backend/generator/management/commands/generate_batch.py
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.services.batch import BatchError, read_csv, run_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate assets for every brief in a CSV (columns: prompt, niche, tone, language, ...) "
+        "on behalf of a user. Writes NDJSON, one line per row as it finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="CSV file with a header row; '-' reads stdin")
+        parser.add_argument("--user", required=True, help="email of the user the assets (and credits) belong to")
+        parser.add_argument("--concurrency", type=int, default=None, help="parallel model calls (default: settings)")
+        parser.add_argument("--output", default="-", help="NDJSON output file (default: stdout)")
+        parser.add_argument("--skip-cache", action="store_true", help="force fresh generations")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=opts["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {opts['user']!r}")
+
+        if opts["csv_path"] == "-":
+            text = sys.stdin.read()
+        else:
+            with open(opts["csv_path"], encoding="utf-8") as fh:
+                text = fh.read()
+
+        out = self.stdout if opts["output"] == "-" else open(opts["output"], "w", encoding="utf-8")
+        try:
+            for record in run_batch(user, read_csv(text), concurrency=opts["concurrency"], use_cache=not opts["skip_cache"]):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if record.get("done"):
+                    self.stderr.write(
+                        f"{record['succeeded']} ok, {record['failed']} failed in {record['elapsed_s']}s "
+                        f"({record['rows_per_s']} rows/s)"
+                    )
+        except BatchError as e:
+            raise CommandError(str(e))
+        finally:
+            if out is not self.stdout:
+                out.close()
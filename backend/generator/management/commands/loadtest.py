@@ -0,0 +1,74 @@
+# backend/generator/management/commands/loadtest.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.benchmarks.loadtest import DEFAULT_MIX, compare, delete_users, load_report, run
+
+
+def _mix(value: str):
+    try:
+        return {name.strip(): int(weight) for name, weight in (part.split("=") for part in value.split(","))}
+    except ValueError:
+        raise CommandError(f"--mix expects name=weight pairs, e.g. generate=3,browse=5,login=1 (got {value!r})")
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the login / generate / usage-tracker / my-assets flows in-process with virtual users "
+        "against a simulated model, and write a JSON report (per-endpoint p50/p95/p99, error rates, DB queries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+        parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users start")
+        parser.add_argument("--duration", type=float, default=30.0, help="seconds at full concurrency")
+        parser.add_argument("--iterations", type=int, default=None,
+                            help="journeys per user instead of a timed run (fixed workload for comparisons)")
+        parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                            help="journey weights: generate, browse, login")
+        parser.add_argument("--think", type=float, default=0.0, help="mean think time between journeys (s)")
+        parser.add_argument("--upstream-latency", type=float, default=1.0, help="in-process fake model latency (s)")
+        parser.add_argument("--upstream-url", default=None,
+                            help="use a fake_openai_server instead, e.g. http://127.0.0.1:8089/v1")
+        parser.add_argument("--use-cache", action="store_true", help="let the response cache serve repeats")
+        parser.add_argument("--ratelimit", action="store_true", help="keep the per-user generate rate limit on")
+        parser.add_argument("--job-workers", type=int, default=0,
+                            help="run generations through the job queue with this many in-process workers (0 = inline)")
+        parser.add_argument("--language", default="en", help="URL language prefix")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--output", default=None, help="report path (default: loadtest-<commit>.json)")
+        parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+        parser.add_argument("--cleanup", action="store_true", help="delete the load-test users (and their assets) afterwards")
+
+    def handle(self, *args, **opts):
+        if opts["users"] < 1:
+            raise CommandError("--users must be at least 1")
+        length = f"{opts['iterations']} journeys each" if opts["iterations"] else f"{opts['duration']}s at full load"
+        self.stderr.write(f"{opts['users']} users, ramp {opts['ramp']}s, {length}...")
+        try:
+            report = run(
+                users=opts["users"], ramp_s=opts["ramp"], duration_s=opts["duration"], iterations=opts["iterations"],
+                mix=_mix(opts["mix"]), think_s=opts["think"], upstream_latency=opts["upstream_latency"], upstream_url=opts["upstream_url"],
+                use_cache=opts["use_cache"], ratelimit=opts["ratelimit"], job_workers=max(0, opts["job_workers"]),
+                language=opts["language"], seed=opts["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if opts["cleanup"]:
+                self.stderr.write(f"Deleted {delete_users()} load-test rows")
+
+        path = opts["output"] or f"loadtest-{report['meta']['commit'] or 'local'}.json"
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+        for name, s in report["endpoints"].items():
+            self.stderr.write(
+                f"{name:<16} n={s['count']:<6} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms "
+                f"err={s['error_rate']:.2%} queries={s['queries_mean']}"
+            )
+        if opts["baseline"]:
+            for line in compare(report, load_report(opts["baseline"])):
+                self.stderr.write(line)
+        self.stdout.write(json.dumps({"report": path, **report["totals"]}))
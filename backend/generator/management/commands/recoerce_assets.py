@@ -0,0 +1,40 @@
+# backend/generator/management/commands/recoerce_assets.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.services.recoerce import recoerce_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the current coercers and presenters over stored GeneratedAssets and write back "
+        "the rows whose result changed. Resumable with --checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="rows read and written per batch")
+        parser.add_argument("--workers", type=int, default=4, help="coercion processes (0 = in-process)")
+        parser.add_argument("--checkpoint", default=None, help="file recording the last processed pk; resumes from it")
+        parser.add_argument("--dry-run", action="store_true", help="count changes and show diffs without writing")
+        parser.add_argument("--diffs", type=int, default=None, help="rendering diffs to print (default: 5 with --dry-run)")
+        parser.add_argument("--language", default="en", choices=("en", "pt"), help="coercion language for rows stored without one")
+        parser.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+
+    def handle(self, *args, **opts):
+        if opts["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        diffs = opts["diffs"] if opts["diffs"] is not None else (5 if opts["dry_run"] else 0)
+        for record in recoerce_rows(
+            chunk_size=opts["chunk_size"], workers=max(0, opts["workers"]), dry_run=opts["dry_run"],
+            checkpoint=opts["checkpoint"], language=opts["language"], limit=opts["limit"], max_diffs=diffs,
+        ):
+            if "diff" in record:
+                self.stdout.write(record["diff"])
+            elif record.get("done"):
+                self.stdout.write(json.dumps(record))
+            else:
+                self.stderr.write(
+                    f"pk<={record['last_pk']}: {record['scanned']} scanned, {record['changed']} changed "
+                    f"({record['rows_per_s']} rows/s)"
+                )
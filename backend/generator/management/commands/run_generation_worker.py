@@ -0,0 +1,35 @@
+# backend/generator/management/commands/run_generation_worker.py
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from generator.services.jobs import job_config, requeue_stale, run_pending, worker_id
+
+
+class Command(BaseCommand):
+    help = "Process queued GenerationJobs. Run as many copies as you like; jobs are claimed with SKIP LOCKED."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="drain the queue once and exit")
+        parser.add_argument("--poll", type=float, default=None, help="seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **opts):
+        poll = opts["poll"] if opts["poll"] is not None else job_config()["WORKER_POLL_S"]
+        me = worker_id()
+        stopping = []
+        # Finish the current job on SIGTERM/SIGINT instead of dying mid-generation
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+        self.stdout.write(f"Generation worker {me} started")
+        while not stopping:
+            close_old_connections()
+            requeue_stale()
+            ran = run_pending(max_jobs=1, worker=me)
+            if opts["once"] and not ran:
+                break
+            if not ran:
+                time.sleep(poll)
+        self.stdout.write(f"Generation worker {me} stopped")
@@ -0,0 +1,61 @@
+# backend/generator/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from generator import accounting, timing
+
+
+class ServerTimingMiddleware:
+    """Collect per-stage timings for each request; see generator/timing.py."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with timing.collect() as timings:
+            response = self.get_response(request)
+        return timing.finish(timings, response)
+
+    async def __acall__(self, request):
+        with timing.collect() as timings:
+            response = await self.get_response(request)
+        return timing.finish(timings, response)
+
+
+class ModelCallMiddleware:
+    """Collect the request's ModelCall rows and tag them with its user; see generator/accounting.py."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with accounting.collect() as calls:
+            response = self.get_response(request)
+            if calls.rows:
+                _set_user(calls, getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        with accounting.collect() as calls:
+            response = await self.get_response(request)
+            if calls.rows and hasattr(request, "auser"):
+                _set_user(calls, await request.auser())
+        return response
+
+
+def _set_user(calls, user) -> None:
+    if user is not None and user.is_authenticated:
+        calls.user_id = user.pk
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0002_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='route',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0003_generationjob_route'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('plan', models.CharField(blank=True, max_length=20)),
+                ('niche', models.CharField(blank=True, max_length=40)),
+                ('asset_type', models.CharField(max_length=20)),
+                ('language', models.CharField(blank=True, max_length=10)),
+                ('model', models.CharField(max_length=60)),
+                ('route', models.CharField(blank=True, max_length=40)),
+                ('call_shape', models.CharField(blank=True, max_length=30)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('cached_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('max_output_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('coerced', models.BooleanField(default=False)),
+                ('ok', models.BooleanField(default=True)),
+                ('error', models.CharField(blank=True, max_length=60)),
+                ('cost_usd', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='generator.generatedasset')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['plan', 'niche', 'asset_type', 'created_at'], name='generator_m_plan_72102e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0004_modelcall'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedasset',
+            name='counterpart',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='generator.generatedasset'),
+        ),
+        migrations.AddField(
+            model_name='generatedasset',
+            name='language',
+            field=models.CharField(blank=True, default='', max_length=5),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0005_generatedasset_language_counterpart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='credits',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0006_generationjob_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelcall',
+            name='attempt',
+            field=models.CharField(blank=True, choices=[('', 'Served'), ('retried', 'Retried'), ('hedge_loser', 'Hedge loser')], default='', max_length=12),
+        ),
+    ]
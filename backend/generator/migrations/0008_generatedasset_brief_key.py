@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0007_modelcall_attempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedasset',
+            name='brief_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
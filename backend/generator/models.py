@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class GeneratedAsset(models.Model):
     ASSET_TYPE_CHOICES = (
@@ -12,7 +13,99 @@ class GeneratedAsset(models.Model):
     asset_type = models.CharField(max_length=20, choices=ASSET_TYPE_CHOICES)
     prompt_used = models.TextField()
     result = models.TextField()
+    language = models.CharField(max_length=5, blank=True, default="")
+    # language="both": the same asset in the other language, generated by the same call
+    counterpart = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    brief_key = models.CharField(max_length=64, blank=True, default="", db_index=True)  # generation.brief_key of a pair
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.email} - {self.asset_type} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class GenerationJob(models.Model):
+    """
+    A queued generation. The web request enqueues it and polls; the
+    run_generation_worker command claims it, calls the model and persists
+    the asset, so the result survives proxy timeouts and worker restarts.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    payload = models.JSONField()              # validated GenerateForm data
+    used_before = models.PositiveIntegerField(default=0)
+    credits = models.PositiveSmallIntegerField(default=1)   # reserved at enqueue, charged by the worker
+    result = models.JSONField(null=True, blank=True)
+    route = models.JSONField(null=True, blank=True)   # router decision: name, model, temperature, reason, served_from
+    error = models.TextField(blank=True)
+    asset = models.ForeignKey(GeneratedAsset, null=True, blank=True, on_delete=models.SET_NULL)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.user.email} - job {self.pk} - {self.status}"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class ModelCall(models.Model):
+    """
+    One upstream model call: tokens, latency and estimated cost, for cost
+    reports per plan, niche and asset type. Written in batches by
+    generator/accounting.py, never on the request path. Every attempt gets a
+    row: besides the call that answered, a failed attempt that was retried
+    and the losing leg of a hedged call are recorded with their `attempt`.
+    """
+    ATTEMPT_SERVED = ""
+    ATTEMPT_RETRIED = "retried"
+    ATTEMPT_HEDGE_LOSER = "hedge_loser"
+    ATTEMPT_CHOICES = (
+        (ATTEMPT_SERVED, "Served"),
+        (ATTEMPT_RETRIED, "Retried"),
+        (ATTEMPT_HEDGE_LOSER, "Hedge loser"),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    asset = models.ForeignKey(GeneratedAsset, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    plan = models.CharField(max_length=20, blank=True)        # the user's plan when the row was written
+    niche = models.CharField(max_length=40, blank=True)
+    asset_type = models.CharField(max_length=20)
+    language = models.CharField(max_length=10, blank=True)
+    model = models.CharField(max_length=60)
+    route = models.CharField(max_length=40, blank=True)       # router.py route name
+    call_shape = models.CharField(max_length=30, blank=True)  # api.py request shape that answered
+    attempt = models.CharField(max_length=12, choices=ATTEMPT_CHOICES, default=ATTEMPT_SERVED, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    max_output_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    coerced = models.BooleanField(default=False)              # output rebuilt by coerce_to_schema
+    ok = models.BooleanField(default=True)
+    error = models.CharField(max_length=60, blank=True)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["plan", "niche", "asset_type", "created_at"])]
+
+    def __str__(self):
+        return f"{self.model} {self.asset_type} - {self.prompt_tokens}+{self.completion_tokens} tokens, {self.latency_ms}ms"
@@ -1,6 +1,15 @@
 # Keep existing imports elsewhere working:
 # from generator.openai_client import generate_micro_sop
 
-from .ai.public import generate_micro_sop, client, AssetType
+from .ai.public import generate_micro_sop, generate_micro_sop_async, AssetType
 
-__all__ = ["generate_micro_sop", "client", "AssetType"]
+
+def __getattr__(name: str):
+    if name == "client":  # built lazily (ai/clients.py)
+        from .ai import api
+        return api.client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# "client" is provided lazily by __getattr__ above; kept so star-imports still export it
+__all__ = ["generate_micro_sop", "generate_micro_sop_async", "client", "AssetType"]  # noqa: F822
@@ -3,6 +3,14 @@ def result_to_plain_text(result: dict) -> str:
     if not isinstance(result, dict):
         return str(result).strip()
 
+    # language="both": one section per language
+    if set(result) == {"en", "pt"}:
+        return "\n\n".join(f"[{lang.upper()}]\n{result_to_plain_text(result[lang])}" for lang in ("en", "pt"))
+
+    # Bundle: one section per part
+    if set(result) == {"email", "sms", "checklist"}:
+        return "\n\n---\n\n".join(result_to_plain_text(result[part]) for part in ("email", "sms", "checklist"))
+
     # Email schema
     if "subject" in result or "body_markdown" in result:
         subject = (result.get("subject") or "").strip()
@@ -1,4 +1,6 @@
 # backend/generator/serializers.py
+import json
+
 from rest_framework import serializers
 from .models import GeneratedAsset
 
@@ -21,6 +23,8 @@ class GenerateRequestSerializer(serializers.Serializer):
 
 class GeneratedAssetSerializer(serializers.ModelSerializer):
     """Read serializer for returning saved generations to the client."""
+    # GeneratedAsset.result is JSON text; expose it parsed
+    content = serializers.SerializerMethodField()
     # Optional tiny preview for listing UI
     preview = serializers.SerializerMethodField()
 
@@ -30,18 +34,27 @@ class GeneratedAssetSerializer(serializers.ModelSerializer):
             "id",
             "asset_type",
             "prompt_used",
-            "content",        # JSONField: email/checklist/sms schema
+            "content",        # parsed result: email/checklist/sms schema
+            "language",
+            "counterpart",    # id of the same asset in the other language (language="both")
             "created_at",
             "preview",
         ]
         read_only_fields = ["id", "created_at"]
 
+    def get_content(self, obj):
+        try:
+            data = json.loads(obj.result or "null")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
     def get_preview(self, obj):
         """
         Build a short human-friendly preview depending on asset_type.
         Safe against missing keys (just in case).
         """
-        c = obj.content or {}
+        c = self.get_content(obj) or {}
         if obj.asset_type == "email":
             subject = c.get("subject") or ""
             return (subject or "").strip()[:120]
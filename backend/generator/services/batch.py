@@ -0,0 +1,186 @@
+# backend/generator/services/batch.py
+"""
+Batch generation: many briefs (CSV or JSON rows), one credit check, a bounded
+pool of concurrent model calls, one bulk insert.
+
+Each row is validated with GenerateForm, so a row carries the same fields as
+the single-asset form (prompt, niche, tone, language, payment_method, ...).
+Missing optional columns fall back to the form defaults.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from generator import accounting
+from generator.forms import GenerateForm
+from generator.services.credits import form_cost, gate, record_success
+from generator.services.generation import brief_key, generate_asset, generate_kwargs
+from generator.services.persist import link_counterparts, result_items, save_assets_bulk
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"CONCURRENCY": 8, "MAX_CONCURRENCY": 16, "MAX_ROWS": 100}
+
+ROW_DEFAULTS = {"niche": "general", "tone": "professional", "language": "en", "payment_method": "none"}
+
+
+class BatchError(ValueError):
+    """The batch as a whole was rejected (bad input, too many rows, no credits)."""
+
+
+def _config() -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_BATCH", {}) or {})
+    return cfg
+
+
+def concurrency_limit(requested: Optional[int] = None) -> int:
+    cfg = _config()
+    value = requested or cfg["CONCURRENCY"]
+    return max(1, min(int(value), int(cfg["MAX_CONCURRENCY"])))
+
+
+def read_csv(text: str) -> List[Dict[str, str]]:
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    return [{(k or "").strip().lower(): (v or "").strip() for k, v in row.items()} for row in reader]
+
+
+def validate_rows(rows: Iterable[Dict[str, Any]]) -> Tuple[List[GenerateForm], Dict[int, Dict[str, Any]]]:
+    """Return (valid forms, {row index: errors}); rows are numbered from 0."""
+    max_rows = int(_config()["MAX_ROWS"])
+    rows = list(rows)
+    if not rows:
+        raise BatchError("No briefs given.")
+    if len(rows) > max_rows:
+        raise BatchError(f"Too many briefs ({len(rows)}); the limit is {max_rows}.")
+
+    forms, errors = [], {}
+    for i, row in enumerate(rows):
+        data = {**ROW_DEFAULTS, **{k: v for k, v in row.items() if v not in (None, "")}}
+        form = GenerateForm(data)
+        if form.is_valid():
+            form.row = i
+            forms.append(form)
+        else:
+            errors[i] = {k: [str(m) for m in v] for k, v in form.errors.items()}
+    return forms, errors
+
+
+def _generate(calls: Optional[accounting.Calls], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    with accounting.collect(calls=calls):
+        return generate_asset(**kwargs)
+
+
+def iter_batch(
+    forms: List[GenerateForm], *, concurrency: Optional[int] = None, use_cache: bool = True,
+    calls: Optional[Dict[int, accounting.Calls]] = None, cancel: Optional[threading.Event] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run generate_asset for every form with at most `concurrency` calls in
+    flight and yield one record per row as it finishes (completion order):
+        {"row": i, "ok": True, "result": {...}} or {"row": i, "ok": False, "error": "..."}
+    No DB access happens here, so the worker threads never hold connections.
+    Pass `calls` ({row: Calls}) to collect each row's ModelCall rows for the caller to link.
+    Once `cancel` is set, rows that have not started are dropped; rows in flight still finish.
+    """
+    calls = calls or {}
+    with ThreadPoolExecutor(max_workers=concurrency_limit(concurrency), thread_name_prefix="batch") as pool:
+        futures = {
+            pool.submit(_generate, calls.get(form.row), generate_kwargs(form, use_cache=use_cache)): form
+            for form in forms
+        }
+        for future in as_completed(futures):
+            if cancel is not None and cancel.is_set():
+                for pending in futures:
+                    pending.cancel()
+            if future.cancelled():
+                continue
+            form = futures[future]
+            try:
+                yield {"row": form.row, "ok": True, "result": future.result()}
+            except Exception as e:
+                logger.exception("Batch row %s failed", form.row)
+                yield {"row": form.row, "ok": False, "error": str(e) or e.__class__.__name__}
+
+
+def run_batch(user, rows: Iterable[Dict[str, Any]], *, concurrency: Optional[int] = None, use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Validate, gate credits once for the batch, generate, then persist every
+    successful row with one bulk insert and charge only for those rows.
+
+    Yields invalid-row records first, then per-row records as generations
+    finish, then a summary: {"done": True, "succeeded": n, "failed": m, "rows_per_s": ...}.
+    Raises BatchError before anything runs if the batch is rejected.
+    """
+    forms, errors = validate_rows(rows)
+    prices = {form.row: form_cost(form) for form in forms}
+    if forms:
+        ok, msg, used_before = gate(user, count=len(forms), credits=sum(prices.values()))
+        if not ok:
+            raise BatchError(msg)
+
+    t0 = time.perf_counter()
+    for i, errs in errors.items():
+        yield {"row": i, "ok": False, "error": "invalid", "fields": errs}
+
+    forms_by_row = {form.row: form for form in forms}
+    prompts = {form.row: form.cleaned_data["prompt"] for form in forms}
+    languages = {form.row: form.cleaned_data["language"] for form in forms}
+    calls = {form.row: accounting.Calls(user.pk) for form in forms}
+    done: List[int] = []
+    items: List[Tuple[str, Dict[str, Any], str, str]] = []   # one per bundle part and per language of "both"
+    item_rows: List[int] = []
+    cancel = threading.Event()
+    disconnected = False
+    try:
+        for record in iter_batch(forms, concurrency=concurrency, use_cache=use_cache, calls=calls, cancel=cancel):
+            if record["ok"]:
+                done.append(record["row"])
+                row_items = result_items(prompts[record["row"]], record["result"], languages[record["row"]])
+                items += row_items
+                item_rows += [record["row"]] * len(row_items)
+            if disconnected:
+                continue
+            try:
+                yield record
+            except GeneratorExit:
+                # Client went away: keep draining so finished rows are persisted and charged below
+                disconnected = True
+                cancel.set()
+
+        if done:
+            try:
+                assets = save_assets_bulk(user=user, items=items)
+                record_success(user, used_before, count=len(done), credits=sum(prices[row] for row in done))
+                by_row: Dict[int, List[Any]] = {}
+                for row, asset in zip(item_rows, assets):
+                    calls[row].link(asset)  # a row's call links to its first asset
+                    by_row.setdefault(row, []).append(asset)
+                link_counterparts(by_row.values(), [brief_key(forms_by_row[row]) for row in by_row])
+            except Exception:
+                logger.exception("Batch persist/usage failed (non-fatal)")
+    finally:
+        for row_calls in calls.values():
+            row_calls.submit()
+    if disconnected:
+        return
+
+    elapsed = time.perf_counter() - t0
+    logger.info("Batch finished: rows=%d ok=%d failed=%d elapsed=%.2fs", len(forms) + len(errors), len(done),
+                len(forms) + len(errors) - len(done), elapsed)
+    yield {
+        "done": True,
+        "succeeded": len(done),
+        "failed": len(forms) + len(errors) - len(done),
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(len(forms) / elapsed, 2) if elapsed > 0 else None,
+    }
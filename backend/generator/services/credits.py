@@ -1,6 +1,12 @@
 # backend/generator/services/credits.py
+from django.conf import settings
+from django.db.models import Sum
+
 from billing.models import UsageRecord
+from generator.models import GenerationJob
 CREDITS_PER_SOP = 1
+BUNDLE_CREDITS = 2  # default price of an email + SMS + checklist bundle; settings.GENERATOR_BUNDLE["CREDITS"]
+BILINGUAL_EXTRA_CREDITS = 1  # added for language="both"; settings.GENERATOR_BILINGUAL["EXTRA_CREDITS"]
 
 USE_NEW_CREDIT = False
 try:
@@ -9,17 +15,44 @@ try:
 except Exception:
     from billing.utils import get_credits_used_this_month, get_monthly_limit_for_user
 
-def gate(user) -> tuple[bool, str | None, int]:
+def credit_cost(asset_type: str = "auto", language: str = "en") -> int:
+    """Credits one generation of `asset_type` in `language` costs."""
+    cost = CREDITS_PER_SOP
+    if asset_type == "bundle":
+        cost = int((getattr(settings, "GENERATOR_BUNDLE", {}) or {}).get("CREDITS", BUNDLE_CREDITS))
+    if language == "both":
+        cost += int((getattr(settings, "GENERATOR_BILINGUAL", {}) or {}).get("EXTRA_CREDITS", BILINGUAL_EXTRA_CREDITS))
+    return cost
+
+def form_cost(form) -> int:
+    """credit_cost of a validated GenerateForm."""
+    return credit_cost(form.cleaned_data["asset_type"], form.cleaned_data["language"])
+
+def reserved_credits(user) -> int:
+    """Credits of the user's queued/running jobs: gated at enqueue, not charged yet."""
+    pending = GenerationJob.objects.filter(
+        user=user, status__in=(GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING),
+    )
+    return pending.aggregate(total=Sum("credits"))["total"] or 0
+
+def gate(user, count: int = 1, *, credits: int | None = None) -> tuple[bool, str | None, int]:
+    """
+    Check credits for `count` generations at once (batches gate the whole batch).
+    Pass `credits` when the price isn't CREDITS_PER_SOP each (see credit_cost).
+    Credits reserved by queued jobs count as spent.
+    """
+    amount = (CREDITS_PER_SOP * count if credits is None else credits) + reserved_credits(user)
     used = get_credits_used_this_month(user)
     if USE_NEW_CREDIT:
-        ok, msg = credit_gate(user, amount=CREDITS_PER_SOP, used_this_month=used)
+        ok, msg = credit_gate(user, amount=amount, used_this_month=used)
         return ok, msg if not ok else None, used
     limit = get_monthly_limit_for_user(user)
-    if used + CREDITS_PER_SOP > limit:
+    if used + amount > limit:
         return False, "Credit limit reached for this month.", used
     return True, None, used
 
-def record_success(user, used_before: int):
-    UsageRecord.objects.create(user=user, credits_used=CREDITS_PER_SOP)
+def record_success(user, used_before: int, count: int = 1, *, credits: int | None = None):
+    amount = CREDITS_PER_SOP * count if credits is None else credits
+    UsageRecord.objects.create(user=user, credits_used=amount)
     if USE_NEW_CREDIT:
-        consume_post_success(user, amount=CREDITS_PER_SOP, used_before=used_before)
+        consume_post_success(user, amount=amount, used_before=used_before)
@@ -1,18 +1,86 @@
 # backend/generator/services/generation.py
+import hashlib
+import json
 import os
 import logging
-from generator.openai_client import generate_micro_sop
+from generator.openai_client import generate_micro_sop, generate_micro_sop_async
+from generator.ai.streaming import stream_micro_sop
 logger = logging.getLogger(__name__)
 
-def generate_asset(*, prompt: str, language: str, tone: str,
+def generate_kwargs(form, *, use_cache: bool = True) -> dict:
+    """generate_asset/stream_asset kwargs from a validated GenerateForm."""
+    return dict(
+        prompt=form.cleaned_data["prompt"],
+        asset_type=form.cleaned_data.get("asset_type") or "auto",
+        language=form.cleaned_data["language"],
+        tone=form.cleaned_data["tone"],
+        audience=form.cleaned_data.get("audience"),
+        brand_voice=form.cleaned_data.get("brand_voice"),
+        include_signature=bool(form.cleaned_data.get("include_signature")),
+        constraints=form.constraints(),
+        use_cache=use_cache and not form.cleaned_data.get("skip_cache"),
+    )
+
+def brief_key(form) -> str:
+    """Hash of everything a generation depends on except the language; pairs language="both" halves with later requests."""
+    kwargs = {k: v for k, v in generate_kwargs(form).items() if k not in ("language", "use_cache")}
+    return hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode()).hexdigest()
+
+def generate_asset(*, prompt: str, asset_type: str = "auto", language: str, tone: str,
                    audience: str | None, brand_voice: str | None,
-                   include_signature: bool, constraints: dict) -> dict:
+                   include_signature: bool, constraints: dict, use_cache: bool = True,
+                   meta: dict | None = None) -> dict:
+    """
+    Model and temperature are routed (generator/ai/router.py); pass `meta` to get the decision.
+    asset_type "auto" detects the type from the prompt; "bundle" returns email, SMS and checklist.
+    """
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("OPENAI_API_KEY is missing")
 
     # Call with auto_coerce to avoid hard failures
     return generate_micro_sop(
-        asset_type="auto",
+        asset_type=asset_type,
+        prompt=prompt,
+        language=language,
+        tone=tone,
+        audience=audience,
+        constraints=constraints,
+        brand_voice=brand_voice,
+        include_signature=include_signature,
+        auto_coerce=True,
+        use_cache=use_cache,
+        meta=meta,
+    )
+
+async def generate_asset_async(*, prompt: str, asset_type: str = "auto", language: str, tone: str,
+                               audience: str | None, brand_voice: str | None,
+                               include_signature: bool, constraints: dict, use_cache: bool = True,
+                               meta: dict | None = None) -> dict:
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is missing")
+
+    return await generate_micro_sop_async(
+        asset_type=asset_type,
+        prompt=prompt,
+        language=language,
+        tone=tone,
+        audience=audience,
+        constraints=constraints,
+        brand_voice=brand_voice,
+        include_signature=include_signature,
+        auto_coerce=True,
+        use_cache=use_cache,
+        meta=meta,
+    )
+
+def stream_asset(*, prompt: str, asset_type: str = "auto", language: str, tone: str,
+                 audience: str | None, brand_voice: str | None,
+                 include_signature: bool, constraints: dict, use_cache: bool = True):
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is missing")
+
+    return stream_micro_sop(
+        asset_type=asset_type,
         prompt=prompt,
         language=language,
         tone=tone,
@@ -21,4 +89,5 @@ def generate_asset(*, prompt: str, language: str, tone: str,
         brand_voice=brand_voice,
         include_signature=include_signature,
         auto_coerce=True,
+        use_cache=use_cache,
     )
@@ -0,0 +1,145 @@
+# backend/generator/services/jobs.py
+"""
+DB-backed generation queue (no external broker).
+
+Off by default (GENERATOR_JOBS["ENABLED"]): without a worker running, queued
+jobs would never finish. enqueue() stores the submitted form data after the
+credit check and reserves the job's credits, so the gate counts queued and
+running jobs until the worker charges them. Workers
+(manage.py run_generation_worker) claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so several can run side by side, then
+generate, persist the asset and charge the credit exactly like the inline
+view. A job whose worker died mid-run is requeued once its lock goes stale.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from generator import accounting
+from generator.forms import GenerateForm
+from generator.models import GenerationJob
+from generator.services.credits import record_success
+from generator.services.generation import brief_key, generate_asset, generate_kwargs
+from generator.services.persist import save_result
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"ENABLED": False, "POLL_MS": 1500, "WORKER_POLL_S": 1.0, "MAX_ATTEMPTS": 3, "STALE_AFTER_S": 300}
+
+
+def job_config() -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_JOBS", {}) or {})
+    return cfg
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(user, data: Dict[str, Any], used_before: int, credits: int = 1) -> GenerationJob:
+    return GenerationJob.objects.create(user=user, payload=data, used_before=used_before, credits=credits)
+
+
+def claim_next(worker: Optional[str] = None) -> Optional[GenerationJob]:
+    """Lock the oldest queued job and mark it running; None when the queue is empty."""
+    with transaction.atomic():
+        job = (
+            GenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(status=GenerationJob.STATUS_QUEUED)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = GenerationJob.STATUS_RUNNING
+        job.attempts += 1
+        job.locked_by = worker or worker_id()
+        job.locked_at = timezone.now()
+        job.save(update_fields=["status", "attempts", "locked_by", "locked_at"])
+    return job
+
+
+def requeue_stale(older_than_s: Optional[float] = None) -> int:
+    """Put running jobs whose worker went away back in the queue (or fail them after MAX_ATTEMPTS)."""
+    cfg = job_config()
+    older_than_s = cfg["STALE_AFTER_S"] if older_than_s is None else older_than_s
+    stale = GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=older_than_s),
+    )
+    stale.filter(attempts__gte=cfg["MAX_ATTEMPTS"]).update(
+        status=GenerationJob.STATUS_FAILED, error="Worker stopped during generation.",
+        locked_by="", locked_at=None, finished_at=timezone.now(),
+    )
+    n = stale.update(status=GenerationJob.STATUS_QUEUED, locked_by="", locked_at=None)
+    if n:
+        logger.warning("Requeued %d stale generation job(s)", n)
+    return n
+
+
+def _finish(job: GenerationJob, **fields) -> None:
+    for k, v in fields.items():
+        setattr(job, k, v)
+    job.finished_at = timezone.now()
+    job.locked_by = ""
+    job.save(update_fields=[*fields, "finished_at", "locked_by"])
+
+
+def run_job(job: GenerationJob) -> GenerationJob:
+    """Generate + persist one claimed job. Failures are retried up to MAX_ATTEMPTS."""
+    form = GenerateForm(job.payload)
+    if not form.is_valid():
+        _finish(job, status=GenerationJob.STATUS_FAILED, error="Invalid job payload.")
+        return job
+
+    meta: dict = {}
+    with accounting.collect(user_id=job.user_id):
+        try:
+            result = generate_asset(**generate_kwargs(form), meta=meta)
+        except Exception as e:
+            logger.exception("Generation job %s failed (attempt %d)", job.pk, job.attempts)
+            if job.attempts < job_config()["MAX_ATTEMPTS"]:
+                job.status, job.error, job.locked_by, job.locked_at = GenerationJob.STATUS_QUEUED, str(e), "", None
+                job.save(update_fields=["status", "error", "locked_by", "locked_at"])
+            else:
+                _finish(job, status=GenerationJob.STATUS_FAILED, error=str(e) or e.__class__.__name__)
+            return job
+
+        route = {**meta.get("route", {}), "served_from": meta.get("served_from")}
+        done = {"status": GenerationJob.STATUS_DONE, "result": result, "route": route, "error": ""}
+        try:
+            # Marking the job done commits with the asset and the charge: a worker that dies
+            # in between leaves neither, so the requeued job can't charge twice
+            with transaction.atomic():
+                asset = save_result(
+                    user=job.user, prompt_used=form.cleaned_data["prompt"], content=result,
+                    language=form.cleaned_data["language"], brief_key=brief_key(form),
+                )[0]
+                record_success(job.user, job.used_before, credits=job.credits)
+                _finish(job, asset=asset, **done)
+        except Exception:
+            logger.exception("Persist/usage failed for job %s (non-fatal)", job.pk)
+            _finish(job, asset=None, **done)
+    return job
+
+
+def run_pending(max_jobs: Optional[int] = None, worker: Optional[str] = None) -> int:
+    """Drain the queue (up to max_jobs); returns how many jobs ran."""
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        accounting.maybe_flush()
+        ran += 1
+    return ran
@@ -1,12 +1,15 @@
 # backend/generator/services/persist.py
 from __future__ import annotations
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Tuple
+import itertools
 import json
 import logging
 
 from django.db import transaction
 from django.core.exceptions import FieldDoesNotExist
 from django.db.models.fields import Field
+from generator import accounting
+from generator.ai.schemas import BUNDLE_PARTS, LANGUAGES, is_bilingual, is_bundle
 from generator.models import GeneratedAsset
 from generator.presenters import result_to_plain_text
 
@@ -58,12 +61,13 @@ def _guess_title(asset_type: str, content: Dict[str, Any]) -> str:
     return {"email": "Email", "checklist": "Checklist", "sms": "SMS"}.get(asset_type, "Generated Item")
 
 
-def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: str = "auto"):
+def _asset_kwargs(*, user, prompt_used: str, content: Dict[str, Any], asset_type: str = "auto", language: str = "") -> Dict[str, Any]:
     """
-    Persist the generated asset regardless of your model's exact field names.
+    Build the model kwargs regardless of your model's exact field names.
 
     Strategy:
     - Prefer a JSONField named one of: content, data, payload, json, result, output
+    - Else, dump JSON into a TextField with one of those names (e.g. result)
     - Else, write to a TextField named one of: plain_text, text, body, body_markdown
     - Else, fall back to ANY JSONField, then ANY TextField
     - Optionally set a title/subject if such a field exists
@@ -77,6 +81,7 @@ def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: s
 
     # Find suitable fields by type/name
     json_field_name = _find_field_by_names(Model, json_candidates, ("JSONField",))
+    json_text_field_name = _find_field_by_names(Model, json_candidates, ("TextField",))
     text_field_name = _find_field_by_names(Model, text_candidates, ("TextField",))
     # Titles commonly live in CharField/TextField
     title_field_name = _find_field_by_names(Model, ["title", "subject", "name", "headline"], ("CharField", "TextField"))
@@ -94,6 +99,8 @@ def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: s
         kwargs["asset_type"] = asset_type
     if _get_field(Model, "prompt_used"):
         kwargs["prompt_used"] = prompt_used
+    if language and _get_field(Model, "language"):
+        kwargs["language"] = language
 
     # Title/subject if present
     if title_field_name:
@@ -102,6 +109,8 @@ def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: s
     # Prefer JSON storage; otherwise write pretty text
     if json_field_name:
         kwargs[json_field_name] = content
+    elif json_text_field_name:
+        kwargs[json_text_field_name] = json.dumps(content, ensure_ascii=False)
     elif text_field_name:
         kwargs[text_field_name] = result_to_plain_text(content)
     else:
@@ -109,12 +118,111 @@ def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: s
         fallback_text_name = _find_any_field_by_type(Model, ("CharField", "TextField"))
         if fallback_text_name:
             kwargs[fallback_text_name] = json.dumps(content, ensure_ascii=False)
+    return kwargs
+
+
+def save_asset(*, user, prompt_used: str, content: Dict[str, Any], asset_type: str = "auto", language: str = ""):
+    """
+    Persist the generated asset regardless of your model's exact field names
+    (see _asset_kwargs), and link the model calls that produced it.
+    """
+    kwargs = _asset_kwargs(user=user, prompt_used=prompt_used, content=content, asset_type=asset_type, language=language)
 
     with transaction.atomic():
-        obj = Model.objects.create(**kwargs)
+        obj = GeneratedAsset.objects.create(**kwargs)
+    accounting.link(obj)
 
     logger.info(
         "GeneratedAsset saved. fields=%s",
         {k: ("<json>" if isinstance(v, (dict, list)) else str(v)[:60]) for k, v in kwargs.items()},
     )
     return obj
+
+
+def save_assets_bulk(*, user, items: List[Tuple[Any, ...]], asset_type: str = "auto"):
+    """
+    Persist many (prompt_used, content) pairs with a single INSERT; an item
+    may carry its own asset type and language as third and fourth elements.
+    """
+    objs = [
+        GeneratedAsset(**_asset_kwargs(user=user, prompt_used=prompt, content=content,
+                                       asset_type=rest[0] if rest else asset_type,
+                                       language=rest[1] if len(rest) > 1 else ""))
+        for prompt, content, *rest in items
+    ]
+    with transaction.atomic():
+        created = GeneratedAsset.objects.bulk_create(objs)
+    logger.info("GeneratedAsset bulk saved. count=%d", len(created))
+    return created
+
+
+def result_items(prompt_used: str, content: Dict[str, Any], language: str = "") -> List[Tuple[str, Dict[str, Any], str, str]]:
+    """
+    save_assets_bulk items for a result: one per part for a bundle, one per
+    language for language="both" (all of one language, then the other),
+    else the result itself.
+    """
+    if is_bilingual(content):
+        return [item for lang in LANGUAGES for item in result_items(prompt_used, content[lang], lang)]
+    if is_bundle(content):
+        return [(prompt_used, content[part], part, language) for part in BUNDLE_PARTS]
+    return [(prompt_used, content, "auto", language)]
+
+
+def link_counterparts(groups: Iterable[List[GeneratedAsset]], brief_keys: Iterable[str] = ()) -> None:
+    """
+    Point each asset of a language="both" result (a group, in result_items
+    order) at the same asset in the other language, with one UPDATE. Pass
+    each group's generation.brief_key so stored_counterpart can find it.
+    """
+    linked = []
+    for assets, key in itertools.zip_longest(groups, brief_keys, fillvalue=""):
+        en, pt = ([a for a in assets if a.language == lang] for lang in LANGUAGES)
+        if len(en) != len(pt):
+            continue
+        for a, b in zip(en, pt):
+            a.counterpart, b.counterpart = b, a
+            a.brief_key = b.brief_key = key
+            linked += [a, b]
+    if linked:
+        GeneratedAsset.objects.bulk_update(linked, ["counterpart", "brief_key"])
+
+
+def stored_counterpart(user, *, brief_key: str, language: str) -> Dict[str, Any] | None:
+    """
+    The `language` half of the user's latest language="both" result for the
+    same brief (see link_counterparts), already generated and paid for; None
+    if there is none. Bundles are stored one asset per part and not served here.
+    """
+    if not brief_key or language not in LANGUAGES:
+        return None
+    asset = (
+        GeneratedAsset.objects.filter(user=user, brief_key=brief_key, language=language, counterpart__isnull=False)
+        .exclude(asset_type__in=BUNDLE_PARTS)
+        .order_by("-created_at")
+        .first()
+    )
+    if asset is None:
+        return None
+    try:
+        content = json.loads(asset.result)
+    except ValueError:
+        return None
+    return content if isinstance(content, dict) else None
+
+
+def save_result(*, user, prompt_used: str, content: Dict[str, Any], language: str = "",
+                brief_key: str = "") -> List[GeneratedAsset]:
+    """
+    Persist a generate_asset result: one GeneratedAsset, or in a single
+    INSERT one per bundle part (email, sms, checklist) and per language for
+    language="both", linked to their counterparts (and tagged with
+    `brief_key`). The model call is linked to the first.
+    """
+    if not (is_bundle(content) or is_bilingual(content)):
+        return [save_asset(user=user, prompt_used=prompt_used, content=content, asset_type="auto", language=language)]
+    with transaction.atomic():
+        assets = save_assets_bulk(user=user, items=result_items(prompt_used, content, language))
+        link_counterparts([assets], [brief_key])
+    accounting.link(assets[0])
+    return assets
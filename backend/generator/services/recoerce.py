@@ -0,0 +1,178 @@
+# backend/generator/services/recoerce.py
+"""
+Re-run the current coercers and presenters over stored GeneratedAssets.
+
+When coercers.py or presenters.result_to_plain_text change, rows already in
+GeneratedAsset.result keep the old shape. recoerce_rows() streams them in
+primary-key order, fixes each chunk in a process pool (coercion is pure
+CPU work) and writes changed rows back with one bulk_update per chunk.
+Progress goes to a checkpoint file after every chunk, so an interrupted run
+resumes where it stopped.
+"""
+from __future__ import annotations
+
+import difflib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import orjson
+
+from generator.ai.coercers import coerce_to_schema
+from generator.ai.schemas import SCHEMAS
+from generator.models import GeneratedAsset
+from generator.presenters import result_to_plain_text
+
+logger = logging.getLogger(__name__)
+
+# (pk, asset_type, prompt_used, result, language)
+Row = Tuple[int, str, str, str, str]
+
+
+class Outcome(NamedTuple):
+    pk: int
+    status: str                    # "unchanged" | "changed" | "unparseable"
+    asset_type: str
+    result: Optional[str]          # new JSON text when changed
+    rerendered: bool               # the plain-text rendering changed too
+    diff: Optional[str] = None     # rendering diff, when asked for
+
+
+def _infer_type(data: Dict[str, Any]) -> str:
+    if "items" in data or "steps" in data:
+        return "checklist"
+    if "message" in data and "body_markdown" not in data:
+        return "sms"
+    return "email"
+
+
+def recoerce_one(row: Row, *, language: str = "en", with_diff: bool = False) -> Outcome:
+    """
+    Coerce + re-render one stored asset. Pure: safe to run in a worker process.
+    The row's own language wins; `language` only covers rows stored without one.
+    """
+    pk, asset_type, prompt_used, raw, row_language = row
+    try:
+        old = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError:
+        old = None
+    if not isinstance(old, dict):
+        return Outcome(pk, "unparseable", asset_type, None, False)
+
+    resolved = asset_type if asset_type in SCHEMAS else _infer_type(old)
+    new = coerce_to_schema(resolved, old, prompt_used or "", language=row_language or language)
+    if new == old and resolved == asset_type:
+        return Outcome(pk, "unchanged", asset_type, None, False)
+
+    old_text, new_text = result_to_plain_text(old), result_to_plain_text(new)
+    diff = None
+    if with_diff and old_text != new_text:
+        diff = "\n".join(difflib.unified_diff(
+            old_text.splitlines(), new_text.splitlines(), f"asset {pk} (stored)", f"asset {pk} (recoerced)", lineterm="",
+        ))
+    return Outcome(pk, "changed", resolved, json.dumps(new, ensure_ascii=False), old_text != new_text, diff)
+
+
+def _recoerce_chunk(rows: List[Row], language: str, with_diff: bool) -> List[Outcome]:
+    return [recoerce_one(row, language=language, with_diff=with_diff) for row in rows]
+
+
+def read_checkpoint(path: Optional[str]) -> int:
+    """Last primary key fully processed, 0 when there's no checkpoint."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as fh:
+        return int(json.load(fh).get("last_pk") or 0)
+
+
+def write_checkpoint(path: Optional[str], last_pk: int, totals: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"last_pk": last_pk, **totals}, fh)
+    os.replace(tmp, path)  # atomic: a crash never leaves a half-written checkpoint
+
+
+def _chunks(start_pk: int, chunk_size: int, limit: Optional[int]) -> Iterator[List[Row]]:
+    qs = (
+        GeneratedAsset.objects.filter(pk__gt=start_pk).order_by("pk")
+        .values_list("pk", "asset_type", "prompt_used", "result", "language")
+    )
+    if limit:
+        qs = qs[:limit]
+    chunk: List[Row] = []
+    for row in qs.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def recoerce_rows(
+    *,
+    chunk_size: int = 2000,
+    workers: int = 0,
+    dry_run: bool = False,
+    checkpoint: Optional[str] = None,
+    language: str = "en",
+    limit: Optional[int] = None,
+    max_diffs: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one progress record per chunk, then a summary with "done": True.
+    workers=0 runs in-process. dry_run counts and diffs without writing (or
+    checkpointing). Each row is coerced in its stored language; `language`
+    is only the fallback for rows stored without one.
+    """
+    start_pk = read_checkpoint(checkpoint)
+    totals = {"scanned": 0, "changed": 0, "rerendered": 0, "unparseable": 0}
+    diffs_left = max_diffs
+    t0 = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        for rows in _chunks(start_pk, chunk_size, limit):
+            # Split a chunk across the pool; each task is big enough to amortize pickling
+            step = max(1, len(rows) // max(1, workers * 4)) if pool else len(rows)
+            parts = [rows[i:i + step] for i in range(0, len(rows), step)]
+            with_diff = diffs_left > 0
+            if pool:
+                futures = [pool.submit(_recoerce_chunk, part, language, with_diff) for part in parts]
+                outcomes = [o for fut in futures for o in fut.result()]
+            else:
+                outcomes = _recoerce_chunk(rows, language, with_diff)
+
+            updates = []
+            for o in outcomes:
+                totals["scanned"] += 1
+                if o.status == "unparseable":
+                    totals["unparseable"] += 1
+                elif o.status == "changed":
+                    totals["changed"] += 1
+                    totals["rerendered"] += int(o.rerendered)
+                    updates.append(GeneratedAsset(pk=o.pk, asset_type=o.asset_type, result=o.result))
+                    if o.diff and diffs_left > 0:
+                        diffs_left -= 1
+                        yield {"diff": o.diff}
+            if updates and not dry_run:
+                GeneratedAsset.objects.bulk_update(updates, ["asset_type", "result"], batch_size=500)
+            last_pk = rows[-1][0]
+            if not dry_run:
+                write_checkpoint(checkpoint, last_pk, totals)
+            elapsed = time.perf_counter() - t0
+            yield {**totals, "last_pk": last_pk, "elapsed_s": round(elapsed, 2), "rows_per_s": round(totals["scanned"] / elapsed, 1) if elapsed else None}
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - t0
+    logger.info("Recoerced %s rows from pk>%d in %.1fs (dry_run=%s)", totals["scanned"], start_pk, elapsed, dry_run)
+    yield {
+        "done": True, "dry_run": dry_run, "resumed_from_pk": start_pk, **totals,
+        "elapsed_s": round(elapsed, 2), "rows_per_s": round(totals["scanned"] / elapsed, 1) if elapsed else None,
+    }
@@ -1,2 +1,1062 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from django.core.cache import caches
+from django.utils.html import escape
+
+from generator import accounting, timing
+from generator.ai import api, breaker, budgets, cache, capabilities, cassettes, clients, hedge, neardup, router, singleflight, throttle, usage
+from generator.ai.errors import ModelAPIError
+from generator.ai.schemas import SCHEMAS
+from generator.ai.validation import VALIDATORS, _FAST_CHECKS, repair, validate
+from generator.ai.prompts import SYSTEM_PROMPT, build_user_prompt, static_prefix
+from generator.ai.public import generate_micro_sop, generate_micro_sop_async
+from generator.ai.streaming import stream_micro_sop
+from billing.models import UsageRecord
+from billing.utils import ensure_subscription
+from generator.models import GeneratedAsset, GenerationJob, ModelCall
+from generator.services import jobs
+from generator.services.batch import run_batch
+from generator.benchmarks import loadtest
+from generator.benchmarks.fake_server import Behaviour, make_server
+from generator.benchmarks.fake_upstream import FakeAsyncOpenAI, FakeOpenAI
+
+
 def test_placeholder():
     assert True
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    fake = FakeOpenAI(latency=0)
+    monkeypatch.setitem(api.__dict__, "client", fake)  # never build the real client (needs OPENAI_API_KEY)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")  # generate_asset checks it is set
+    capabilities.reset()
+    breaker.reset()
+    router.reset()
+    yield fake
+    capabilities.reset()
+    breaker.reset()
+    router.reset()
+    accounting.reset()
+
+
+@pytest.fixture
+def fake_async_client(monkeypatch):
+    fake = FakeAsyncOpenAI(latency=0)
+    monkeypatch.setitem(api.__dict__, "async_client", fake)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    capabilities.reset()
+    breaker.reset()
+    router.reset()
+    yield fake
+    capabilities.reset()
+    breaker.reset()
+    router.reset()
+    accounting.reset()
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.GENERATOR_RESPONSE_CACHE = {"BACKEND": "locmem", "TTL": 60, "MAX_ENTRIES": 10}
+    cache.reset_response_cache()
+    neardup.reset_index()
+    yield cache.get_response_cache()
+    cache.reset_response_cache()
+    neardup.reset_index()
+
+
+def test_response_cache_hit_skips_upstream(fake_client, locmem_cache):
+    first = generate_micro_sop("sms", "Send an SMS to confirm the meeting")
+    second = generate_micro_sop("sms", "Send an SMS to confirm the meeting")
+
+    assert fake_client.calls == 1
+    assert first == second
+    assert cache.cache_stats()["hits"] == 1
+
+
+def test_response_cache_bypass_and_lru_eviction(fake_client, locmem_cache):
+    generate_micro_sop("sms", "Send an SMS to confirm the meeting")
+    generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+    assert fake_client.calls == 2
+
+    for i in range(12):
+        locmem_cache.set(f"k{i}", json.dumps({"message": str(i)}))
+    assert locmem_cache.stats()["size"] == 10
+    assert locmem_cache.get("k0") is None
+
+
+def test_near_duplicate_brief_reuses_stored_result(fake_client, locmem_cache):
+    constraints = {"niche": "events", "tone": "friendly"}
+    first = generate_micro_sop("sms", "send sms to confirm meeting", constraints=constraints)
+    second = generate_micro_sop("sms", "SMS: confirm the   meeting", constraints=constraints)
+    generate_micro_sop("sms", "SMS: remind the client about the unpaid invoice", constraints=constraints)
+
+    assert first == second
+    assert fake_client.calls == 2  # first + novel brief; the near-duplicate never went upstream
+    assert neardup.near_dup_stats()["hits"] == 1
+
+
+def test_near_duplicate_scope_includes_language():
+    index = neardup.NearDupIndex(threshold=0.8, max_entries_per_scope=10, num_perm=64, bands=16)
+    en = neardup.make_scope(niche="general", language="en", tone="professional", asset_type="sms")
+    pt = neardup.make_scope(niche="general", language="pt", tone="professional", asset_type="sms")
+    index.add(en, "Confirmar a reunião de amanhã", {"message": "x"})
+
+    assert index.lookup(en, "confirmar reuniao amanha!") == {"message": "x"}
+    assert index.lookup(pt, "confirmar reuniao amanha!") is None
+
+
+def test_near_duplicate_needs_same_amounts_dates_names_and_word_order():
+    index = neardup.NearDupIndex(threshold=0.8, max_entries_per_scope=10, num_perm=64, bands=16)
+    scope = neardup.make_scope(niche="freelance", language="en", tone="professional", asset_type="email")
+    index.add(scope, "Send Ana the €500 invoice due 5 May", {"subject": "x"})
+    index.add(scope, "Ana pays Bruno the venue deposit", {"subject": "y"})
+
+    assert index.lookup(scope, "send ana the €500 invoice, due 5 May!") == {"subject": "x"}
+    assert index.lookup(scope, "Send Ana the €200 invoice due 5 May") is None
+    assert index.lookup(scope, "Send Ana the €500 invoice due 3 May") is None
+    assert index.lookup(scope, "Send Ana the €500 invoice due 5 June") is None
+    assert index.lookup(scope, "Send Rita the €500 invoice due 5 May") is None
+    assert index.lookup(scope, "Bruno pays Ana the venue deposit") is None
+
+
+def test_capability_probe_is_cached(fake_client):
+    def old_sdk_responses(**kwargs):
+        fake_client.rejected = getattr(fake_client, "rejected", 0) + 1
+        raise TypeError("unexpected keyword argument")
+
+    fake_client.responses.create = old_sdk_responses
+    for _ in range(3):
+        generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+
+    assert fake_client.rejected == 2  # both responses shapes, once
+    assert capabilities.cached_shape("gpt-4o-mini") == "chat"
+    assert capabilities.capability_stats()["round_trips_saved"] == 0  # rejected by the SDK: never a round trip
+
+
+def test_round_trips_saved_counts_only_shapes_sent_upstream(fake_client):
+    def responses(**kwargs):
+        if "messages" in kwargs:
+            raise TypeError("unexpected keyword argument 'messages'")  # local: the SDK refuses it
+        raise ValueError("400 Unsupported parameter: response_format")  # sent, rejected upstream
+
+    fake_client.responses.create = responses
+    for _ in range(3):
+        generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+
+    assert capabilities.cached_shape("gpt-4o-mini") == "chat"
+    assert capabilities.capability_stats()["round_trips_saved"] == 2  # responses_input, skipped on 2 direct calls
+
+
+def test_stream_emits_parts_before_final(fake_client, locmem_cache):
+    fake_client.latency = 0.05
+    events = list(stream_micro_sop("checklist", "Checklist for the event day", use_cache=False))
+
+    kinds = [e.kind for e in events]
+    assert kinds == ["field", "item", "item", "item", "final"]
+    assert events[0].data == {"name": "title", "text": "Event day checklist"}
+    assert events[1].data["text"] == "Confirm venue access times"
+    assert events[-1].data["items"][2]["priority"] == "low"
+
+
+@pytest.mark.django_db
+def test_stream_view_sends_sse_parts_and_persists(client, django_user_model, fake_client, locmem_cache, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    user = django_user_model.objects.create_user(email="stream@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/stream/", {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "general", "tone": "friendly",
+        "language": "en", "payment_method": "none",
+    })
+    assert b"sse-connect" in resp.content
+    stream_url = resp.content.decode().split('sse-connect="')[1].split('"')[0]
+
+    body = b"".join(client.get(stream_url).streaming_content).decode()
+    assert body.index("event: part") < body.index("event: done")
+    assert "Reply YES" in body
+    assert GeneratedAsset.objects.filter(user=user).count() == 1
+    assert client.get(stream_url).status_code == 204  # one-time token
+
+
+@pytest.mark.django_db
+def test_stream_and_batch_persist_and_charge_after_client_disconnect(client, django_user_model, fake_client, locmem_cache, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="gone@example.com", password="pass")
+    client.force_login(user)
+    resp = client.post("/en/api/generator/generate/stream/", {
+        "prompt": "Checklist for the event day", "niche": "events", "tone": "friendly",
+        "language": "en", "payment_method": "none",
+    })
+    stream_url = resp.content.decode().split('sse-connect="')[1].split('"')[0]
+
+    stream = client.get(stream_url)
+    assert next(iter(stream.streaming_content)).startswith(b"event: part")
+    stream.close()  # client disconnects after the first part
+
+    assert GeneratedAsset.objects.filter(user=user).count() == 1
+    assert UsageRecord.objects.get(user=user).credits_used == 1
+
+    records = run_batch(user, [{"prompt": f"Send an SMS to confirm meeting {i}"} for i in range(3)], concurrency=1)
+    assert next(records)["ok"]
+    records.close()
+
+    # every row that reached the model is saved and charged, even those never sent to the client
+    saved = GeneratedAsset.objects.filter(user=user).count()
+    assert saved >= 2
+    charged = sum(UsageRecord.objects.filter(user=user).values_list("credits_used", flat=True))
+    assert charged == saved == fake_client.calls
+
+
+def test_stream_aborts_on_schema_violation(fake_client, locmem_cache):
+    bad = json.dumps({"title": "Event day", "items": "Confirm venue, send run-of-show, " * 50})
+    pulled = []
+
+    def bad_stream(stream=False, **kwargs):
+        for i in range(0, len(bad), 8):
+            pulled.append(i)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=bad[i:i + 8]))])
+
+    fake_client.chat.completions.create = bad_stream
+    events = list(stream_micro_sop("checklist", "Checklist for the event day", use_cache=False))
+
+    assert len(pulled) < 10  # stopped at the first character of "items", not the end of the output
+    assert events[-1].kind == "final"
+    assert events[-1].data["title"] == "Event day"
+    assert len(events[-1].data["items"]) >= 3  # coerced from the partial object
+
+
+@pytest.mark.django_db
+def test_batch_endpoint_streams_ndjson_and_bulk_persists(client, django_user_model, fake_client, locmem_cache, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    user = django_user_model.objects.create_user(email="batch@example.com", password="pass")
+    client.force_login(user)
+    briefs = [
+        {"prompt": "Send an SMS to confirm the meeting", "niche": "events", "tone": "friendly"},
+        {"prompt": "Checklist for the event day", "niche": "events", "language": "pt"},
+        {"prompt": "Email the client about the invoice", "niche": "freelance"},
+        {"prompt": "x", "niche": "unknown"},
+    ]
+
+    resp = client.post("/en/api/generator/generate/batch/", {"briefs": briefs, "concurrency": 3},
+                       content_type="application/json")
+    lines = [json.loads(line) for line in b"".join(resp.streaming_content).decode().splitlines()]
+
+    assert resp["Content-Type"] == "application/x-ndjson"
+    assert sorted(r["row"] for r in lines if r.get("ok")) == [0, 1, 2]
+    assert lines[0] == {"row": 3, "ok": False, "error": "invalid", "fields": lines[0]["fields"]}
+    assert lines[-1]["done"] and lines[-1]["succeeded"] == 3 and lines[-1]["failed"] == 1
+    assert GeneratedAsset.objects.filter(user=user).count() == 3
+    assert UsageRecord.objects.get(user=user).credits_used == 3
+
+
+@pytest.mark.django_db
+def test_batch_credit_gate_covers_whole_batch(client, django_user_model, fake_client, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    user = django_user_model.objects.create_user(email="trial@example.com", password="pass")
+    client.force_login(user)
+    briefs = [{"prompt": f"Send an SMS to confirm meeting {i}"} for i in range(6)]  # trial allows 5
+
+    resp = client.post("/en/api/generator/generate/batch/", {"briefs": briefs}, content_type="application/json")
+
+    assert resp.status_code == 400
+    assert fake_client.calls == 0
+    assert GeneratedAsset.objects.filter(user=user).count() == 0
+
+
+@pytest.mark.django_db
+def test_submit_enqueues_job_and_poll_returns_result(client, django_user_model, fake_client, locmem_cache, monkeypatch, settings):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": True}
+    user = django_user_model.objects.create_user(email="queue@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/submit/", {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "general", "tone": "friendly",
+        "language": "en", "payment_method": "none",
+    })
+    assert resp.status_code == 202
+    assert fake_client.calls == 0  # nothing generated on the request thread
+    poll_url = resp.content.decode().split('hx-get="')[1].split('"')[0]
+    assert b"hx-get" in client.get(poll_url).content  # still queued: keep polling
+
+    assert jobs.run_pending() == 1
+    resp = client.get(poll_url)
+    assert b"Reply YES" in resp.content
+    assert GeneratedAsset.objects.filter(user=user).count() == 1
+    assert UsageRecord.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+def test_queued_jobs_reserve_credits_at_enqueue(client, django_user_model, fake_client, locmem_cache, settings):
+    assert not jobs.DEFAULTS["ENABLED"]  # opt-in: needs run_generation_worker
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": True}
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="reserve@example.com", password="pass")
+    ensure_subscription(user)
+    user.subscription.trial_remaining = 2
+    user.subscription.save()
+    client.force_login(user)
+    brief = {"prompt": "Send an SMS to confirm the meeting", "niche": "general", "tone": "friendly",
+             "language": "en", "payment_method": "none"}
+    for i in range(2):
+        assert client.post("/en/api/generator/generate/submit/", {**brief, "prompt": f"{brief['prompt']} {i}"}).status_code == 202
+
+    resp = client.post("/en/api/generator/generate/submit/", brief)
+    assert b"Trial limit reached" in resp.content  # nothing charged yet, but both credits are reserved
+    assert GenerationJob.objects.filter(user=user).count() == 2
+
+    assert jobs.run_pending() == 2
+    assert sum(UsageRecord.objects.filter(user=user).values_list("credits_used", flat=True)) == 2
+
+
+@pytest.mark.django_db
+def test_submit_sends_server_timing_and_feeds_metrics(client, django_user_model, fake_client, locmem_cache, settings):
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": False}
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="timing@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/submit/", {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "events", "tone": "friendly",
+        "language": "en", "payment_method": "none", "skip_cache": "on",
+    })
+    assert resp.status_code == 201
+    stages = [part.split(";")[0] for part in resp["Server-Timing"].split(", ")]
+    assert stages == ["form", "gate", "prompt", "model", "parse", "persist", "credits", "render", "total"]
+    assert "Server-Timing" not in client.get("/en/usage-tracker/")
+
+    assert client.get("/metrics").status_code == 403  # closed by default, even to logged-in users
+    settings.GENERATOR_METRICS = {**settings.GENERATOR_METRICS, "TOKEN": "scrape"}
+    assert client.get("/metrics").status_code == 401
+    settings.GENERATOR_METRICS = {**settings.GENERATOR_METRICS, "ALLOW_IPS": ["127.0.0.1"]}
+    assert client.get("/metrics").status_code != 401  # the test client's address
+    settings.GENERATOR_METRICS = {**settings.GENERATOR_METRICS, "ALLOW_IPS": []}
+    metrics = client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape")
+    if not timing.prometheus_available():
+        assert metrics.status_code == 501
+        return
+    body = metrics.content.decode()
+    assert 'generator_stage_seconds_count{asset_type="sms",fallback="false",model="gpt-4o-mini",niche="events",stage="model"}' in body
+    assert 'generator_request_seconds_count{asset_type="sms",fallback="false",model="gpt-4o-mini",niche="events"}' in body
+
+
+@pytest.mark.django_db
+def test_submit_records_model_call_linked_to_asset_and_in_cost_report(client, django_user_model, fake_client, locmem_cache, settings):
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": False}
+    caches["default"].clear()  # per-user submit rate limit
+    accounting.reset()
+    user = django_user_model.objects.create_user(email="calls@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/submit/", {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "events", "tone": "friendly",
+        "language": "en", "payment_method": "none", "skip_cache": "on",
+    })
+    assert resp.status_code == 201
+    assert ModelCall.objects.count() == 0  # buffered, not written on the request path
+    assert accounting.flush() == 1
+
+    call = ModelCall.objects.get()
+    assert call.user == user and call.asset == GeneratedAsset.objects.get(user=user)
+    assert (call.plan, call.niche, call.asset_type, call.model) == (user.subscription.plan, "events", "sms", "gpt-4o-mini")
+    assert call.call_shape and call.prompt_tokens > 0 and call.completion_tokens > 0
+    assert call.ok and not call.coerced and call.cost_usd > 0
+
+    admin = django_user_model.objects.create_superuser(email="admin@example.com", password="pass")
+    client.force_login(admin)
+    report = client.get("/en/admin/generator/modelcall/report/")
+    assert report.status_code == 200
+    assert [(r["niche"], r["asset_type"], r["calls"]) for r in report.context["rows"]] == [("events", "sms", 1)]
+
+
+@pytest.mark.django_db
+def test_bundle_submit_makes_one_call_and_stores_three_linked_assets(client, django_user_model, fake_client, locmem_cache, settings):
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": False}
+    accounting.reset()
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="bundle@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/submit/", {
+        "prompt": "Client is late on the invoice, remind them", "niche": "freelance", "tone": "friendly",
+        "language": "en", "payment_method": "none", "asset_type": "bundle", "skip_cache": "on",
+    })
+    assert resp.status_code == 201
+    assert fake_client.calls == 1
+    assets = GeneratedAsset.objects.filter(user=user)
+    assert sorted(assets.values_list("asset_type", flat=True)) == ["checklist", "email", "sms"]
+    assert list(UsageRecord.objects.filter(user=user).values_list("credits_used", flat=True)) == [2]
+
+    assert accounting.flush() == 1
+    call = ModelCall.objects.get()
+    assert call.asset_type == "bundle" and call.asset.user == user
+
+    fixed, rebuilt = repair("bundle", {"email": {"subject": "Hi", "body_markdown": "Body"}, "sms": "Ping", "checklist": {}},
+                            [], "Client is late")
+    assert fixed["email"] == {"subject": "Hi", "body_markdown": "Body"} and fixed["sms"]["message"] == "Ping"
+    assert not validate("bundle", fixed)
+
+
+@pytest.mark.django_db
+def test_bilingual_submit_stores_linked_pair_and_serves_each_half_without_a_model_call(client, django_user_model, fake_client, locmem_cache, settings):
+    settings.GENERATOR_JOBS = {**settings.GENERATOR_JOBS, "ENABLED": False}
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="both@example.com", password="pass")
+    client.force_login(user)
+    brief = {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "events", "tone": "friendly",
+        "payment_method": "none", "asset_type": "sms",
+    }
+
+    assert client.post("/en/api/generator/generate/submit/", {**brief, "language": "both"}).status_code == 201
+    assert fake_client.calls == 1
+    en, pt = GeneratedAsset.objects.filter(user=user).order_by("language")
+    assert (en.language, pt.language) == ("en", "pt")
+    assert en.counterpart == pt and pt.counterpart == en
+    assert list(UsageRecord.objects.filter(user=user).values_list("credits_used", flat=True)) == [2]
+
+    cache.reset_response_cache()  # served from the stored pair, not the response cache
+    neardup.reset_index()
+    resp = client.post("/en/api/generator/generate/submit/", {**brief, "language": "pt"})
+    assert resp.status_code == 201
+    assert fake_client.calls == 1  # the stored PT counterpart, no model call
+    assert escape(json.loads(pt.result)["message"]) in resp.content.decode()
+    assert cache.cache_stats()["hits"] == 0
+    assert GeneratedAsset.objects.filter(user=user).count() == 2  # nothing new stored or charged
+    assert list(UsageRecord.objects.filter(user=user).values_list("credits_used", flat=True)) == [2]
+
+    assert client.post("/en/api/generator/generate/submit/", {**brief, "language": "pt", "tone": "formal"}).status_code == 201
+    assert fake_client.calls == 2  # a different brief: generated
+
+
+@pytest.mark.django_db
+def test_stale_running_job_is_requeued(django_user_model):
+    user = django_user_model.objects.create_user(email="stale@example.com", password="pass")
+    job = jobs.enqueue(user, {"prompt": "Send an SMS"}, used_before=0)
+    assert jobs.claim_next("dead-worker").pk == job.pk
+    assert jobs.claim_next("other-worker") is None
+
+    assert jobs.requeue_stale(older_than_s=-1) == 1
+    job.refresh_from_db()
+    assert job.status == GenerationJob.STATUS_QUEUED and job.attempts == 1
+
+
+@pytest.mark.django_db
+def test_job_is_marked_done_in_the_transaction_that_charges_it(django_user_model, fake_client, monkeypatch):
+    user = django_user_model.objects.create_user(email="once@example.com", password="pass")
+    job = jobs.enqueue(user, {"prompt": "Send an SMS to confirm the meeting", "niche": "general", "tone": "friendly",
+                              "language": "en", "payment_method": "none"}, used_before=0)
+    finish = jobs._finish
+
+    def crash_on_done(job, **fields):
+        if fields.get("asset") is not None:
+            raise RuntimeError("worker died")  # after the asset and the charge were written
+        finish(job, **fields)
+
+    monkeypatch.setattr(jobs, "_finish", crash_on_done)
+    jobs.run_job(jobs.claim_next())
+    job.refresh_from_db()
+    assert job.status == GenerationJob.STATUS_DONE and job.asset is None
+    assert not GeneratedAsset.objects.filter(user=user).exists()  # rolled back with the charge
+    assert not UsageRecord.objects.filter(user=user).exists()
+
+
+def _rate_limit_error(retry_after="1"):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+@pytest.fixture
+def throttled(settings):
+    settings.GENERATOR_RATE_LIMIT = {"BACKEND": "local", "RPM": 60, "TPM": 100_000, "MAX_WAIT_S": 5}
+    throttle.reset()
+    yield
+    throttle.reset()
+
+
+def test_429_is_retried_after_retry_after(fake_client, throttled, locmem_cache):
+    real_create, failures = fake_client.chat.completions.create, []
+
+    def flaky(**kwargs):
+        if not failures:
+            failures.append(1)
+            raise _rate_limit_error("0.2")
+        return real_create(**kwargs)
+
+    capabilities.remember("gpt-4o-mini", "chat")
+    fake_client.chat.completions.create = flaky
+    t0 = time.monotonic()
+    with accounting.collect() as calls:
+        result = generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+        rows, calls.rows = calls.rows, []
+
+    assert result["cta"] == "Reply YES"  # the real answer, not the coerced fallback
+    assert time.monotonic() - t0 >= 0.2
+    stats = throttle.throttle_stats()
+    assert stats["retries"] == 1 and stats["upstream_429"] == 1
+    # one row per upstream attempt: the 429 that was retried, then the call that answered
+    assert [(row["attempt"], row["ok"], row["error"]) for row in rows] == [
+        (accounting.RETRIED, False, "ModelRateLimited"), (accounting.SERVED, True, ""),
+    ]
+    assert rows[1]["completion_tokens"] > 0
+
+
+def test_connection_errors_and_5xx_are_retried_but_4xx_are_not():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+    def status_error(status):
+        return openai.APIStatusError("upstream", response=httpx.Response(status, request=request), body=None)
+
+    assert throttle._retryable(api._typed_error(openai.APIConnectionError(request=request)))
+    assert throttle._retryable(api._typed_error(status_error(502)))
+    assert not throttle._retryable(api._typed_error(status_error(400)))
+
+
+def test_token_bucket_waits_instead_of_sending():
+    buckets = throttle.LocalBuckets()
+    assert buckets.try_acquire("m", 100, rpm=2, tpm=10_000) == 0
+    assert buckets.try_acquire("m", 100, rpm=2, tpm=10_000) == 0
+    assert buckets.try_acquire("m", 100, rpm=2, tpm=10_000) > 0  # third request in the minute must wait
+    assert buckets.try_acquire("n", 20_000, rpm=2, tpm=10_000) > 0  # TPM bucket too
+
+
+def test_circuit_breaker_opens_short_circuits_and_recovers(fake_client, settings, locmem_cache):
+    settings.GENERATOR_CIRCUIT_BREAKER = {"BACKEND": "local", "MIN_CALLS": 3, "FAILURE_RATE": 0.5, "OPEN_S": 60}
+    settings.GENERATOR_RATE_LIMIT = {"ENABLED": False, "RETRY": {"MAX_ATTEMPTS": 1}}
+    throttle.reset()
+    capabilities.remember("gpt-4o-mini", "chat")
+    real_create = fake_client.chat.completions.create
+
+    def down(**kwargs):
+        fake_client.calls += 1
+        raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+    fake_client.chat.completions.create = down
+    for _ in range(5):
+        result = generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+    assert fake_client.calls == 3  # the last two never went upstream
+    assert result["message"]  # coerced fallback
+    assert breaker.state("gpt-4o-mini") == breaker.OPEN
+    assert breaker.breaker_stats()["short_circuited"] == 2
+
+    settings.GENERATOR_CIRCUIT_BREAKER = {"BACKEND": "local", "MIN_CALLS": 3, "OPEN_S": 0}
+    fake_client.chat.completions.create = real_create
+    result = generate_micro_sop("sms", "Send an SMS to confirm the meeting", use_cache=False)
+    assert result["cta"] == "Reply YES"  # half-open trial call went through and closed the circuit
+    assert breaker.state("gpt-4o-mini") == breaker.CLOSED
+    assert breaker.breaker_stats()["transitions"] == {
+        "gpt-4o-mini:closed->open": 1, "gpt-4o-mini:open->half_open": 1, "gpt-4o-mini:half_open->closed": 1,
+    }
+    throttle.reset()
+
+
+def test_chat_shape_sends_the_output_token_budget(fake_client):
+    capabilities.remember("gpt-4o-mini", "chat")
+    real_create, sent = fake_client.chat.completions.create, []
+
+    def spy(**kwargs):
+        sent.append(kwargs)
+        return real_create(**kwargs)
+
+    fake_client.chat.completions.create = spy
+    args = dict(user_prompt="Send an SMS to confirm the meeting", schema_name="sms", schema_def=SCHEMAS["sms"],
+                system_prompt=SYSTEM_PROMPT, model="gpt-4o-mini", temperature=0.2, max_output_tokens=123)
+    api.call_model_with_schema(**args)
+    "".join(api.stream_model_with_schema(**args))
+
+    assert [kwargs["max_tokens"] for kwargs in sent] == [123, 123]
+    assert sent[1]["stream"] is True
+
+
+def test_client_errors_leave_the_circuit_closed(fake_client, settings, locmem_cache):
+    settings.GENERATOR_CIRCUIT_BREAKER = {"BACKEND": "local", "MIN_CALLS": 1, "FAILURE_RATE": 0.5, "OPEN_S": 60}
+    capabilities.remember("gpt-4o-mini", "chat")
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+    def bad_request(**kwargs):
+        fake_client.calls += 1
+        raise openai.BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+
+    fake_client.chat.completions.create = bad_request
+    for _ in range(3):
+        with pytest.raises(ModelAPIError):
+            api.call_model_with_schema(user_prompt="x", schema_name="sms", schema_def=SCHEMAS["sms"], system_prompt=SYSTEM_PROMPT,
+                                       model="gpt-4o-mini", temperature=0.2, max_output_tokens=200)
+
+    assert fake_client.calls == 3  # not retried either
+    assert breaker.state("gpt-4o-mini") == breaker.CLOSED
+    assert breaker.breaker_stats()["short_circuited"] == 0
+
+
+def test_identical_concurrent_requests_share_one_upstream_call(fake_client, locmem_cache):
+    singleflight.reset()
+    fake_client.latency = 0.3
+    n = 8
+    barrier = threading.Barrier(n)
+
+    def submit(_):
+        barrier.wait()
+        return generate_micro_sop("sms", "Send an SMS to confirm the meeting")
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        results = list(pool.map(submit, range(n)))
+
+    assert fake_client.calls == 1
+    assert all(r == results[0] for r in results)
+    assert results[0] is not results[1]  # each caller gets its own object
+    assert singleflight.single_flight_stats() == {"leaders": 1, "followers": n - 1, "remote_followers": 0, "follower_timeouts": 0}
+
+
+def test_identical_concurrent_async_requests_share_one_upstream_call(locmem_cache, monkeypatch):
+    singleflight.reset()
+    capabilities.reset()
+    fake = FakeAsyncOpenAI(latency=0.2)
+    monkeypatch.setitem(api.__dict__, "async_client", fake)
+
+    async def burst():
+        return await asyncio.gather(*(generate_micro_sop_async("sms", "Send an SMS to confirm the meeting") for _ in range(5)))
+
+    results = asyncio.run(burst())
+    assert fake.calls == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_single_flight_survives_a_cancelled_leader_and_a_stuck_one():
+    group = singleflight.SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.ensure_future(group.do_async("k", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.do_async("k", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # the leader's client disconnected
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(scenario()) == ("answer", True)
+    assert not group._tasks
+
+    group = singleflight.SingleFlight(follower_wait_s=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=group.do, args=("k", lambda: release.wait(2) and "late"))
+    leader.start()
+    time.sleep(0.02)
+    t0 = time.monotonic()
+    assert group.do("k", lambda: "direct") == "direct"  # gave up on the stuck leader
+    assert time.monotonic() - t0 < 1
+    release.set()
+    leader.join()
+
+
+@pytest.mark.django_db
+def test_async_view_and_engine_serve_repeat_brief_from_cache(client, django_user_model, fake_async_client, locmem_cache):
+    fake = fake_async_client
+    caches["default"].clear()  # per-user submit rate limit
+    user = django_user_model.objects.create_user(email="async@example.com", password="pass")
+    client.force_login(user)
+
+    resp = client.post("/en/api/generator/generate/submit/async/", {
+        "prompt": "Send an SMS to confirm the meeting", "niche": "general", "tone": "friendly",
+        "language": "en", "payment_method": "none",
+    })
+    assert resp.status_code == 201
+    assert fake.calls == 1 and GeneratedAsset.objects.filter(user=user).count() == 1
+
+    meta = {}
+    first = asyncio.run(generate_micro_sop_async("sms", "Confirm the 10:00 meeting", meta=meta))
+    second_meta = {}
+    second = asyncio.run(generate_micro_sop_async("sms", "Confirm the 10:00 meeting", meta=second_meta))
+    assert (meta["served_from"], second_meta["served_from"]) == ("model", "cache")
+    assert first == second and fake.calls == 2
+
+
+def test_async_upstream_errors_retry_then_fall_back(fake_async_client, locmem_cache, throttled, settings):
+    fake = fake_async_client
+    capabilities.remember("gpt-4o-mini", "chat")
+    real_create, failures = fake.chat.completions.create, []
+
+    async def flaky(**kwargs):
+        if not failures:
+            failures.append(1)
+            raise _rate_limit_error("0.1")
+        return await real_create(**kwargs)
+
+    fake.chat.completions.create = flaky
+    meta = {}
+    asyncio.run(generate_micro_sop_async("sms", "Confirm the meeting", model="gpt-4o-mini", use_cache=False, meta=meta))
+    assert meta["served_from"] == "model" and throttle.throttle_stats()["upstream_429"] == 1
+
+    async def down(**kwargs):
+        raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+    fake.chat.completions.create = down
+    settings.GENERATOR_RATE_LIMIT = {**settings.GENERATOR_RATE_LIMIT, "RETRY": {"MAX_ATTEMPTS": 1}}
+    meta = {}
+    data = asyncio.run(generate_micro_sop_async("sms", "Confirm the meeting", model="gpt-4o-mini", use_cache=False, meta=meta))
+    assert meta["served_from"] == "fallback" and data["message"]
+
+
+def test_prompt_static_prefix_first_and_cached_tokens_recorded(fake_client, locmem_cache):
+    usage.reset()
+    first = build_user_prompt("sms", "Confirm the 10:00 meeting", tone="friendly", niche="events")
+    second = build_user_prompt("sms", "Remind about the invoice", tone="urgent", language="pt", niche="events")
+    prefix = static_prefix("sms", "events")
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert "Tone:" not in prefix and "Niche guide:" in prefix
+
+    generate_micro_sop("sms", "Send an SMS to confirm the meeting", constraints={"niche": "events"})
+    generate_micro_sop("sms", "Send an SMS about the unpaid invoice", tone="urgent", constraints={"niche": "events"})
+
+    stats = usage.usage_stats()["events"]
+    assert stats["calls"] == 2
+    assert stats["cached_tokens"] >= (len(SYSTEM_PROMPT) + len(prefix)) // 4  # whole static prefix reused
+
+
+def test_output_budget_per_type_and_adapts_to_observed_lengths(fake_client, locmem_cache, settings):
+    settings.GENERATOR_OUTPUT_BUDGETS = {"MIN_SAMPLES": 3, "HEADROOM": 1.25}
+    budgets.reset()
+    sms = budgets.choose("sms", niche=None, language="en", schema_def=SCHEMAS["sms"][1])
+    email = budgets.choose("email", niche=None, language="en", schema_def=SCHEMAS["email"][1])
+    assert sms < 200 < email == 900  # sms is capped by its schema's maxLengths
+
+    for _ in range(3):
+        budgets.observe("email", niche="dental", language="pt", budget=email, output_text="", usage={"completion_tokens": 100})
+    assert budgets.choose("email", niche="dental", language="pt", schema_def=SCHEMAS["email"][1]) == 125
+    assert budgets.choose("email", niche="dental", language="en", schema_def=SCHEMAS["email"][1]) == 900
+
+    budgets.observe("email", niche="dental", language="pt", budget=125, output_text="", usage={"completion_tokens": 125})
+    assert budgets.choose("email", niche="dental", language="pt", schema_def=SCHEMAS["email"][1]) > 125  # hit the cap
+
+    generate_micro_sop("sms", "Send an SMS to confirm the meeting")
+    assert budgets.budget_stats()["sms/none/en"]["n"] == 1
+    budgets.reset()
+
+
+def test_router_picks_model_per_route_and_skips_unhealthy(fake_client, locmem_cache, settings):
+    settings.GENERATOR_ROUTER = {
+        "DEFAULT": {"models": ["default-model"], "temperature": 0.4},
+        "ROUTES": [
+            {"name": "short-sms", "asset_types": ["sms"], "max_brief_chars": 80, "models": ["cheap", "backup"], "temperature": 0.6},
+        ],
+        "MIN_SAMPLES": 2,
+        "MAX_ERROR_RATE": 0.3,
+    }
+    meta = {}
+    generate_micro_sop("sms", "Send an SMS to confirm the meeting", meta=meta)
+    assert meta["route"]["name"] == "short-sms" and meta["route"]["model"] == "cheap"
+    assert meta["route"]["temperature"] == 0.6 and meta["served_from"] == "model"
+    assert router.choose("sms", "x" * 200).name == "default"
+    assert generate_micro_sop("sms", "Send an SMS", model="pinned", meta=meta) and meta["route"]["name"] == "explicit"
+
+    for _ in range(3):
+        router.record(router.Route("short-sms", "cheap", 0.6, ""), latency_ms=50, failed=True)
+    generate_micro_sop("sms", "Send an SMS about the unpaid invoice", meta=meta)
+    assert meta["route"]["model"] == "backup" and "cheap" in meta["route"]["reason"]
+
+    stats = router.router_stats()
+    assert stats["routes"]["short-sms"]["models"] == {"cheap": 4, "backup": 1}
+    assert stats["routes"]["short-sms"]["p95_ms"] is not None
+
+
+def test_default_routes_keep_long_briefs_on_the_baseline_model():
+    long_checklist = router.choose("checklist", "Step by step plan for the venue setup. " * 12)
+    long_email = router.choose("email", "Explain the new late fee policy to every client in detail. " * 12)
+    assert long_checklist.name == "long-checklist" and long_checklist.model == "gpt-4o-mini"
+    assert long_email.name == "long-email" and long_email.model == "gpt-4o-mini"
+
+
+def test_hedged_call_races_a_duplicate_within_budget(settings):
+    settings.GENERATOR_RATE_LIMIT = {"ENABLED": False}
+    settings.GENERATOR_HEDGING = {"ENABLED": True, "MIN_SAMPLES": 3, "MIN_DELAY_MS": 10, "PERCENTILE": 95, "BUDGET": 0.5}
+    throttle.reset()
+    hedge.reset()
+    for _ in range(3):
+        assert hedge.run(lambda leg: "{}", model="m", tokens=10) == "{}"  # fast calls teach the delay
+
+    legs = []
+
+    async def call(leg):
+        legs.append(leg)
+        if len(legs) == 1:
+            await asyncio.sleep(5)  # the slow primary
+        leg["usage"] = {"prompt_tokens": 30, "completion_tokens": 20}
+        return "hedge" if len(legs) == 2 else "primary"
+
+    losers = []
+
+    def record_attempt(**row):
+        losers.append(row)
+
+    async def go():
+        meta = {}
+        t0 = time.perf_counter()
+        text = await hedge.run_async(call, model="m", tokens=10, meta=meta, record_attempt=record_attempt)
+        return text, time.perf_counter() - t0, meta
+
+    text, elapsed, meta = asyncio.run(go())
+    assert text == "hedge" and elapsed < 1 and meta["usage"]["completion_tokens"] == 20
+    stats = hedge.hedge_stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1 and stats["extra_tokens"] == 10  # cancelled primary: estimate
+    assert [(r["attempt"], r["error"], r["usage"]) for r in losers] == [(accounting.HEDGE_LOSER, "CancelledError", None)]
+
+    sync_legs, settled = [], threading.Event()
+
+    def sync_call(leg):
+        sync_legs.append(leg)
+        primary = len(sync_legs) == 1
+        if primary:
+            time.sleep(0.3)  # sync legs can't be cancelled: the slow primary runs on after the hedge answers
+        leg["usage"] = {"prompt_tokens": 30, "completion_tokens": 20}
+        return "primary" if primary else "hedge"
+
+    losers.clear()
+    text = hedge.run(sync_call, model="m", tokens=10, record_attempt=lambda **row: (losers.append(row), settled.set()))
+    assert text == "hedge" and settled.wait(2)
+    assert losers[0]["attempt"] == accounting.HEDGE_LOSER and losers[0]["usage"]["completion_tokens"] == 20
+
+    settings.GENERATOR_HEDGING = {**settings.GENERATOR_HEDGING, "BUDGET": 0.0}
+
+    async def slow(leg):
+        await asyncio.sleep(0.1)
+        return "primary"
+
+    assert asyncio.run(hedge.run_async(slow, model="m", tokens=10)) == "primary"
+    assert hedge.hedge_stats()["hedged"] == 2  # the async and the sync hedge above, not this one
+    hedge.reset()
+    throttle.reset()
+
+
+def test_sync_hedging_never_queues_calls_behind_a_full_pool(settings, monkeypatch):
+    settings.GENERATOR_RATE_LIMIT = {"ENABLED": False}
+    settings.GENERATOR_HEDGING = {"ENABLED": True, "MIN_SAMPLES": 3, "MIN_DELAY_MS": 10, "BUDGET": 1.0, "MAX_THREADS": 2}
+    monkeypatch.setattr(hedge, "_pool", None)  # a private two-thread pool
+    monkeypatch.setattr(hedge, "_pool_size", 0)
+    hedge.reset()
+    for _ in range(3):
+        hedge.run(lambda leg: "{}", model="m", tokens=10)
+
+    # three calls at once with two pool threads: all must be running together to pass the barrier
+    barrier = threading.Barrier(3, timeout=2)
+
+    def call(leg):
+        barrier.wait()
+        return "{}"
+
+    with ThreadPoolExecutor(max_workers=3) as callers:
+        results = list(callers.map(lambda _: hedge.run(call, model="m", tokens=10), range(3)))
+    assert results == ["{}"] * 3
+    stats = hedge.hedge_stats()
+    assert stats["hedged"] == 0 and stats["pool_busy"] >= 1  # no thread left for a hedge: served unhedged
+    hedge._pool.shutdown(wait=True)
+    hedge.reset()
+
+
+def test_public_modules_export_every_name_in_all(fake_client):
+    from generator import openai_client
+    from generator.ai import public
+
+    for module in (public, openai_client):
+        assert all(getattr(module, name) is not None for name in module.__all__)
+        assert module.client is fake_client  # served lazily by the module __getattr__
+
+
+def test_validation_reports_paths_and_repairs_in_place():
+    checklist = {"title": "Open", "items": [{"text": "a"}, {"text": "b", "priority": "urgent"}, {"text": "c", "note": "x"}]}
+    issues = validate("checklist", checklist)
+    assert {(i.path, i.keyword) for i in issues} == {(("items", 1, "priority"), "enum"), (("items", 2), "additionalProperties")}
+    data, rebuilt = repair("checklist", checklist, issues, "prompt")
+    assert not rebuilt and data["items"][1]["priority"] == "medium" and "note" not in data["items"][2]
+
+    sms = {"message": "x" * 400}
+    data, rebuilt = repair("sms", sms, validate("sms", sms), "prompt")
+    assert not rebuilt and len(data["message"]) == 320
+
+    bad = {"title": "Open", "items": "not a list"}
+    data, rebuilt = repair("checklist", bad, validate("checklist", bad), "Check doors; check lights; lock up")
+    assert rebuilt and validate("checklist", data) == []
+
+    for asset_type, value in [
+        ("sms", {"message": "hi", "cta": 3}), ("sms", {"cta": "x"}), ("email", {"subject": "s", "body_markdown": "b"}),
+        ("checklist", {"title": "t", "items": [{"text": "a"}] * 2}), ("checklist", None), ("email", []),
+    ]:
+        assert _FAST_CHECKS[asset_type](value) == VALIDATORS[asset_type].is_valid(value)
+
+
+def test_recoerce_assets_dry_run_then_resumable_write(django_user_model, tmp_path):
+    from django.core.management import call_command
+
+    user = django_user_model.objects.create_user(email="re@example.com", password="pass")
+    stale = {"title": "Open", "items": [{"text": "- unlock  doors ", "priority": "urgent"}, "lights"]}
+    rows = [
+        GeneratedAsset.objects.create(user=user, asset_type="auto", prompt_used="p", result=json.dumps(stale)),
+        GeneratedAsset.objects.create(user=user, asset_type="sms", prompt_used="p", result=json.dumps({"message": "Hi"})),
+        GeneratedAsset.objects.create(user=user, asset_type="email", prompt_used="p", result="not json"),
+    ]
+    checkpoint = tmp_path / "recoerce.json"
+
+    out = io.StringIO()
+    call_command("recoerce_assets", "--dry-run", "--workers", "0", "--checkpoint", str(checkpoint), stdout=out, stderr=io.StringIO())
+    summary = json.loads(out.getvalue().strip().splitlines()[-1])
+    assert (summary["scanned"], summary["changed"], summary["unparseable"]) == (3, 1, 1)
+    assert "+2. lights [medium]" in out.getvalue() and not checkpoint.exists()
+    assert GeneratedAsset.objects.get(pk=rows[0].pk).asset_type == "auto"
+
+    call_command("recoerce_assets", "--workers", "2", "--chunk-size", "2", "--checkpoint", str(checkpoint), stdout=io.StringIO(), stderr=io.StringIO())
+    fixed = GeneratedAsset.objects.get(pk=rows[0].pk)
+    assert fixed.asset_type == "checklist"
+    assert json.loads(fixed.result)["items"][:2] == [{"text": "unlock doors", "priority": "medium"}, {"text": "lights", "priority": "medium"}]
+    assert json.loads(checkpoint.read_text())["last_pk"] == rows[2].pk
+
+    out = io.StringIO()
+    call_command("recoerce_assets", "--workers", "0", "--checkpoint", str(checkpoint), stdout=out, stderr=io.StringIO())
+    assert json.loads(out.getvalue())["scanned"] == 0  # resumed after the last row
+
+
+def test_recoerce_keeps_each_rows_own_language(django_user_model):
+    from generator.services.recoerce import recoerce_rows
+
+    user = django_user_model.objects.create_user(email="re-pt@example.com", password="pass")
+    short = json.dumps({"title": "Abrir", "items": ["portas"]})
+    pt = GeneratedAsset.objects.create(user=user, asset_type="checklist", prompt_used="p", result=short, language="pt")
+    legacy = GeneratedAsset.objects.create(user=user, asset_type="checklist", prompt_used="p", result=short)
+    list(recoerce_rows(workers=0, language="en"))
+    assert json.loads(GeneratedAsset.objects.get(pk=pt.pk).result)["items"][1]["text"].startswith("Clarificar")
+    assert json.loads(GeneratedAsset.objects.get(pk=legacy.pk).result)["items"][1]["text"].startswith("Clarify")
+
+
+def test_cassettes_record_then_replay_with_scaled_latency(tmp_path):
+    def upstream(request):
+        time.sleep(0.2)
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        return httpx.Response(200, json={
+            "id": "c1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"echo {prompt}"}}],
+        })
+
+    def client_for(transport):
+        return openai.OpenAI(api_key="sk-test", base_url="http://upstream.test/v1", max_retries=0,
+                             http_client=httpx.Client(transport=transport))
+
+    def ask(cli, prompt):
+        resp = cli.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}])
+        return resp.choices[0].message.content
+
+    store = cassettes.CassetteStore(str(tmp_path))
+    recorder = client_for(cassettes.CassetteTransport("record", store, inner=httpx.MockTransport(upstream)))
+    assert ask(recorder, "hello") == "echo hello"
+    (saved,) = tmp_path.glob("chat_completions-*.json")
+    recorded = json.loads(saved.read_text())
+    assert recorded["response"]["headers_s"] >= 0.2 and "authorization" not in recorded["request"]["headers"]
+
+    offline = httpx.MockTransport(lambda request: pytest.fail("replay must not reach the network"))
+    player = client_for(cassettes.CassetteTransport("replay", store, latency_scale=0.25, inner=offline))
+    t0 = time.perf_counter()
+    assert ask(player, "hello") == "echo hello"
+    assert 0.04 < time.perf_counter() - t0 < 0.2
+    with pytest.raises(openai.APIConnectionError):
+        ask(player, "something never recorded")
+
+
+def test_fake_openai_server_serves_schema_valid_assets_and_faults():
+    behaviour = Behaviour(latency="fixed:0", chunk_chars=5, seed=1)
+    server = make_server("127.0.0.1", 0, behaviour)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cli = openai.OpenAI(api_key="sk-test", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+    try:
+        prompt = build_user_prompt("checklist", "Opening shift for a cafe")
+        resp = cli.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}])
+        assert validate("checklist", json.loads(resp.choices[0].message.content)) == []
+
+        stream = cli.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}],
+                                             stream=True, stream_options={"include_usage": True})
+        chunks = list(stream)
+        assert "".join(c.choices[0].delta.content for c in chunks if c.choices) == resp.choices[0].message.content
+        assert chunks[-1].usage.completion_tokens > 0
+
+        raw = cli.post("/responses", cast_to=httpx.Response, body={
+            "model": "gpt-4o-mini", "input": [{"role": "user", "content": [{"type": "text", "text": "hi"}]}],
+            "response_format": {"type": "json_schema", "json_schema": {"name": "SmsAsset", "schema": SCHEMAS["sms"][1]}},
+        })
+        text = raw.json()["output"][0]["content"][0]["text"]
+        assert validate("sms", json.loads(text)) == []
+
+        behaviour.rate_429, behaviour.retry_after = 1.0, 2.5
+        with pytest.raises(openai.RateLimitError) as excinfo:
+            cli.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}])
+        assert throttle.retry_after_seconds(excinfo.value) == 2.5 and not api._is_insufficient_quota(excinfo.value)
+
+        behaviour.rate_429, behaviour.rate_quota = 0.0, 1.0
+        with pytest.raises(openai.RateLimitError) as excinfo:
+            cli.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}])
+        assert api._is_insufficient_quota(excinfo.value)
+        assert behaviour.stats["ok"] == 2 and behaviour.stats["streamed"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_openai_client_is_built_lazily_with_tuned_pool_and_warmed(monkeypatch, settings):
+    settings.GENERATOR_OPENAI_HTTP = {"CONNECT_TIMEOUT_S": 2, "READ_TIMEOUT_S": 30, "WARMUP_CONNECTIONS": 3}
+    server = make_server("127.0.0.1", 0, Behaviour(latency="fixed:0", seed=1))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")  # the SDK refuses to build without one
+    monkeypatch.delitem(api.__dict__, "client", raising=False)  # delattr would build it via __getattr__ first
+    clients.reset()
+    capabilities.reset()
+    try:
+        assert clients.client_stats()["built"] == 0
+        assert clients.warm_up() == 3
+        cli = api.client
+        assert cli is clients.get_client() and clients.client_stats()["built"] == 2
+        assert (cli.timeout.connect, cli.timeout.read) == (2.0, 30.0)
+
+        schema_name, schema_def = SCHEMAS["sms"]
+        text = api.call_model_with_schema(
+            user_prompt=build_user_prompt("sms", "Confirm the meeting"), schema_name=schema_name, schema_def=schema_def,
+            system_prompt=SYSTEM_PROMPT, model="gpt-4o-mini", temperature=0.2, max_output_tokens=200,
+        )
+        assert validate("sms", json.loads(text)) == []
+        assert clients.client_stats()["built"] == 2  # the call reused the warmed client
+    finally:
+        clients.reset()
+        capabilities.reset()
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_runs_journeys_and_reports_percentiles_and_queries(settings, locmem_cache, monkeypatch):
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    real_client = api.__dict__.get("client")  # not built yet, unless an earlier test did
+    # One user: the in-memory SQLite test database can't take concurrent writers
+    report = loadtest.run(users=1, ramp_s=0, iterations=4, mix={"generate": 1, "browse": 1}, upstream_latency=0.01, seed=1)
+
+    assert api.__dict__.get("client") is real_client
+    endpoints = report["endpoints"]
+    assert {"csrf", "login_htmx", "generate_form", "generate_submit", "usage_tracker", "my_assets"} <= set(endpoints)
+    for name, summary in endpoints.items():
+        assert summary["error_rate"] == 0, (name, summary["statuses"])
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+    assert endpoints["generate_submit"]["statuses"] == {201: endpoints["generate_submit"]["count"]}
+    assert endpoints["login_htmx"]["queries_mean"] > 0 and report["journeys"]["login"]["count"] == 1
+    assert GeneratedAsset.objects.filter(user__email__startswith="loadtest+").count() == endpoints["generate_submit"]["count"]
+
+    lines = loadtest.compare(report, json.loads(json.dumps(report)))
+    assert any("generate_submit" in line and "(+0.0)" in line for line in lines)
@@ -0,0 +1,174 @@
+# backend/generator/timing.py
+"""
+Per-stage timers for the generate flow.
+
+ServerTimingMiddleware opens a Timings collector per request (a contextvar,
+so it follows the request through sync_to_async and awaits). Code marks its
+stages with `with timing.stage("gate"):` and tags the request with
+timing.label(asset_type=..., model=...). Outside a request both are no-ops.
+
+When the response leaves, the stages go out as a Server-Timing header
+(gate;dur=2.1, model;dur=812.4, ...) and are observed into Prometheus
+histograms, if prometheus_client is installed:
+
+    generator_stage_seconds{stage, asset_type, niche, model, fallback}
+    generator_request_seconds{asset_type, niche, model, fallback}
+
+/metrics (views.metrics) exposes them. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR (see core/gunicorn.conf.py) and /metrics sums
+every worker's samples.
+
+Configured by settings.GENERATOR_METRICS:
+    SERVER_TIMING  emit the Server-Timing header
+    PROMETHEUS     observe the histograms
+    BUCKETS        histogram buckets, seconds
+    TOKEN          "Authorization: Bearer <TOKEN>" opens /metrics
+    ALLOW_IPS      client addresses (REMOTE_ADDR) that may read /metrics
+
+/metrics is closed by default: it answers only the TOKEN, an ALLOW_IPS
+address or a staff session.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional: without it only the Server-Timing header is emitted
+    prometheus_client = None
+
+DEFAULTS: Dict[str, Any] = {
+    "SERVER_TIMING": True,
+    "PROMETHEUS": True,
+    "BUCKETS": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    "TOKEN": None,
+    "ALLOW_IPS": (),
+}
+
+LABELS = ("asset_type", "niche", "model", "fallback")
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("generator_timings", default=None)
+_lock = threading.Lock()
+_histograms: Optional[Tuple[Any, Any]] = None
+
+
+def config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    cfg = dict(DEFAULTS)
+    if settings.configured:
+        cfg.update(getattr(settings, "GENERATOR_METRICS", {}) or {})
+    return cfg
+
+
+class Timings:
+    """Stage durations (seconds, summed per name, in first-seen order) and labels for one request."""
+
+    __slots__ = ("stages", "labels", "t0")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+        self.t0 = perf_counter()
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        return perf_counter() - self.t0
+
+    def header(self) -> str:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def collect() -> Iterator[Timings]:
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, perf_counter() - t0)
+
+
+def label(**labels: Any) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.labels.update({k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in labels.items() if v is not None})
+
+
+# -----------------------
+# Prometheus
+# -----------------------
+def prometheus_available() -> bool:
+    return prometheus_client is not None
+
+
+def _get_histograms() -> Tuple[Any, Any]:
+    global _histograms
+    if _histograms is None:
+        with _lock:
+            if _histograms is None:
+                buckets = tuple(config()["BUCKETS"])
+                _histograms = (
+                    prometheus_client.Histogram(
+                        "generator_stage_seconds", "Time spent per generate stage",
+                        ("stage",) + LABELS, buckets=buckets,
+                    ),
+                    prometheus_client.Histogram(
+                        "generator_request_seconds", "Generate request time, end to end",
+                        LABELS, buckets=buckets,
+                    ),
+                )
+    return _histograms
+
+
+def observe(timings: Timings) -> None:
+    """Record a finished request's stages (requests that reached no stage are skipped)."""
+    if prometheus_client is None or not timings.stages:
+        return
+    stage_hist, request_hist = _get_histograms()
+    values = tuple(timings.labels.get(name, "") for name in LABELS)
+    for name, seconds in timings.stages.items():
+        stage_hist.labels(name, *values).observe(seconds)
+    request_hist.labels(*values).observe(timings.total())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """(exposition body, content type); aggregates all workers in multiprocess mode."""
+    registry = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def finish(timings: Timings, response, cfg: Optional[Dict[str, Any]] = None):
+    cfg = cfg or config()
+    if timings.stages:
+        if cfg["SERVER_TIMING"]:
+            response["Server-Timing"] = timings.header()
+        if cfg["PROMETHEUS"]:
+            observe(timings)
+    return response
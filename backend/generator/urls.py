@@ -1,10 +1,23 @@
 from django.urls import path
-from .views import GenerateSOPView, UserAssetsView
+from .views import (
+    GenerateSOPView, GenerateSOPAsyncView, GenerateSOPStreamView, UserAssetsView,
+    generate_batch, generate_stream_events, generation_job_status, response_cache_stats,
+)
 
 urlpatterns = [
     # Clear, API-ish names to avoid clashing with frontend
     path("generate/form/",   GenerateSOPView.as_view(), name="api-generate-form"),
     path("generate/submit/", GenerateSOPView.as_view(), name="api-generate-sop"),
+    # Queued mode (GENERATOR_JOBS): submit returns a fragment that polls the job
+    path("generate/jobs/<int:job_id>/", generation_job_status, name="api-generate-job"),
+    # ASGI-only: awaits the model call instead of holding a worker
+    path("generate/submit/async/", GenerateSOPAsyncView.as_view(), name="api-generate-sop-async"),
+    # Streaming (SSE): POST the form, then the returned fragment connects to the events URL
+    path("generate/stream/", GenerateSOPStreamView.as_view(), name="api-generate-sop-stream"),
+    path("generate/stream/<str:token>/", generate_stream_events, name="api-generate-sop-stream-events"),
+    # Batch: CSV/JSON briefs in, NDJSON results out (one credit check per batch)
+    path("generate/batch/", generate_batch, name="api-generate-batch"),
+    path("generate/cache-stats/", response_cache_stats, name="api-generate-cache-stats"),
 
     path("my-assets/", UserAssetsView.as_view(), name="user_assets"),
 ]
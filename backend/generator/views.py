@@ -1,29 +1,58 @@
 # backend/generator/views.py
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils.translation import gettext as _
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
-from generator.models import GeneratedAsset
+from generator.models import GeneratedAsset, GenerationJob
 from generator.serializers import GeneratedAssetSerializer
 from django.conf import settings
+import json
 import logging
+import secrets
 
+from generator.ai.breaker import breaker_stats
+from generator.ai.budgets import budget_stats
+from generator.ai.cache import cache_stats
+from generator.ai.capabilities import capability_stats
+from generator.ai.hedge import hedge_stats
+from generator.ai.neardup import near_dup_stats
+from generator.ai.router import router_stats
+from generator.ai.singleflight import single_flight_stats
+from generator.ai.throttle import throttle_stats
+from generator.ai.usage import usage_stats
+from generator import accounting, timing
 from generator.forms import GenerateForm
 from generator.presenters import result_to_plain_text
-from generator.services.generation import generate_asset
-from generator.services.persist import save_asset
-from generator.services.credits import gate, record_success
+from generator.services.batch import BatchError, read_csv, run_batch
+from generator.services.generation import brief_key, generate_asset, generate_asset_async, generate_kwargs, stream_asset
+from generator.services.jobs import enqueue, job_config
+from generator.services.persist import save_result, stored_counterpart
+from generator.services.credits import form_cost, gate, record_success
 
+from asgiref.sync import sync_to_async
+from ratelimit.core import is_ratelimited
 from ratelimit.decorators import ratelimit
+from ratelimit.exceptions import Ratelimited
 
 logger = logging.getLogger(__name__)
 
+# Shared by the sync and async views so both count against one budget
+GENERATE_RATELIMIT_GROUP = "generator.generate"
+GENERATE_RATE = "5/m"
+STREAM_SESSION_PREFIX = "generate_stream:"
+BATCH_RATE = "2/m"
+
 @method_decorator(login_required, name="dispatch")
-@method_decorator(ratelimit(key="user", rate="5/m", method="POST", block=True), name="dispatch")
+@method_decorator(ratelimit(group=GENERATE_RATELIMIT_GROUP, key="user", rate=GENERATE_RATE, method="POST", block=True), name="dispatch")
 @method_decorator(ensure_csrf_cookie, name="get")
 @method_decorator(csrf_protect, name="post")
 class GenerateSOPView(View):
@@ -34,54 +63,296 @@ class GenerateSOPView(View):
 
     def post(self, request):
         form = GenerateForm(request.POST)
-        if not form.is_valid():
-            field, errors = next(iter(form.errors.items()))
-            raw_msg = errors[0]
-
-            friendly = {
-                "prompt": _("Please describe what you need."),
-                "payment_value": _("Please provide the payment value for the selected method."),
-                "payment_method": _("Invalid payment method."),
-                "niche": _("Invalid niche."),
-            }.get(field, raw_msg)
-
-            ctx = {"error": friendly}
-            if settings.DEBUG:
-                ctx["error_detail"] = f"{field}: {raw_msg}"  # shows e.g., "prompt: This field is required."
-            return render(request, "frontend/partials/generate_result.html", ctx, status=200)
-
-        ok, msg, used_before = gate(request.user)
+        with timing.stage("form"):
+            valid = form.is_valid()
+        if not valid:
+            return _form_error_response(request, form)
+        timing.label(niche=form.cleaned_data["niche"])
+
+        stored = _stored_counterpart(request.user, form)
+        if stored is not None:
+            return _success_response(request, form, stored)
+
+        with timing.stage("gate"):
+            ok, msg, used_before = gate(request.user, credits=form_cost(form))
         if not ok:
             return render(request, "frontend/partials/generate_result.html", {"error": _(msg)}, status=200)
 
+        if job_config()["ENABLED"]:
+            # Hand off to run_generation_worker; the fragment polls for the result
+            job = enqueue(request.user, request.POST.dict(), used_before, credits=form_cost(form))
+            return _job_response(request, job, status=202)
+
         try:
-            result = generate_asset(
-                prompt=form.cleaned_data["prompt"],
-                language=form.cleaned_data["language"],
-                tone=form.cleaned_data["tone"],
-                audience=form.cleaned_data.get("audience"),
-                brand_voice=form.cleaned_data.get("brand_voice"),
-                include_signature=bool(form.cleaned_data.get("include_signature")),
-                constraints=form.constraints(),
-            )
+            result = generate_asset(**generate_kwargs(form))
         except Exception as e:
             logger.exception("Generation failed")
             return render(request, "frontend/partials/generate_result.html",
                           {"error": _("Unexpected error while generating.")}, status=200)
 
+        _persist(request.user, form, result, used_before)
+        return _success_response(request, form, result)
+
+
+@method_decorator(login_required, name="get")
+@method_decorator(login_required, name="post")
+@method_decorator(ensure_csrf_cookie, name="get")
+@method_decorator(csrf_protect, name="post")
+class GenerateSOPAsyncView(View):
+    """
+    ASGI variant of GenerateSOPView: the model call is awaited, so a single
+    worker can keep many generations in flight. DB work (credits, persist)
+    still runs through sync_to_async.
+    """
+    async def get(self, request):
+        from generator.forms import ALLOWED_NICHES
+        ctx = {"form_data": {}, "niches": sorted(ALLOWED_NICHES)}
+        return render(request, "frontend/modals/generate_body.html", ctx)
+
+    async def post(self, request):
+        limited = await sync_to_async(is_ratelimited)(
+            request, group=GENERATE_RATELIMIT_GROUP, key="user", rate=GENERATE_RATE,
+            method="POST", increment=True,
+        )
+        if limited:
+            raise Ratelimited()
+
+        form = GenerateForm(request.POST)
+        with timing.stage("form"):
+            valid = form.is_valid()
+        if not valid:
+            return _form_error_response(request, form)
+        timing.label(niche=form.cleaned_data["niche"])
+
+        user = await request.auser()
+        stored = await sync_to_async(_stored_counterpart)(user, form)
+        if stored is not None:
+            return _success_response(request, form, stored)
+
+        with timing.stage("gate"):
+            ok, msg, used_before = await sync_to_async(gate)(user, credits=form_cost(form))
+        if not ok:
+            return render(request, "frontend/partials/generate_result.html", {"error": _(msg)}, status=200)
+
         try:
-            save_asset(user=request.user, prompt_used=form.cleaned_data["prompt"], content=result, asset_type="auto")
-            record_success(request.user, used_before)
+            result = await generate_asset_async(**generate_kwargs(form))
         except Exception:
-            logger.exception("Persist/usage failed (non-fatal)")
+            logger.exception("Generation failed")
+            return render(request, "frontend/partials/generate_result.html",
+                          {"error": _("Unexpected error while generating.")}, status=200)
+
+        await sync_to_async(_persist)(user, form, result, used_before)
+        return _success_response(request, form, result)
 
+
+@method_decorator(login_required, name="dispatch")
+@method_decorator(ratelimit(group=GENERATE_RATELIMIT_GROUP, key="user", rate=GENERATE_RATE, method="POST", block=True), name="dispatch")
+@method_decorator(csrf_protect, name="post")
+class GenerateSOPStreamView(View):
+    """
+    Streaming mode, step 1: validate + gate, then hand back a fragment that
+    opens an SSE connection (htmx sse extension) to generate_stream_events.
+    The request is parked in the session under a one-time token.
+    """
+    def post(self, request):
+        form = GenerateForm(request.POST)
+        if not form.is_valid():
+            return _form_error_response(request, form)
+
+        stored = _stored_counterpart(request.user, form)
+        if stored is not None:
+            return _success_response(request, form, stored)
+
+        ok, msg, used_before = gate(request.user, credits=form_cost(form))
+        if not ok:
+            return render(request, "frontend/partials/generate_result.html", {"error": _(msg)}, status=200)
+
+        token = secrets.token_urlsafe(16)
+        request.session[STREAM_SESSION_PREFIX + token] = {"data": request.POST.dict(), "used_before": used_before}
+        stream_url = reverse("api-generate-sop-stream-events", args=[token])
+        return render(request, "frontend/partials/generate_stream.html", {"stream_url": stream_url}, status=200)
+
+
+@login_required
+def generate_stream_events(request, token):
+    """
+    Streaming mode, step 2: text/event-stream with one "part" event per
+    completed field/checklist item and a final "done" event carrying the
+    regular result partial (validated + persisted).
+    """
+    pending = request.session.pop(STREAM_SESSION_PREFIX + token, None)
+    if pending is None:
+        # Already consumed (e.g. EventSource reconnect); 204 tells it to stop
+        return HttpResponse(status=204)
+
+    form = GenerateForm(pending["data"])
+    if not form.is_valid():
+        return HttpResponse(status=204)
+    user, used_before = request.user, pending["used_before"]
+
+    def events():
+        # The stream runs after ModelCallMiddleware has returned, so it collects its own calls.
+        # If the client disconnects, keep reading upstream to the final event so the
+        # result is still persisted and charged; nothing more is sent.
+        disconnected = False
+        try:
+            with accounting.collect(user_id=user.pk):
+                for event in stream_asset(**generate_kwargs(form)):
+                    if event.kind != "final":
+                        if disconnected:
+                            continue
+                        html = render_to_string("frontend/partials/generate_stream_part.html", {"event": event})
+                        try:
+                            yield _sse("part", html)
+                        except GeneratorExit:
+                            disconnected = True
+                        continue
+                    result = event.data
+                    _persist(user, form, result, used_before)
+                    if not disconnected:
+                        yield _sse("done", _success_response(request, form, result).content.decode())
+        except Exception:
+            logger.exception("Streaming generation failed")
+            if disconnected:
+                return
+            html = render_to_string("frontend/partials/generate_result.html",
+                                    {"error": _("Unexpected error while generating.")}, request=request)
+            yield _sse("done", html)
+
+    resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return resp
+
+
+@login_required
+@ratelimit(group="generator.batch", key="user", rate=BATCH_RATE, method="POST", block=True)
+@require_POST
+def generate_batch(request):
+    """
+    Batch mode: POST a CSV file ("briefs", one brief per row with the form's
+    field names as headers) or JSON {"briefs": [{...}, ...], "concurrency": n}.
+    Credits are checked once for the whole batch; the response is NDJSON with
+    one line per row as it finishes and a final summary line.
+    """
+    try:
+        if request.content_type == "application/json":
+            payload = json.loads(request.body or b"{}")
+            rows, concurrency = payload.get("briefs") or [], payload.get("concurrency")
+            skip_cache = bool(payload.get("skip_cache"))
+        else:
+            upload = request.FILES.get("briefs")
+            rows = read_csv(upload.read().decode("utf-8")) if upload else []
+            concurrency = request.POST.get("concurrency")
+            skip_cache = bool(request.POST.get("skip_cache"))
+        records = run_batch(request.user, rows, concurrency=int(concurrency) if concurrency else None,
+                            use_cache=not skip_cache)
+        first = next(records)  # validation + credit gate happen before the first record
+    except BatchError as e:
+        return JsonResponse({"error": _(str(e))}, status=400)
+    except (ValueError, UnicodeDecodeError, AttributeError):
+        return JsonResponse({"error": _("Invalid batch payload.")}, status=400)
+
+    def lines():
+        yield json.dumps(first, ensure_ascii=False) + "\n"
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    resp = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@login_required
+def generation_job_status(request, job_id):
+    """Polled by the job fragment: keeps polling until the worker finishes, then swaps in the result."""
+    job = get_object_or_404(GenerationJob, pk=job_id, user=request.user)
+    if not job.is_finished:
+        return _job_response(request, job)
+    if job.status == GenerationJob.STATUS_FAILED:
+        return render(request, "frontend/partials/generate_result.html",
+                      {"error": _("Unexpected error while generating.")}, status=200)
+    form = GenerateForm(job.payload)
+    form.is_valid()
+    return _success_response(request, form, job.result)
+
+
+def _job_response(request, job, status=200):
+    return render(request, "frontend/partials/generate_job.html", {
+        "job": job,
+        "poll_url": reverse("api-generate-job", args=[job.pk]),
+        "poll_ms": job_config()["POLL_MS"],
+    }, status=status)
+
+
+def _sse(event: str, html: str) -> str:
+    data = "\n".join(f"data: {line}" for line in (html.splitlines() or [""]))
+    return f"event: {event}\n{data}\n\n"
+
+
+def _form_error_response(request, form):
+    field, errors = next(iter(form.errors.items()))
+    raw_msg = errors[0]
+
+    friendly = {
+        "prompt": _("Please describe what you need."),
+        "payment_value": _("Please provide the payment value for the selected method."),
+        "payment_method": _("Invalid payment method."),
+        "niche": _("Invalid niche."),
+    }.get(field, raw_msg)
+
+    ctx = {"error": friendly}
+    if settings.DEBUG:
+        ctx["error_detail"] = f"{field}: {raw_msg}"  # shows e.g., "prompt: This field is required."
+    return render(request, "frontend/partials/generate_result.html", ctx, status=200)
+
+
+def _stored_counterpart(user, form):
+    """
+    The requested language's half of an earlier language="both" result for
+    the same brief: served as is, with no model call and no charge (the pair
+    was paid for). None when there is none or the request skips the cache.
+    """
+    if form.cleaned_data.get("skip_cache"):
+        return None
+    return stored_counterpart(user, brief_key=brief_key(form), language=form.cleaned_data["language"])
+
+
+def _persist(user, form, result, used_before):
+    try:
+        with timing.stage("persist"):
+            save_result(user=user, prompt_used=form.cleaned_data["prompt"], content=result,
+                        language=form.cleaned_data["language"], brief_key=brief_key(form))
+        with timing.stage("credits"):
+            record_success(user, used_before, credits=form_cost(form))
+    except Exception:
+        logger.exception("Persist/usage failed (non-fatal)")
+
+
+def _success_response(request, form, result):
+    with timing.stage("render"):
         plain_text = result_to_plain_text(result)
         calendar_suggestion = result.get("calendar") if form.cleaned_data["add_to_calendar"] else None
-
         return render(request, "frontend/partials/generate_result.html",
                       {"plain_text": plain_text, "calendar_suggestion": calendar_suggestion},
                       status=201)
 
+@staff_member_required
+def response_cache_stats(request):
+    return JsonResponse({
+        "exact": cache_stats(),
+        "near_dup": near_dup_stats(),
+        "call_paths": capability_stats(),
+        "rate_limit": throttle_stats(),
+        "circuit_breaker": breaker_stats(),
+        "single_flight": single_flight_stats(),
+        "usage_by_niche": usage_stats(),
+        "output_budgets": budget_stats(),
+        "routing": router_stats(),
+        "hedging": hedge_stats(),
+        "model_calls": accounting.accounting_stats(),
+    })
+
 class UserAssetsView(ListAPIView):
     serializer_class = GeneratedAssetSerializer
     permission_classes = [IsAuthenticated]
@@ -89,4 +360,25 @@ class UserAssetsView(ListAPIView):
     def get_queryset(self):
         return GeneratedAsset.objects.filter(
             user=self.request.user
-        ).order_by("-created_at")
\ No newline at end of file
+        ).order_by("-created_at")
+
+
+def metrics(request):
+    """
+    Prometheus exposition of the generator histograms (see generator/timing.py).
+    Needs the TOKEN bearer, an ALLOW_IPS client address or a staff session.
+    """
+    cfg = timing.config()
+    token = cfg["TOKEN"]
+    user = getattr(request, "user", None)
+    allowed = (
+        (token and request.headers.get("Authorization") == f"Bearer {token}")
+        or request.META.get("REMOTE_ADDR") in cfg["ALLOW_IPS"]
+        or (user is not None and user.is_staff)
+    )
+    if not allowed:
+        return HttpResponse(status=401 if token else 403)
+    if not timing.prometheus_available():
+        return HttpResponse("prometheus_client is not installed\n", status=501, content_type="text/plain")
+    body, content_type = timing.render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,35 @@
+# core/gunicorn.conf.py
+# gunicorn -c core/gunicorn.conf.py core.wsgi:application
+#
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metric samples
+# there and /metrics aggregates them (see backend/generator/timing.py). The
+# directory is wiped at startup, and a dead worker's live gauges are dropped.
+#
+# With GENERATOR_OPENAI_WARMUP=1 each worker opens its OpenAI connections at
+# boot (backend/generator/ai/clients.py).
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Open upstream connections before this worker takes traffic (GENERATOR_OPENAI_HTTP["WARMUP"]).
+    from generator.ai import clients
+
+    clients.warm_up_if_enabled()
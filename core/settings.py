@@ -45,12 +45,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "generator.middleware.ServerTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "generator.middleware.ModelCallMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -204,3 +206,181 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 STRIPE_PRICE_BASIC = os.getenv("STRIPE_PRICE_BASIC", "price_basic_XXX")     # 100/mo
 STRIPE_PRICE_PREMIUM = os.getenv("STRIPE_PRICE_PREMIUM", "price_premium_XXX")  # 200/mo
 
+
+# Shared cache (rate limits, response cache, etc.) when Redis is available
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
+
+# Generator: exact-match response cache in front of the model call
+GENERATOR_RESPONSE_CACHE = {
+    "BACKEND": os.getenv("GENERATOR_CACHE_BACKEND", "redis" if REDIS_URL else "locmem"),  # locmem | redis | none
+    "TTL": int(os.getenv("GENERATOR_CACHE_TTL", str(24 * 3600))),
+    "MAX_ENTRIES": int(os.getenv("GENERATOR_CACHE_MAX_ENTRIES", "1000")),
+    "CACHE_ALIAS": "default",
+}
+
+# Generator: near-duplicate brief lookup (per-process MinHash/LSH index)
+GENERATOR_NEAR_DUP = {
+    "ENABLED": os.getenv("GENERATOR_NEAR_DUP_ENABLED", "1") == "1",
+    "THRESHOLD": float(os.getenv("GENERATOR_NEAR_DUP_THRESHOLD", "0.8")),
+    "MAX_ENTRIES_PER_SCOPE": 500,
+    "NUM_PERM": 64,
+    "BANDS": 16,
+}
+
+# Generator: consecutive errors on the remembered model call path before re-probing
+GENERATOR_CAPABILITY_ERROR_STREAK = int(os.getenv("GENERATOR_CAPABILITY_ERROR_STREAK", "3"))
+
+# Generator: batch endpoint / generate_batch command
+GENERATOR_BATCH = {
+    "CONCURRENCY": int(os.getenv("GENERATOR_BATCH_CONCURRENCY", "8")),   # parallel model calls per batch
+    "MAX_CONCURRENCY": 16,
+    "MAX_ROWS": int(os.getenv("GENERATOR_BATCH_MAX_ROWS", "100")),
+}
+
+# Generator: DB-backed job queue (see run_generation_worker)
+GENERATOR_JOBS = {
+    "ENABLED": os.getenv("GENERATOR_JOBS_ENABLED", "0") == "1",  # 1 = queue for run_generation_worker (needs one running)
+    "POLL_MS": 1500,            # HTMX polling interval for the result fragment
+    "WORKER_POLL_S": 1.0,       # worker sleep when the queue is empty
+    "MAX_ATTEMPTS": 3,
+    "STALE_AFTER_S": 300,       # running jobs locked longer than this are requeued (dead worker)
+}
+
+# Generator: client-side RPM/TPM limiter + retry policy for OpenAI calls (see generator/ai/throttle.py)
+GENERATOR_RATE_LIMIT = {
+    "ENABLED": os.getenv("GENERATOR_RATE_LIMIT_ENABLED", "1") == "1",
+    "BACKEND": "redis" if REDIS_URL else "local",   # redis = one budget shared by every worker
+    "RPM": int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+    "TPM": int(os.getenv("OPENAI_TPM_LIMIT", "200000")),
+    "MODELS": {},                                    # per-model {"RPM": .., "TPM": ..} overrides
+    "MAX_WAIT_S": 20,
+    "RETRY": {"MAX_ATTEMPTS": 3, "BASE_S": 0.5, "MAX_S": 8.0},
+    "CACHE_ALIAS": "default",
+}
+
+# Generator: per-model circuit breaker (see generator/ai/breaker.py)
+GENERATOR_CIRCUIT_BREAKER = {
+    "ENABLED": os.getenv("GENERATOR_CIRCUIT_BREAKER_ENABLED", "1") == "1",
+    "BACKEND": "redis" if REDIS_URL else "local",   # redis = one circuit shared by every worker
+    "WINDOW_S": 60,
+    "BUCKET_S": 10,
+    "MIN_CALLS": 10,
+    "FAILURE_RATE": 0.5,
+    "OPEN_S": 30,
+    "HALF_OPEN_PROBES": 1,
+    "CACHE_ALIAS": "default",
+}
+
+# Generator: coalesce identical in-flight model calls (see generator/ai/singleflight.py)
+GENERATOR_SINGLE_FLIGHT = {
+    "ENABLED": os.getenv("GENERATOR_SINGLE_FLIGHT_ENABLED", "1") == "1",
+    "BACKEND": "redis" if REDIS_URL else "local",   # redis = also coalesce across workers
+    "LOCK_TTL_S": 60,
+    "RESULT_TTL_S": 30,
+    "POLL_S": 0.1,
+    "CACHE_ALIAS": "default",
+    "FOLLOWER_WAIT_S": None,    # None = one upstream attempt's timeouts; then a follower calls directly
+}
+
+# Generator: per-asset-type max_output_tokens (see generator/ai/budgets.py)
+GENERATOR_OUTPUT_BUDGETS = {
+    "ENABLED": os.getenv("GENERATOR_OUTPUT_BUDGETS_ENABLED", "1") == "1",
+    "DEFAULTS": {"sms": 200, "email": 900, "checklist": 800, "bundle": 1900},
+    "MIN": 64,
+    "MAX": 1200,
+    "MAX_BY_TYPE": {"bundle": 2400},
+    "PERCENTILE": 95,
+    "HEADROOM": 1.25,
+    "MIN_SAMPLES": 20,
+    "WINDOW": 500,
+}
+
+# Generator: model/temperature routing per request (see generator/ai/router.py)
+# Long checklists/emails stay on gpt-4o-mini unless GENERATOR_LONG_BRIEF_MODEL opts into an upgrade
+# (e.g. gpt-4o, ~15x the price); gpt-4o-mini remains the fallback while the upgrade is unhealthy
+GENERATOR_LONG_BRIEF_MODELS = [m for m in (os.getenv("GENERATOR_LONG_BRIEF_MODEL"), "gpt-4o-mini") if m]
+GENERATOR_ROUTER = {
+    "ENABLED": os.getenv("GENERATOR_ROUTER_ENABLED", "1") == "1",
+    "DEFAULT": {"models": ["gpt-4o-mini"], "temperature": 0.4},
+    "ROUTES": [
+        # models in order of preference (cheapest first); later ones are used while earlier ones are unhealthy
+        {"name": "sms", "asset_types": ["sms"], "models": ["gpt-4o-mini"], "temperature": 0.5},
+        {"name": "long-checklist", "asset_types": ["checklist"], "min_brief_chars": 400,
+         "models": GENERATOR_LONG_BRIEF_MODELS, "temperature": 0.3},
+        {"name": "long-email", "asset_types": ["email"], "min_brief_chars": 600,
+         "models": GENERATOR_LONG_BRIEF_MODELS, "temperature": 0.4},
+    ],
+    "EWMA_ALPHA": 0.2,
+    "MIN_SAMPLES": 5,
+    "MAX_ERROR_RATE": 0.3,
+    "MAX_LATENCY_MS": 20_000,
+    "WINDOW": 500,
+}
+
+# Generator: hedged upstream requests against tail latency (see generator/ai/hedge.py)
+GENERATOR_HEDGING = {
+    "ENABLED": os.getenv("GENERATOR_HEDGING_ENABLED", "0") == "1",
+    "PERCENTILE": 95,
+    "MIN_SAMPLES": 20,
+    "MIN_DELAY_MS": 200,
+    "BUDGET": 0.05,          # at most 5% of calls may fire a duplicate
+    "WINDOW": 1000,
+    "MAX_THREADS": 8,        # sync calls that find these busy run unhedged on their own thread
+}
+
+# Generator: record/replay upstream model traffic (see generator/ai/cassettes.py)
+GENERATOR_CASSETTES = {
+    "MODE": os.getenv("GENERATOR_CASSETTES_MODE") or None,   # record | replay | auto
+    "DIR": os.getenv("GENERATOR_CASSETTES_DIR", str(BASE_DIR / "cassettes")),
+    "LATENCY_SCALE": float(os.getenv("GENERATOR_CASSETTES_LATENCY_SCALE", "1.0")),
+}
+
+# Generator: per-stage timers -> Server-Timing header + Prometheus histograms on /metrics (see generator/timing.py)
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR and use core/gunicorn.conf.py so /metrics covers every worker.
+GENERATOR_METRICS = {
+    "SERVER_TIMING": os.getenv("GENERATOR_SERVER_TIMING", "1") == "1",
+    "PROMETHEUS": os.getenv("GENERATOR_PROMETHEUS", "1") == "1",
+    # /metrics is staff-only unless scraped with this Bearer token or from an allowed address
+    "TOKEN": os.getenv("GENERATOR_METRICS_TOKEN") or None,
+    "ALLOW_IPS": [ip.strip() for ip in os.getenv("GENERATOR_METRICS_ALLOW_IPS", "").split(",") if ip.strip()],
+}
+
+# Generator: one ModelCall row per upstream call (tokens, latency, cost), written in batches after responses
+# (see generator/accounting.py; report in the admin under Model calls -> Cost report). PRICES: USD per 1M tokens.
+GENERATOR_ACCOUNTING = {
+    "ENABLED": os.getenv("GENERATOR_ACCOUNTING", "1") == "1",
+    "BATCH_SIZE": int(os.getenv("GENERATOR_ACCOUNTING_BATCH", "50")),
+    "FLUSH_S": float(os.getenv("GENERATOR_ACCOUNTING_FLUSH_S", "5")),
+}
+
+# Generator: pooled OpenAI HTTP clients, built lazily per process (see generator/ai/clients.py).
+# HTTP/2 is used when the h2 package is installed. WARMUP opens connections at gunicorn worker boot.
+GENERATOR_OPENAI_HTTP = {
+    "MAX_CONNECTIONS": int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100")),
+    "MAX_KEEPALIVE": int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE", "20")),
+    "HTTP2": os.getenv("OPENAI_HTTP2", "1") == "1",
+    "CONNECT_TIMEOUT_S": float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5")),
+    "READ_TIMEOUT_S": float(os.getenv("OPENAI_READ_TIMEOUT_S", "120")),
+    "WARMUP": os.getenv("GENERATOR_OPENAI_WARMUP", "0") == "1",
+    "WARMUP_CONNECTIONS": int(os.getenv("GENERATOR_OPENAI_WARMUP_CONNECTIONS", "2")),
+}
+
+# Generator: asset_type="bundle" returns an email, an SMS and a checklist from one model call
+# (see generator/ai/schemas.py); it is stored as three GeneratedAssets and costs CREDITS.
+GENERATOR_BUNDLE = {
+    "CREDITS": int(os.getenv("GENERATOR_BUNDLE_CREDITS", "2")),
+}
+
+# Generator: language="both" returns the EN and PT variants from one model call; each is also cached as the
+# single-language result (see generator/ai/public.py). It costs the asset's credits plus EXTRA_CREDITS.
+GENERATOR_BILINGUAL = {
+    "EXTRA_CREDITS": int(os.getenv("GENERATOR_BILINGUAL_EXTRA_CREDITS", "1")),
+}
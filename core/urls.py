@@ -7,11 +7,14 @@ from django.conf.urls.static import static
 
 from accounts.views import CustomRegisterView
 from billing.views import stripe_webhook   # <-- add this import
+from generator.views import metrics
 
 urlpatterns = [
     path("set-language/", set_language, name="set_language"),
     # Webhooks should NOT be localized
     path("webhooks/stripe/", stripe_webhook, name="stripe_webhook"),  # <-- change to direct view
+    # Prometheus scrape target; not localized either
+    path("metrics", metrics, name="metrics"),
 ]
 
 urlpatterns += i18n_patterns(